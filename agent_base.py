@@ -1,8 +1,93 @@
 # agents/agent_base.py
+import asyncio
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from collections.abc import MutableMapping
+from functools import wraps
+from typing import Any, Dict, Iterator
+
+from tools.tracing import span
+
+
+class SharedState(MutableMapping):
+    """Thread-safe dict shared by agents that may run on different workers.
+
+    Single reads and writes are atomic; hold ``state.lock`` for
+    read-modify-write sequences spanning several keys.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.lock = threading.RLock()
+        self._data: Dict[str, Any] = dict(*args, **kwargs)
+
+    def __getitem__(self, key: str) -> Any:
+        with self.lock:
+            return self._data[key]
+
+    def __setitem__(self, key: str, value: Any):
+        with self.lock:
+            self._data[key] = value
+
+    def __delitem__(self, key: str):
+        with self.lock:
+            del self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        with self.lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._data)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        with self.lock:
+            return self._data.setdefault(key, default)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self._data)
+
+    def __repr__(self) -> str:
+        return f"SharedState({self.snapshot()!r})"
+
+
+def traced_act(act):
+    """Wrap an agent's act() in a "<AgentClass>.act" span tagged with the agent and task."""
+    @wraps(act)
+    def wrapper(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        with span(f"{type(self).__name__}.act", agent=self.name,
+                  task=str((task or {}).get("id", ""))) as s:
+            result = act(self, task)
+            if isinstance(result, dict) and "status" in result:
+                s.set(result_status=str(result["status"]))
+            return result
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def traced_aact(act):
+    """traced_act for coroutine act() methods."""
+    @wraps(act)
+    async def wrapper(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        with span(f"{type(self).__name__}.act", agent=self.name,
+                  task=str((task or {}).get("id", ""))) as s:
+            result = await act(self, task)
+            if isinstance(result, dict) and "status" in result:
+                s.set(result_status=str(result["status"]))
+            return result
+    wrapper.__traced__ = True
+    return wrapper
+
 
 class AgentBase(ABC):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 子类实现的 act 自动套上 tracing span
+        act = cls.__dict__.get("act")
+        if act is not None and not getattr(act, "__traced__", False):
+            cls.act = traced_act(act)
+
     def __init__(self, name: str, shared_state: Dict[str, Any]):
         self.name = name
         self.shared_state = shared_state
@@ -11,3 +96,43 @@ class AgentBase(ABC):
     def act(self, task: Dict[str, Any]) -> Dict[str, Any]:
         """Perform a step for the given task. Return a result dict."""
         pass
+
+
+class AsyncAgentBase(ABC):
+    """Agent whose act() is a coroutine, so many can wait on I/O in one event loop."""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        act = cls.__dict__.get("act")
+        if act is not None and not getattr(act, "__traced__", False):
+            cls.act = traced_aact(act)
+
+    def __init__(self, name: str, shared_state: Dict[str, Any]):
+        self.name = name
+        self.shared_state = shared_state
+
+    @abstractmethod
+    async def act(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Perform a step for the given task. Return a result dict."""
+        pass
+
+
+class SyncAgentAdapter(AsyncAgentBase):
+    """Run a synchronous agent's act() in a worker thread."""
+
+    def __init__(self, agent):
+        super().__init__(getattr(agent, "name", type(agent).__name__),
+                         getattr(agent, "shared_state", getattr(agent, "shared", {})))
+        self.agent = agent
+
+    async def act(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        # to_thread 复制当前 context，线程内的 span 仍挂在调用方下面
+        return await asyncio.to_thread(self.agent.act, task)
+    act.__traced__ = True     # the wrapped agent records its own span
+
+
+def as_async(agent) -> AsyncAgentBase:
+    """agent itself if its act() is async, otherwise a SyncAgentAdapter around it."""
+    if isinstance(agent, AsyncAgentBase) or asyncio.iscoroutinefunction(getattr(agent, "act", None)):
+        return agent
+    return SyncAgentAdapter(agent)
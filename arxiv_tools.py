@@ -1,33 +1,488 @@
 # tools/arxiv_tools.py
+import asyncio
 import feedparser
+import io
+import requests
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timezone
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from .feed_cache import FeedCache
+from .feed_stream import iter_entries
+from .http_transport import get_transport
+from .paper import Paper, arxiv_id_from
+from .paper_store import PaperStore
+from .tracing import current_span, in_context, span
+
+try:
+    import httpx
+except ImportError:  # only needed by the async fetchers
+    httpx = None
+
+# 网络失败时退回过期缓存的异常；没有 httpx 时只剩 OSError
+_AFETCH_ERRORS: Tuple[type, ...] = (OSError,) + ((httpx.TransportError,) if httpx is not None else ())
+
+try:
+    from .related import RelatedIndex
+except ImportError:  # numpy / scipy missing: papers keep an empty related list
+    RelatedIndex = None
 
 ARXIV_BASE_RSS = "http://export.arxiv.org/rss/"
 
-def fetch_category_rss(category_tag: str, max_items: int = 50) -> List[Dict]:
-    """Fetch and parse arXiv RSS for a category like 'cs.AI'."""
-    feed_url = ARXIV_BASE_RSS + category_tag
-    d = feedparser.parse(feed_url)
+# Concurrent fetch defaults: total worker threads, simultaneous requests per host
+# (arXiv asks clients not to hammer it) and wall-clock budget for one batch.
+FETCH_WORKERS = 8
+PER_HOST_LIMIT = 4
+BATCH_DEADLINE = 30.0
+FETCH_TIMEOUT = 20.0
+# bytes read past an early stop so the connection goes back to the pool; larger rests close it
+DRAIN_LIMIT = 4 * 1024 * 1024
+
+_host_slots: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+_host_slots_lock = threading.Lock()
+
+
+def _host_slot(url: str, limit: int) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        slot = _host_slots.get((host, limit))
+        if slot is None:
+            slot = _host_slots[(host, limit)] = threading.BoundedSemaphore(limit)
+        return slot
+
+
+_feed_cache: Optional[FeedCache] = None
+_feed_cache_lock = threading.Lock()
+
+
+def get_feed_cache() -> FeedCache:
+    """Process-wide feed cache, created on first use."""
+    global _feed_cache
+    with _feed_cache_lock:
+        if _feed_cache is None:
+            _feed_cache = FeedCache()
+        return _feed_cache
+
+
+def set_feed_cache(cache: Optional[FeedCache]):
+    global _feed_cache
+    with _feed_cache_lock:
+        _feed_cache = cache
+
+
+_paper_store: Optional[PaperStore] = None
+
+
+def get_paper_store() -> PaperStore:
+    """Process-wide paper store, created on first use."""
+    global _paper_store
+    with _feed_cache_lock:
+        if _paper_store is None:
+            _paper_store = PaperStore()
+        return _paper_store
+
+
+def set_paper_store(store: Optional[PaperStore]):
+    global _paper_store
+    with _feed_cache_lock:
+        _paper_store = store
+
+
+_related_index = None
+
+
+def get_related_index():
+    """Process-wide related-papers index, or None without numpy/scipy."""
+    global _related_index
+    with _feed_cache_lock:
+        if _related_index is None and RelatedIndex is not None:
+            _related_index = RelatedIndex()
+        return _related_index
+
+
+def set_related_index(index):
+    global _related_index
+    with _feed_cache_lock:
+        _related_index = index
+
+
+def _store_papers(category_tag: str, papers: List[Paper]) -> List[Paper]:
+    """Upsert a fetched listing into the paper store so search sees it."""
+    if papers:
+        try:
+            counts = get_paper_store().upsert_category(category_tag, papers)
+        except sqlite3.Error as e:
+            # 存储失败不影响抓取结果，只记录在 span 上
+            current_span().set(store_error=f"{type(e).__name__}: {e}")
+        else:
+            current_span().set(stored=counts)
+    return papers
+
+
+def _with_related(papers: List[Paper]) -> List[Paper]:
+    """Index new papers and attach their precomputed neighbours."""
+    index = get_related_index()
+    if index is not None and papers:
+        index.ingest(papers)
+        index.attach(papers)
+    return papers
+
+
+def _entry_authors(entry) -> List[str]:
+    # arXiv puts every author into a single comma-separated dc:creator
+    names = [a.get('name', '') for a in entry.get('authors', [])] or [entry.get('author', '')]
+    return [p.strip() for raw in names if raw for p in raw.split(',') if p.strip()]
+
+
+def _parse_entries(body: bytes, category_tag: str) -> List[Paper]:
+    """Lenient whole-document parse, used when the streaming reader rejects the XML."""
+    d = feedparser.parse(body)
     items = []
-    for entry in d.entries[:max_items]:
+    for entry in d.entries:
         # entry.published_parsed may be None in edge cases
         pub = None
         if hasattr(entry, 'published_parsed') and entry.published_parsed:
             pub = datetime(*entry.published_parsed[:6], tzinfo=timezone.utc).isoformat()
-        items.append({
-            'id': entry.get('id'),
-            'title': entry.get('title'),
-            'link': entry.get('link'),
-            'summary': entry.get('summary'),
-            'published': pub,
-            'tags': [t.term for t in entry.get('tags', [])] if 'tags' in entry else [],
-        })
+        items.append(Paper(
+            id=arxiv_id_from(entry.get('link'), entry.get('id')),
+            title=entry.get('title'),
+            authors=_entry_authors(entry),
+            summary=entry.get('summary'),
+            published=pub,
+            arxiv_tag=category_tag,
+            tags=[t.term for t in entry.get('tags', [])] if 'tags' in entry else [],
+            link=entry.get('link'),
+        ))
     return items
 
-def todays_papers_for_categories(categories: List[str]) -> Dict[str, List[Dict]]:
-    """Return dict: category -> list of entries (filtering to 'today' optional)."""
-    result = {}
-    for cat in categories:
-        result[cat] = fetch_category_rss(cat)
+
+def _paper_from_entry(e: Dict, category_tag: str) -> Paper:
+    return Paper(id=arxiv_id_from(e['link'], e['id']), title=e['title'], authors=e['authors'],
+                 summary=e['summary'], published=e['published'], arxiv_tag=category_tag,
+                 tags=e['tags'], link=e['link'])
+
+
+class _TeeReader:
+    """File-like view of a response body that keeps a copy of every byte read."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.buffer = bytearray()
+
+    def read(self, n: int = -1) -> bytes:
+        data = self.raw.read(n)
+        self.buffer += data
+        return data
+
+
+def _drain(raw, limit: int = DRAIN_LIMIT) -> int:
+    """Read and discard the rest of a body (up to limit) so the connection can be reused."""
+    n = 0
+    while n <= limit:
+        chunk = raw.read(64 * 1024)
+        if not chunk:
+            break
+        n += len(chunk)
+    return n
+
+
+def _stream_entries(reader, category_tag: str, max_items: int) -> List[Paper]:
+    return [_paper_from_entry(e, category_tag) for e in iter_entries(reader, max_items=max_items)]
+
+
+def fetch_category_rss(category_tag: str, max_items: int = 50,
+                       base_url: str = ARXIV_BASE_RSS,
+                       use_cache: bool = True, related: bool = True,
+                       store: bool = True) -> List[Paper]:
+    """Fetch and parse arXiv RSS for a category like 'cs.AI'.
+
+    The response is parsed as a stream and reading stops after max_items
+    entries. With use_cache, a fresh cached copy is returned without any
+    request and a stale one is revalidated with a conditional GET; a 304
+    skips parsing. With store, the papers (fetched or cached) are upserted
+    into the paper store, so search_papers finds them; an unchanged listing
+    is skipped by its signature. With related, each paper's ``related``
+    tuple is filled from the TF-IDF index, which is updated with any new
+    papers first.
+    """
+    with span("arxiv.fetch_category_rss", category=category_tag, max_items=max_items) as s:
+        papers = _fetch_category(category_tag, max_items, base_url, use_cache)
+        if store:
+            papers = _store_papers(category_tag, papers)
+        if related:
+            papers = _with_related(papers)
+        s.set(papers=len(papers))
+        return papers
+
+
+def _fetch_category(category_tag: str, max_items: int, base_url: str,
+                    use_cache: bool) -> List[Paper]:
+    feed_url = base_url + category_tag
+    cache, cached = _cache_entry(feed_url, max_items, use_cache)
+    if cached and cached["fresh"]:
+        return _from_cache(cache, cached, max_items, "hit")
+
+    headers = cache.validators(cached) if cache else {}
+    try:
+        resp = get_transport().get(feed_url, headers=headers, timeout=FETCH_TIMEOUT, stream=True)
+    except requests.RequestException:
+        # 网络失败时退回到过期缓存
+        if cached:
+            return _from_cache(cache, cached, max_items, "stale")
+        raise
+
+    with resp:
+        if resp.status_code == 304 and cached:
+            cache.touch(feed_url)
+            return _from_cache(cache, cached, max_items, "revalidated")
+        if resp.status_code >= 500 and cached:
+            # 重试用尽后仍是 5xx：与网络失败一样退回过期缓存
+            return _from_cache(cache, cached, max_items, "stale")
+        resp.raise_for_status()
+
+        t0 = time.perf_counter()
+        resp.raw.decode_content = True
+        reader = _TeeReader(resp.raw)
+        try:
+            items = _stream_entries(reader, category_tag, max_items)
+            complete = len(items) < max_items
+            parse_seconds = time.perf_counter() - t0
+            # 解析提前结束时读完剩余响应体，连接才能回到 keep-alive 连接池
+            body_bytes = len(reader.buffer) + _drain(resp.raw)
+        except ET.ParseError:
+            # 用已缓冲的字节加剩余部分宽松解析，不再重新下载
+            body = bytes(reader.buffer) + resp.raw.read()
+            items = _parse_entries(body, category_tag)
+            body_bytes, complete = len(body), True
+            parse_seconds = time.perf_counter() - t0
+    _store_fetched(cache, feed_url, items, resp.headers, body_bytes, parse_seconds, complete)
+    return items[:max_items]
+
+
+def _cache_entry(feed_url: str, max_items: int, use_cache: bool):
+    """(cache, cached entry or None) for a feed URL."""
+    cache = get_feed_cache() if use_cache else None
+    cached = cache.lookup(feed_url) if cache else None
+    # a copy cut short by an earlier, smaller max_items cannot serve a bigger one
+    if cached and not cached.get("complete", True) and len(cached["items"]) < max_items:
+        cached = None
+    return cache, cached
+
+
+def _from_cache(cache: FeedCache, cached: Dict, max_items: int, outcome: str) -> List[Paper]:
+    # stale 为网络失败时的兜底，不计入缓存统计
+    if outcome != "stale":
+        cache.record(outcome, cached["body_bytes"], cached["parse_seconds"])
+    current_span().set(cache=outcome)
+    return [Paper.from_dict(d) for d in cached["items"][:max_items]]
+
+
+def _store_fetched(cache: Optional[FeedCache], feed_url: str, items: List[Paper], headers,
+                   body_bytes: int, parse_seconds: float, complete: bool):
+    current_span().set(cache="miss", body_bytes=body_bytes, parse_s=round(parse_seconds, 4))
+    if cache:
+        cache.record("miss", body_bytes, parse_seconds)
+        cache.store(feed_url, [p.to_dict() for p in items],
+                    etag=headers.get("ETag"),
+                    last_modified=headers.get("Last-Modified"),
+                    body_bytes=body_bytes,
+                    parse_seconds=parse_seconds,
+                    complete=complete)
+
+
+async def afetch_category_rss(category_tag: str, max_items: int = 50,
+                              base_url: str = ARXIV_BASE_RSS,
+                              use_cache: bool = True, related: bool = True,
+                              store: bool = True) -> List[Paper]:
+    """fetch_category_rss for coroutines: the request is awaited on the event loop.
+
+    Same cache, conditional GET, rate limits, paper store and related-papers
+    handling as the sync version; the body is read whole and parsed with the
+    streaming reader, which still stops after max_items entries.
+    """
+    with span("arxiv.fetch_category_rss", category=category_tag, max_items=max_items,
+              coroutine=True) as s:
+        papers = await _afetch_category(category_tag, max_items, base_url, use_cache)
+        if store:
+            papers = await asyncio.to_thread(_store_papers, category_tag, papers)
+        if related:
+            papers = await asyncio.to_thread(_with_related, papers)
+        s.set(papers=len(papers))
+        return papers
+
+
+async def _afetch_category(category_tag: str, max_items: int, base_url: str,
+                           use_cache: bool) -> List[Paper]:
+    feed_url = base_url + category_tag
+    cache, cached = _cache_entry(feed_url, max_items, use_cache)
+    if cached and cached["fresh"]:
+        return _from_cache(cache, cached, max_items, "hit")
+
+    headers = cache.validators(cached) if cache else {}
+    try:
+        resp = await get_transport().aget(feed_url, headers=headers, timeout=FETCH_TIMEOUT)
+    except _AFETCH_ERRORS:
+        if cached:
+            return _from_cache(cache, cached, max_items, "stale")
+        raise
+    if resp.status_code == 304 and cached:
+        cache.touch(feed_url)
+        return _from_cache(cache, cached, max_items, "revalidated")
+    if resp.status_code >= 500 and cached:
+        return _from_cache(cache, cached, max_items, "stale")
+    resp.raise_for_status()
+
+    body = resp.content
+    t0 = time.perf_counter()
+    try:
+        items = [_paper_from_entry(e, category_tag)
+                 for e in iter_entries(io.BytesIO(body), max_items=max_items)]
+        complete = len(items) < max_items
+    except ET.ParseError:
+        items, complete = _parse_entries(body, category_tag), True
+    parse_seconds = time.perf_counter() - t0
+    _store_fetched(cache, feed_url, items, resp.headers, len(body), parse_seconds, complete)
+    return items[:max_items]
+
+
+def fetch_categories(categories: List[str], max_items: int = 50,
+                     base_url: str = ARXIV_BASE_RSS,
+                     max_workers: int = FETCH_WORKERS,
+                     per_host: int = PER_HOST_LIMIT,
+                     deadline: Optional[float] = BATCH_DEADLINE,
+                     store: bool = True
+                     ) -> Tuple[Dict[str, List[Paper]], Dict[str, str]]:
+    """Fetch several categories concurrently within one batch deadline.
+
+    Returns (results, errors). Categories that fail or are still in flight
+    when the deadline expires are reported in errors instead of results.
+    store is passed on to fetch_category_rss.
+    """
+    results: Dict[str, List[Paper]] = {}
+    errors: Dict[str, str] = {}
+    if not categories:
+        return results, errors
+
+    slot = _host_slot(base_url, per_host)
+
+    def _one(cat):
+        with slot:
+            return fetch_category_rss(cat, max_items=max_items, base_url=base_url, store=store)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(categories))),
+                              thread_name_prefix="arxiv-fetch")
+    futures = {pool.submit(in_context(_one), cat): cat for cat in dict.fromkeys(categories)}
+    end = None if deadline is None else time.monotonic() + deadline
+    pending = set(futures)
+    try:
+        while pending:
+            timeout = None if end is None else max(0.0, end - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                cat = futures[fut]
+                try:
+                    results[cat] = fut.result()
+                except Exception as e:
+                    errors[cat] = f"{type(e).__name__}: {e}"
+        for fut in pending:
+            errors[futures[fut]] = "deadline exceeded"
+    finally:
+        # 不等待超时的线程，直接返回部分结果
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, errors
+
+
+async def afetch_categories(categories: List[str], max_items: int = 50,
+                            base_url: str = ARXIV_BASE_RSS,
+                            per_host: int = PER_HOST_LIMIT,
+                            deadline: Optional[float] = BATCH_DEADLINE,
+                            store: bool = True
+                            ) -> Tuple[Dict[str, List[Paper]], Dict[str, str]]:
+    """fetch_categories on the event loop: one task per category, no worker threads."""
+    results: Dict[str, List[Paper]] = {}
+    errors: Dict[str, str] = {}
+    if not categories:
+        return results, errors
+
+    slot = asyncio.Semaphore(per_host)
+
+    async def _one(cat):
+        async with slot:
+            return await afetch_category_rss(cat, max_items=max_items, base_url=base_url,
+                                             store=store)
+
+    tasks = {asyncio.ensure_future(_one(cat)): cat for cat in dict.fromkeys(categories)}
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in done:
+        cat = tasks[task]
+        try:
+            results[cat] = task.result()
+        except Exception as e:
+            errors[cat] = f"{type(e).__name__}: {e}"
+    for task in pending:
+        task.cancel()
+        errors[tasks[task]] = "deadline exceeded"
+    return results, errors
+
+
+def todays_papers_for_categories(categories: List[str], max_items: int = 50,
+                                 deadline: Optional[float] = BATCH_DEADLINE,
+                                 base_url: str = ARXIV_BASE_RSS
+                                 ) -> Dict[str, List[Paper]]:
+    """Return dict: category -> list of entries (filtering to 'today' optional).
+
+    Feeds are fetched concurrently; a slow or failing feed yields an empty
+    list for that category rather than failing the whole batch.
+    """
+    results, _ = fetch_categories(categories, max_items=max_items,
+                                  base_url=base_url, deadline=deadline)
+    return {cat: results.get(cat, []) for cat in categories}
+
+
+def refresh_categories(categories: List[str], max_items: int = 50,
+                       base_url: str = ARXIV_BASE_RSS,
+                       deadline: Optional[float] = BATCH_DEADLINE,
+                       store: Optional[PaperStore] = None) -> Dict[str, Dict]:
+    """Fetch categories and upsert them into the paper store.
+
+    Returns category -> upsert counts (or {"error": ...}). Categories that
+    fail keep whatever the store already had for them.
+    """
+    store = store or get_paper_store()
+    # 不在抓取时写入全局库，只在这里写入一次所选的 store
+    results, errors = fetch_categories(categories, max_items=max_items, base_url=base_url,
+                                       deadline=deadline, store=False)
+    report = {cat: {"error": msg} for cat, msg in errors.items()}
+    for cat, papers in results.items():
+        report[cat] = store.upsert_category(cat, papers)
+    return report
+
+
+def stored_papers_for_categories(categories: List[str], max_items: int = 50,
+                                 store: Optional[PaperStore] = None) -> Dict[str, List[Paper]]:
+    """Serve categories from the local store (no network)."""
+    store = store or get_paper_store()
+    result = store.papers_for_categories(categories, limit=max_items)
+    for papers in result.values():
+        _with_related(papers)
     return result
+
+
+def search_papers(query: str, limit: int = 20, category: Optional[str] = None,
+                  store: Optional[PaperStore] = None) -> List[Paper]:
+    """Keyword / author search over every paper ingested into the store.
+
+    Words must all match (title, authors or summary; the last word as a
+    prefix); ``author:name`` limits that one word to the authors. Results are
+    ranked by BM25. The FTS5 index is updated as feeds are fetched
+    (fetch_category_rss and refresh_categories upsert into the store).
+    """
+    store = store or get_paper_store()
+    return store.search(query, limit=limit, category=category)
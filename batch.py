@@ -0,0 +1,253 @@
+# batch.py
+"""Run many orchestrator jobs from one manifest across a process pool.
+
+The manifest is a JSON list (or JSON lines) of jobs::
+
+    [{"name": "ai-cv", "workspace": "runs/ai-cv",
+      "goal": "build arXiv CS Daily webapp",
+      "brief": "Categories: cs.AI and cs.CV only. Three-column layout.",
+      "target_score": 36, "max_rounds": 3}]
+
+Only ``workspace`` is required. All workers share one LLM response cache
+directory and one token bucket per rate-limited host, hosted by a
+multiprocessing manager, so N processes together stay within the same
+requests-per-second as a single run. A job that raises is recorded as
+failed and the rest of the batch continues. If a worker process dies, the
+pool is rebuilt and the unfinished jobs are resubmitted; jobs that were
+running when it died are retried at most ``crash_retries`` times. The
+consolidated results go to a CSV table.
+
+    python batch.py jobs.json --workers 4 --out batch_results.csv
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.managers import BaseManager, DictProxy
+from typing import Any, Callable, Dict, List, Optional
+
+from agents.llm_cache import DEFAULT_LLM_CACHE_DIR
+from tools.http_transport import HOST_RATES, RemoteTokenBucket, TokenBucket
+
+RESULT_FIELDS = ("name", "status", "score", "rounds", "latency_s", "llm_calls",
+                 "prompt_tokens", "completion_tokens", "workspace", "error")
+
+
+class RateLimitManager(BaseManager):
+    pass
+
+
+RateLimitManager.register("TokenBucket", TokenBucket, exposed=("_take",))
+RateLimitManager.register("dict", dict, DictProxy)
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    """Jobs from a JSON list or JSON-lines file; names default to the workspace's basename."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        jobs = json.loads(text)
+    else:
+        jobs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    base = os.path.dirname(os.path.abspath(path))
+    seen = set()
+    for i, job in enumerate(jobs):
+        if "workspace" not in job:
+            raise ValueError(f"job {i} has no workspace")
+        # 相对路径按 manifest 所在目录解析
+        job["workspace"] = os.path.join(base, job["workspace"])
+        job.setdefault("name", os.path.basename(os.path.normpath(job["workspace"])))
+        if job["workspace"] in seen:
+            raise ValueError(f"workspace {job['workspace']} is used by more than one job")
+        seen.add(job["workspace"])
+    return jobs
+
+
+# ---------------------------
+# worker process
+# ---------------------------
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(bucket_proxies: Dict[str, Any], cache_dir: str, dry_run: bool, started=None):
+    from tools.http_transport import Transport, set_transport
+    set_transport(Transport(buckets={h: RemoteTokenBucket(p) for h, p in bucket_proxies.items()}))
+    _worker.update(cache_dir=cache_dir, dry_run=dry_run, started=started)
+
+
+def _run_tracked(runner: Callable[[Dict[str, Any]], Dict[str, Any]], index: int,
+                 job: Dict[str, Any]) -> Dict[str, Any]:
+    # 记录正在运行的任务；进程崩溃后仍留在 started 中的就是当时在运行的任务
+    started = _worker.get("started")
+    if started is not None:
+        started[index] = os.getpid()
+    row = runner(job)
+    if started is not None:
+        started.pop(index, None)
+    return row
+
+
+def _backend():
+    if not _worker.get("dry_run"):
+        return None
+    from agents.llm_backends import ReplayBackend
+    from benchmarks import pipeline_responder
+    return ReplayBackend(fallback=pipeline_responder)
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one job to completion; never raises, failures come back as a result row."""
+    from agents.llm_cache import LLMResponseCache
+    from orchestrator import DEFAULT_GOAL, PhaseMeter, run_demo
+
+    row = {"name": job["name"], "workspace": job["workspace"], "status": "failed",
+           "score": None, "rounds": 0, "llm_calls": 0, "prompt_tokens": 0,
+           "completion_tokens": 0, "error": ""}
+    t0 = time.perf_counter()
+    meter = PhaseMeter()
+    try:
+        os.makedirs(job["workspace"], exist_ok=True)
+        # 每个任务的输出写入各自 workspace 下的 run.log
+        with open(os.path.join(job["workspace"], "run.log"), "w", encoding="utf-8") as log, \
+                contextlib.redirect_stdout(log):
+            records = run_demo(
+                max_workers=job.get("max_workers", 4),
+                workspace=job["workspace"],
+                backend=_backend(),
+                goal=job.get("goal", DEFAULT_GOAL),
+                brief=job.get("brief", ""),
+                target_score=job.get("target_score", 36),
+                max_rounds=job.get("max_rounds", 3),
+                llm_cache=LLMResponseCache(_worker.get("cache_dir", DEFAULT_LLM_CACHE_DIR)),
+                meter=meter,
+            )
+        failed = {tid: rec.error for tid, rec in records.items() if rec.state != "done"}
+        refine = records.get("refine_webapp")
+        evaluation = records.get("evaluate_webapp")
+        if refine is not None and isinstance(refine.result, dict):
+            row["score"] = refine.result.get("best_score")
+            row["rounds"] = refine.result.get("rounds", 0)
+        elif evaluation is not None and isinstance(evaluation.result, dict):
+            row["score"] = evaluation.result.get("overall_score")
+        row["status"] = "ok" if not failed else "partial"
+        row["error"] = "; ".join(f"{tid}: {err}" for tid, err in failed.items())
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+        with contextlib.suppress(OSError):
+            with open(os.path.join(job["workspace"], "run.log"), "a", encoding="utf-8") as log:
+                traceback.print_exc(file=log)
+    row["latency_s"] = round(time.perf_counter() - t0, 3)
+    for phase in meter.phases.values():
+        row["llm_calls"] += phase["calls"]
+        row["prompt_tokens"] += phase["prompt_tokens"]
+        row["completion_tokens"] += phase["completion_tokens"]
+    return row
+
+
+# ---------------------------
+# driver
+# ---------------------------
+def _failed_row(job: Dict[str, Any], error: str) -> Dict[str, Any]:
+    return {"name": job["name"], "workspace": job["workspace"], "status": "failed", "error": error}
+
+
+def run_batch(jobs: List[Dict[str, Any]], workers: int = 4, cache_dir: Optional[str] = None,
+              host_rates: Optional[Dict[str, Any]] = None, dry_run: bool = False,
+              on_result=None, crash_retries: int = 1,
+              runner: Callable[[Dict[str, Any]], Dict[str, Any]] = run_job) -> List[Dict[str, Any]]:
+    """Run jobs on a process pool; returns one result row per job, in manifest order.
+
+    When a worker process dies the pool is rebuilt and every unfinished job
+    is resubmitted. Only the jobs that were running at that moment are
+    charged an attempt; one that has taken down a worker more than
+    crash_retries times is recorded as failed.
+    """
+    cache_dir = str(cache_dir or DEFAULT_LLM_CACHE_DIR)
+    rows: Dict[int, Dict[str, Any]] = {}
+    crashes = {i: 0 for i in range(len(jobs))}
+
+    def finish(i, row):
+        rows[i] = row
+        if on_result:
+            on_result(row)
+
+    with RateLimitManager() as manager:
+        buckets = {host: manager.TokenBucket(rate, burst)
+                   for host, (rate, burst) in (host_rates or HOST_RATES).items()}
+        started = manager.dict()
+        while len(rows) < len(jobs):
+            todo = [i for i in range(len(jobs)) if i not in rows]
+            started.clear()
+            broken = None
+            with ProcessPoolExecutor(max_workers=max(1, min(workers, len(todo))),
+                                     initializer=_init_worker,
+                                     initargs=(buckets, cache_dir, dry_run, started)) as pool:
+                futures = {pool.submit(_run_tracked, runner, i, jobs[i]): i for i in todo}
+                for fut in as_completed(futures):
+                    i = futures[fut]
+                    try:
+                        finish(i, fut.result())
+                    except BrokenProcessPool as e:
+                        # 工作进程异常退出：已完成的结果保留，其余任务在新进程池中重跑
+                        broken = e
+                    except Exception as e:
+                        finish(i, _failed_row(jobs[i], f"{type(e).__name__}: {e}"))
+            if broken is None:
+                continue
+            unfinished = [i for i in todo if i not in rows]
+            running = set(started.keys())
+            # 没有任务在运行时崩溃（如初始化失败）：全部计一次，保证重试有界
+            for i in [i for i in unfinished if i in running] or unfinished:
+                crashes[i] += 1
+                if crashes[i] > crash_retries:
+                    finish(i, _failed_row(jobs[i], f"worker process died ({crashes[i]} times): {broken}"))
+    return [rows[i] for i in range(len(jobs))]
+
+
+def write_results(rows: List[Dict[str, Any]], path: str):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: row.get(k, "") for k in RESULT_FIELDS})
+
+
+def format_results(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'name':<20}{'status':<9}{'score':>7}{'rounds':>8}{'latency_s':>11}{'llm_calls':>11}  error"]
+    for r in rows:
+        score = "-" if r.get("score") is None else r["score"]
+        lines.append(f"{r['name']:<20}{r['status']:<9}{score:>7}{r.get('rounds', 0):>8}"
+                     f"{r.get('latency_s', 0):>11}{r.get('llm_calls', 0):>11}  {r.get('error', '')[:80]}")
+    ok = sum(1 for r in rows if r["status"] == "ok")
+    lines.append(f"{ok}/{len(rows)} jobs ok")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run orchestrator jobs from a manifest in parallel.")
+    parser.add_argument("manifest", help="JSON list or JSON lines of jobs")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--out", default="batch_results.csv")
+    parser.add_argument("--cache-dir", default=None, help="shared LLM response cache directory")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="use a canned offline model instead of DashScope")
+    args = parser.parse_args(argv)
+
+    jobs = load_manifest(args.manifest)
+    rows = run_batch(jobs, workers=args.workers, cache_dir=args.cache_dir, dry_run=args.dry_run,
+                     on_result=lambda r: print(f"[BATCH] {r['name']}: {r['status']} "
+                                               f"(score {r.get('score')}, {r.get('latency_s', '-')}s)"))
+    write_results(rows, args.out)
+    print(format_results(rows))
+    print(f"Results written to {args.out}")
+    return 0 if all(r["status"] == "ok" for r in rows) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,632 @@
+# benchmarks.py
+"""Micro-benchmarks for the tools and agents.
+
+Run e.g.:
+    python benchmarks.py paper-memory --sizes 10000 100000
+    python benchmarks.py feed-parse --sizes 1000 10000 50000
+    python benchmarks.py fetch --delay 0.2 --categories 8 --per-host 4
+    python benchmarks.py codegen --latency 0.5 --concurrency 1 4
+    python benchmarks.py stream --lines 2000 --chunk-latency 0.002
+    python benchmarks.py eval --latency 0.5
+    python benchmarks.py search --docs 100000
+    python benchmarks.py related --sizes 5000 20000
+    python benchmarks.py pipeline --latency 0.2 --tokens-per-sec 200 --history benchmarks_history.jsonl
+    python benchmarks.py pipelines --count 8 --latency 0.2
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import random
+import time
+import tracemalloc
+from typing import Dict, List
+
+from tools.feed_stream import iter_entries
+from tools.paper import Paper
+
+CATEGORIES = ["cs.AI", "cs.CV", "cs.CL", "cs.LG", "cs.NE"]
+_WORDS = ("neural network learning model graph attention language vision "
+          "transformer diffusion reinforcement robust efficient sparse data").split()
+_AUTHORS = [f"Author{i} Surname{i}" for i in range(2000)]
+
+
+def synthetic_entries(n: int, seed: int = 0) -> List[Dict]:
+    """Raw entry fields as they come out of the feed, before any record is built."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        cat = rng.choice(CATEGORIES)
+        out.append({
+            "id": f"2410.{i:05d}",
+            "title": " ".join(rng.choices(_WORDS, k=10)).title(),
+            "authors": rng.sample(_AUTHORS, rng.randint(1, 6)),
+            "summary": " ".join(rng.choices(_WORDS, k=120)),
+            "published": "2024-10-17",
+            # feedparser hands back a fresh string per entry, not a shared one
+            "arxiv_tag": "".join(cat),
+        })
+    return out
+
+
+def _as_dict(e: Dict) -> Dict:
+    # layout previously produced by fetch_category_rss: eager links, bibtex, citation
+    authors = [a + "" for a in e["authors"]]
+    return {
+        "id": e["id"],
+        "title": e["title"],
+        "authors": authors,
+        "published": e["published"],
+        "arxiv_tag": e["arxiv_tag"],
+        "abs_link": f"https://arxiv.org/abs/{e['id']}",
+        "pdf_link": f"https://arxiv.org/pdf/{e['id']}.pdf",
+        "summary": e["summary"],
+        "bibtex": f"@article{{{e['id']},\n  title={{{e['title']}}},\n  author={{{' and '.join(authors)}}},\n"
+                  f"  journal={{arXiv preprint arXiv:{e['id']}}},\n  year={{2024}}\n}}",
+        "citation": f"{', '.join(authors)}. {e['title']}. arXiv:{e['id']} (2024).",
+    }
+
+
+def _as_paper(e: Dict) -> Paper:
+    return Paper(id=e["id"], title=e["title"], authors=[a + "" for a in e["authors"]],
+                 summary=e["summary"], published=e["published"], arxiv_tag=e["arxiv_tag"])
+
+
+def _measure(build, entries) -> int:
+    gc.collect()
+    tracemalloc.start()
+    records = [build(e) for e in entries]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current
+
+
+def bench_paper_memory(sizes=(10_000, 100_000)) -> List[Dict]:
+    """Bytes retained by the dict layout vs Paper records.
+
+    Summary/title strings are shared by both layouts (they come from the
+    parser either way), so the numbers isolate per-record overhead.
+    """
+    rows = []
+    for n in sizes:
+        entries = synthetic_entries(n)
+        dict_bytes = _measure(_as_dict, entries)
+        paper_bytes = _measure(_as_paper, entries)
+        rows.append({"n": n, "dict_bytes": dict_bytes, "paper_bytes": paper_bytes,
+                     "ratio": round(paper_bytes / dict_bytes, 3)})
+    return rows
+
+
+def synthetic_rss(n: int, seed: int = 0) -> bytes:
+    """An arXiv-style RSS 2.0 document with n items."""
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>'
+             '<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+             '<title>cs.AI updates on arXiv.org</title>']
+    for e in synthetic_entries(n, seed):
+        parts.append(
+            f"<item><title>{e['title']}</title>"
+            f"<link>https://arxiv.org/abs/{e['id']}</link>"
+            f"<description>arXiv:{e['id']} Announce Type: new Abstract: {e['summary']}</description>"
+            f"<guid isPermaLink=\"false\">oai:arXiv.org:{e['id']}</guid>"
+            f"<category>{e['arxiv_tag']}</category>"
+            f"<pubDate>Thu, 17 Oct 2024 00:00:00 -0400</pubDate>"
+            f"<dc:creator>{', '.join(e['authors'])}</dc:creator></item>")
+    parts.append("</channel></rss>")
+    return "".join(parts).encode("utf-8")
+
+
+def _timed_peak(fn):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def bench_feed_parse(sizes=(1_000, 10_000, 50_000), max_items: int = 50) -> List[Dict]:
+    """feedparser whole-document parse vs the streaming reader.
+
+    The streaming reader is timed twice: stopping at max_items (what
+    fetch_category_rss does) and reading the whole feed.
+    """
+    try:
+        import feedparser
+    except ImportError:
+        feedparser = None
+    rows = []
+    for n in sizes:
+        body = synthetic_rss(n)
+        row = {"n": n, "mb": round(len(body) / 1e6, 1)}
+        if feedparser is not None:
+            _, t, peak = _timed_peak(lambda: feedparser.parse(body).entries[:max_items])
+            row.update(feedparser_s=round(t, 3), feedparser_peak_mb=round(peak / 1e6, 1))
+        _, t, peak = _timed_peak(lambda: list(iter_entries(io.BytesIO(body), max_items)))
+        row.update(stream_first_s=round(t, 4), stream_first_peak_mb=round(peak / 1e6, 2))
+        _, t, peak = _timed_peak(lambda: sum(1 for _ in iter_entries(io.BytesIO(body))))
+        row.update(stream_all_s=round(t, 3), stream_all_peak_mb=round(peak / 1e6, 2))
+        rows.append(row)
+    return rows
+
+
+def bench_fetch(delay: float = 0.2, categories: int = 8, per_host: int = 4,
+                deadline: float = 1.0) -> List[Dict]:
+    """fetch_categories against a local feed server: bounded pool, per-host cap, deadline."""
+    import tempfile
+    from tools import arxiv_tools
+    from tools.fake_feeds import MockFeedServer
+    from tools.feed_cache import FeedCache
+
+    cats = [f"cs.X{i}" for i in range(categories)]
+    scenarios = [
+        ("uniform", {c: delay for c in cats}, set()),
+        # 一个分类超过批次期限、一个返回 404：其余分类照常返回
+        ("slow+404", {**{c: delay for c in cats}, cats[0]: deadline * 3}, {cats[1]}),
+    ]
+    rows = []
+    for name, delays, missing in scenarios:
+        with tempfile.TemporaryDirectory() as d, MockFeedServer(delays=delays, missing=missing) as srv:
+            arxiv_tools.set_feed_cache(FeedCache(d))
+            try:
+                t0 = time.perf_counter()
+                results, errors = arxiv_tools.fetch_categories(
+                    cats, max_items=10, base_url=srv.base_url, per_host=per_host, deadline=deadline)
+                wall = time.perf_counter() - t0
+            finally:
+                arxiv_tools.set_feed_cache(None)
+            rows.append({"scenario": name, "per_host": per_host,
+                         "peak_inflight": srv.peak_inflight, "ok": len(results),
+                         "errors": len(errors), "wall_s": round(wall, 3),
+                         "sequential_s": round(sum(min(v, deadline) for v in delays.values()), 3)})
+    return rows
+
+
+def bench_codegen(latency: float = 0.5, concurrencies=(1, 4)) -> List[Dict]:
+    """Wall time of CodeAgent._generate_web_app against a local mock LLM endpoint."""
+    import tempfile
+    from agents.code_agent import CodeAgent
+    from agents.fake_llm import FakeChatClient, MockOpenAIServer
+    try:
+        from openai import OpenAI
+    except ImportError:
+        OpenAI = None
+
+    rows = []
+    with MockOpenAIServer(lambda m: "<html></html>", latency=latency) as srv:
+        for c in concurrencies:
+            client = (OpenAI(api_key="mock", base_url=srv.base_url) if OpenAI
+                      else FakeChatClient(lambda m: "<html></html>", latency=latency))
+            with tempfile.TemporaryDirectory() as ws:
+                agent = CodeAgent("bench", {}, workspace=ws, client=client,
+                                  enable_cache=False, gen_concurrency=c)
+                t0 = time.perf_counter()
+                agent.act({"id": "generate_web_app"})
+                rows.append({"concurrency": c, "latency_s": latency,
+                             "wall_s": round(time.perf_counter() - t0, 3)})
+    return rows
+
+
+def bench_stream(lines: int = 2000, chunk_latency: float = 0.002) -> List[Dict]:
+    """Time to first byte on disk and peak memory, buffered vs streamed generation."""
+    import tempfile
+    import threading
+    from pathlib import Path
+    from agents.code_agent import CodeAgent
+    from agents.fake_llm import MockOpenAIServer
+    from openai import OpenAI
+
+    code = "```python\n" + "\n".join(f"value_{i} = {i}  # generated line" for i in range(lines)) + "\n```"
+    rows = []
+    with MockOpenAIServer(lambda m: code, chunk_size=64, chunk_latency=chunk_latency) as srv:
+        for stream in (False, True):
+            with tempfile.TemporaryDirectory() as ws:
+                agent = CodeAgent("bench", {}, workspace=ws, enable_cache=False, stream=stream,
+                                  client=OpenAI(api_key="mock", base_url=srv.base_url, max_retries=0))
+                out = Path(ws) / "webapp" / "main.py"
+                first = []
+                done = threading.Event()
+
+                def watch(t0):
+                    while not done.is_set():
+                        try:
+                            if out.stat().st_size:
+                                first.append(time.perf_counter() - t0)
+                                return
+                        except OSError:     # main.py 还没出现
+                            pass
+                        time.sleep(0.001)
+
+                t0 = time.perf_counter()
+                watcher = threading.Thread(target=watch, args=(t0,), daemon=True)
+                watcher.start()
+                _, wall, peak = _timed_peak(lambda: agent._generate_artifact("webapp/main.py", "bench"))
+                done.set()
+                watcher.join()
+                rows.append({"mode": "stream" if stream else "buffered",
+                             "first_byte_s": round(first[0] if first else wall, 3),
+                             "wall_s": round(wall, 3), "peak_kb": peak // 1024})
+    return rows
+
+
+SAMPLE_WEBAPP = {
+    "webapp/main.py": """from pathlib import Path
+from fastapi import FastAPI, Request
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from tools.arxiv_tools import fetch_category_rss
+
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+STATIC_DIR = BASE_DIR / "static"
+STATIC_DIR.mkdir(exist_ok=True)
+CATEGORIES = ["cs.AI", "cs.CV", "cs.CL", "cs.LG", "cs.NE"]
+
+app = FastAPI()
+app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+
+@app.get("/")
+def index(request: Request, category: str = "cs.AI"):
+    selected = category if category in CATEGORIES else "cs.AI"
+    papers = {cat: fetch_category_rss(cat) for cat in CATEGORIES}
+    return templates.TemplateResponse("index.html", {"request": request, "categories": CATEGORIES,
+                                                     "selected": selected, "papers": papers})
+""",
+    "webapp/templates/index.html": """<html><body><div class="layout"><nav>{% for c in categories %}<a href="/?category={{ c }}">{{ c }}</a>{% endfor %}</nav>
+<main>{% for paper in papers[selected] %}<div class="card"><a href="{{ paper.abs_link }}" target="_blank">{{ paper.title }}</a>
+<p>{{ paper.authors | join(', ') }}</p><p>{{ paper.summary }}</p><span>{{ paper.published }}</span> <span>[{{ paper.arxiv_tag }}]</span>
+<a href="{{ paper.pdf_link }}" target="_blank">PDF</a>
+<button data-bib="{{ paper.bibtex | tojson }}" onclick="copyFromData(this)">Copy BibTeX</button>
+<button data-cite="{{ paper.citation | tojson }}" onclick="copyFromData(this)">Copy Citation</button></div>{% endfor %}</main></div>
+<script src="/static/copy.js"></script></body></html>
+""",
+    "webapp/static/copy.js": """function copyFromData(btn) {
+  let v = btn.dataset.bib || btn.dataset.cite || "";
+  try { v = JSON.parse(v); } catch (e) {}
+  navigator.clipboard.writeText(v).then(() => {
+    const t = btn.textContent; btn.textContent = "Copied!";
+    setTimeout(() => { btn.textContent = t; }, 1200);
+  });
+}
+""",
+    "webapp/templates/paper.html": """<html><body><h1><a href="{{ paper.abs_link }}" target="_blank">{{ paper.title }}</a></h1>
+<p>{{ paper.authors | join(', ') }}</p><p>{{ paper.published }} [{{ paper.arxiv_tag }}]</p>
+<pre>{{ paper.bibtex }}</pre><button data-bib="{{ paper.bibtex | tojson }}" onclick="copyFromData(this)">Copy</button>
+<script src="/static/copy.js"></script></body></html>
+""",
+}
+
+
+def bench_eval(latency: float = 0.5) -> List[Dict]:
+    """Pure-LLM evaluation vs static pre-checks + judgment-only prompts.
+
+    Runs once on the sample webapp and once with a template syntax error in
+    index.html (a hard failure, which skips the model for that file).
+    """
+    import json
+    import tempfile
+    from pathlib import Path
+    from agents.eval_agent import EvalAgent
+    from agents.static_checks import run_checks
+
+    prompt_chars = []
+
+    def call_qwen(prompt, **kwargs):
+        prompt_chars.append(len(prompt))
+        time.sleep(latency)
+        return json.dumps({"score": 8, "fatal_errors": [], "warnings": [], "suggestions": []})
+
+    rows = []
+    for case in ("sample", "broken-index"):
+        files = dict(SAMPLE_WEBAPP)
+        if case == "broken-index":
+            files["webapp/templates/index.html"] = files["webapp/templates/index.html"].replace("{% endfor %}</main>", "</main>")
+        with tempfile.TemporaryDirectory() as ws:
+            for rel, code in files.items():
+                Path(ws, rel).parent.mkdir(parents=True, exist_ok=True)
+                Path(ws, rel).write_text(code, encoding="utf-8")
+            for static in (False, True):
+                prompt_chars.clear()
+                agent = EvalAgent("bench", {}, ws, call_qwen, max_workers=1, static_checks=static)
+                t0 = time.perf_counter()
+                result = agent.evaluate_web_app({})
+                wall = time.perf_counter() - t0
+                rows.append({"case": case, "mode": "static+llm" if static else "llm",
+                             "llm_calls": agent.stats["llm_evals"],
+                             "prompt_chars": sum(prompt_chars),
+                             "wall_s": round(wall, 3), "score": result["overall_score"]})
+        t0 = time.perf_counter()
+        for key, rel in (("main", "webapp/main.py"), ("index", "webapp/templates/index.html"),
+                         ("js", "webapp/static/copy.js"), ("paper", "webapp/templates/paper.html")):
+            run_checks(key, files[rel] + " ")  # defeat the AST cache
+        rows.append({"case": case, "mode": "checks only", "llm_calls": 0, "prompt_chars": 0,
+                     "wall_s": round(time.perf_counter() - t0, 4), "score": "-"})
+    return rows
+
+
+def bench_search(docs: int = 100_000, queries: int = 100, batch: int = 5_000) -> List[Dict]:
+    """FTS5 search in the PaperStore vs a linear scan over Paper records.
+
+    Papers are ingested in category batches (as refresh_categories does),
+    so the build time includes keeping the index up to date.
+    """
+    from tools.paper_store import PaperStore
+
+    entries = synthetic_entries(docs)
+    # synthetic_entries only uses a handful of words; add Zipf-distributed rare
+    # terms so selective queries look like real keyword searches
+    rng = random.Random(1)
+    vocab = [f"term{k}" for k in range(50_000)]
+    weights = [1.0 / (k + 1) for k in range(len(vocab))]
+    for e in entries:
+        e["summary"] += " " + " ".join(rng.choices(vocab, weights, k=8))
+    papers = [_as_paper(e) for e in entries]
+    store = PaperStore(":memory:")
+    t0 = time.perf_counter()
+    for i in range(0, docs, batch):
+        store.upsert_category(f"batch-{i // batch}", papers[i:i + batch])
+    build = time.perf_counter() - t0
+
+    cases = {
+        "rare terms": [" ".join(rng.choices(vocab[100:2000], k=2)) for _ in range(queries)],
+        "common word": [rng.choice(_WORDS) for _ in range(queries)],
+        "author": [f"author:{rng.choice(_AUTHORS).split()[0]}" for _ in range(queries)],
+    }
+
+    def scan(q, limit=20):
+        words = [w.lower() for w in q.replace("author:", "").split()]
+        out = []
+        for p in papers:
+            hay = " ".join((p.title, " ".join(p.authors), p.summary)).lower()
+            if all(w in hay for w in words):
+                out.append(p)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def pct(samples, q):
+        samples = sorted(samples)
+        return round(1000 * samples[min(len(samples) - 1, int(q * len(samples)))], 3)
+
+    rows = []
+    for case, qs in cases.items():
+        for mode, fn in (("fts5 bm25", lambda q: store.search(q, limit=20)), ("linear scan", scan)):
+            n = qs if mode == "fts5 bm25" else qs[:max(1, len(qs) // 10)]
+            lat = []
+            for q in n:
+                t = time.perf_counter()
+                fn(q)
+                lat.append(time.perf_counter() - t)
+            rows.append({"docs": docs, "query": case, "mode": mode, "build_s": round(build, 2),
+                         "p50_ms": pct(lat, 0.5), "p95_ms": pct(lat, 0.95)})
+    store.close()
+    return rows
+
+
+def bench_related(sizes=(5_000, 20_000), batch: int = 250) -> List[Dict]:
+    """Related-papers index: a new feed batch merged incrementally vs a full rebuild."""
+    from tools.related import RelatedIndex
+
+    rows = []
+    for n in sizes:
+        papers = [_as_paper(e) for e in synthetic_entries(n + batch)]
+        index = RelatedIndex()
+        t0 = time.perf_counter()
+        index.ingest(papers[:n])
+        initial = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index.ingest(papers[n:])
+        update = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index.rebuild()
+        rebuild = time.perf_counter() - t0
+        rows.append({"papers": n, "initial_s": round(initial, 3),
+                     f"+{batch}_update_s": round(update, 3), "rebuild_s": round(rebuild, 3)})
+    return rows
+
+_SAMPLE_TOOLS = """from typing import List, Optional
+from .paper import Paper
+
+
+def fetch_category_rss(category: str, max_items: int = 50) -> List[Paper]:
+    return []
+
+
+def search_papers(query: str, limit: int = 20, category: Optional[str] = None) -> List[Paper]:
+    return []
+"""
+
+# prompt marker -> canned answer, first match wins (refine / eval prompts quote the code files)
+_PIPELINE_ANSWERS = (
+    ("Code Evaluation Agent", json.dumps({"score": 7, "fatal_errors": [],
+                                          "warnings": ["sample warning"], "suggestions": []})),
+    ("Evaluation Report:", "---copy.js---\n<<<<<<< SEARCH\nfunction copyFromData(btn) {\n=======\n"
+                           "// refined\nfunction copyFromData(btn) {\n>>>>>>> REPLACE\n"),
+    ("backend named main.py", SAMPLE_WEBAPP["webapp/main.py"]),
+    ("index.html Jinja2", SAMPLE_WEBAPP["webapp/templates/index.html"]),
+    ("copy.js file", SAMPLE_WEBAPP["webapp/static/copy.js"]),
+    ("paper.html Jinja2", SAMPLE_WEBAPP["webapp/templates/paper.html"]),
+    ("import feedparser", _SAMPLE_TOOLS),
+)
+
+
+def pipeline_responder(messages) -> str:
+    """Deterministic stand-in for the model, good enough to drive every phase."""
+    prompt = messages[-1]["content"]
+    for marker, answer in _PIPELINE_ANSWERS:
+        if marker in prompt:
+            return answer
+    return ""
+
+
+def _git_commit() -> str:
+    import subprocess
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def bench_pipeline(latency: float = 0.2, tokens_per_sec: float = 200.0, recordings=None,
+                   max_rounds: int = 3, history=None) -> List[Dict]:
+    """End-to-end run_demo against a ReplayBackend, per phase.
+
+    With ``history`` every run is appended to a JSONL file together with the
+    current commit, and the wall-time change against the previous run with
+    the same settings is reported.
+    """
+    import contextlib
+    import tempfile
+    from agents.llm_backends import ReplayBackend
+    from orchestrator import PhaseMeter, run_demo
+
+    backend = ReplayBackend(recordings, fallback=pipeline_responder,
+                            latency=latency, tokens_per_sec=tokens_per_sec)
+    meter = PhaseMeter(backend)
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as ws, contextlib.redirect_stdout(io.StringIO()):
+        run_demo(workspace=ws, backend=backend, enable_cache=False,
+                 max_rounds=max_rounds, meter=meter)
+    total = time.perf_counter() - t0
+
+    rows = [{"phase": name, "wall_s": round(r["wall_s"], 3), "llm_calls": r["calls"],
+             "prompt_tok": r["prompt_tokens"], "compl_tok": r["completion_tokens"]}
+            for name, r in meter.phases.items()]
+    stats = backend.snapshot()
+    rows.append({"phase": "total", "wall_s": round(total, 3), "llm_calls": stats["calls"],
+                 "prompt_tok": stats["prompt_tokens"], "compl_tok": stats["completion_tokens"]})
+
+    if history:
+        settings = {"latency": latency, "tokens_per_sec": tokens_per_sec, "max_rounds": max_rounds,
+                    "recordings": str(recordings) if recordings else None}
+        previous = None
+        if os.path.exists(history):
+            with open(history, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry.get("settings") == settings:
+                            previous = entry
+        with open(history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"commit": _git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                "settings": settings, "phases": rows}) + "\n")
+        if previous:
+            before = {r["phase"]: r for r in previous["phases"]}
+            for r in rows:
+                old = before.get(r["phase"])
+                r["vs_" + (previous.get("commit") or "prev")] = (
+                    f"{r['wall_s'] - old['wall_s']:+.3f}s" if old else "-")
+    return rows
+
+
+def bench_pipelines(count: int = 8, latency: float = 0.2) -> List[Dict]:
+    """count pipelines one after another (run_demo) vs on one event loop (arun_many)."""
+    import asyncio
+    import contextlib
+    import tempfile
+    from agents.llm_backends import ReplayBackend
+    from orchestrator import arun_many, run_demo
+
+    rows = []
+    for mode in ("sequential", "async"):
+        backend = ReplayBackend(fallback=pipeline_responder, latency=latency)
+        with tempfile.TemporaryDirectory() as root, contextlib.redirect_stdout(io.StringIO()):
+            workspaces = [os.path.join(root, f"p{i}") for i in range(count)]
+            t0 = time.perf_counter()
+            if mode == "sequential":
+                for ws in workspaces:
+                    run_demo(workspace=ws, backend=backend, enable_cache=False)
+            else:
+                asyncio.run(arun_many(workspaces, backend=backend, enable_cache=False))
+            wall = time.perf_counter() - t0
+        rows.append({"mode": mode, "pipelines": count, "llm_calls": backend.snapshot()["calls"],
+                     "wall_s": round(wall, 3), "per_pipeline_s": round(wall / count, 3)})
+    return rows
+
+
+def _print_rows(rows: List[Dict]):
+    if not rows:
+        return
+    cols = list(rows[0])
+    print("  ".join(f"{c:>14}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{r[c]:>14}" for c in cols))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("paper-memory", help="dict vs Paper record memory")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+
+    p = sub.add_parser("feed-parse", help="feedparser vs streaming feed reader")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    p.add_argument("--max-items", type=int, default=50)
+
+    p = sub.add_parser("fetch", help="concurrent feed fetch against a local feed server")
+    p.add_argument("--delay", type=float, default=0.2)
+    p.add_argument("--categories", type=int, default=8)
+    p.add_argument("--per-host", type=int, default=4)
+    p.add_argument("--deadline", type=float, default=1.0)
+
+    p = sub.add_parser("codegen", help="sequential vs concurrent webapp generation")
+    p.add_argument("--latency", type=float, default=0.5)
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+
+    p = sub.add_parser("stream", help="buffered vs streamed completion written to disk")
+    p.add_argument("--lines", type=int, default=2000)
+    p.add_argument("--chunk-latency", type=float, default=0.002)
+
+    p = sub.add_parser("eval", help="pure-LLM vs static-checked evaluation")
+    p.add_argument("--latency", type=float, default=0.5)
+
+    p = sub.add_parser("search", help="FTS5 paper search vs linear scan")
+    p.add_argument("--docs", type=int, default=100_000)
+    p.add_argument("--queries", type=int, default=100)
+
+    p = sub.add_parser("related", help="incremental vs full related-papers update")
+    p.add_argument("--sizes", type=int, nargs="+", default=[5_000, 20_000])
+
+    p = sub.add_parser("pipeline", help="end-to-end run against a replayed model, per phase")
+    p.add_argument("--latency", type=float, default=0.2)
+    p.add_argument("--tokens-per-sec", type=float, default=200.0)
+    p.add_argument("--recordings", help="JSONL written by RecordingBackend")
+    p.add_argument("--max-rounds", type=int, default=3)
+    p.add_argument("--history", help="append results to this JSONL and compare with the last run")
+
+    p = sub.add_parser("pipelines", help="sequential vs async concurrent pipelines")
+    p.add_argument("--count", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+    if args.bench == "paper-memory":
+        _print_rows(bench_paper_memory(args.sizes))
+    elif args.bench == "feed-parse":
+        _print_rows(bench_feed_parse(args.sizes, args.max_items))
+    elif args.bench == "fetch":
+        _print_rows(bench_fetch(args.delay, args.categories, args.per_host, args.deadline))
+    elif args.bench == "codegen":
+        _print_rows(bench_codegen(args.latency, args.concurrency))
+    elif args.bench == "stream":
+        _print_rows(bench_stream(args.lines, args.chunk_latency))
+    elif args.bench == "eval":
+        _print_rows(bench_eval(args.latency))
+    elif args.bench == "search":
+        _print_rows(bench_search(args.docs, args.queries))
+    elif args.bench == "related":
+        _print_rows(bench_related(args.sizes))
+    elif args.bench == "pipeline":
+        _print_rows(bench_pipeline(args.latency, args.tokens_per_sec, args.recordings,
+                                   args.max_rounds, args.history))
+    elif args.bench == "pipelines":
+        _print_rows(bench_pipelines(args.count, args.latency))
+
+
+if __name__ == "__main__":
+    main()
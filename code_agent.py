@@ -1,45 +1,241 @@
-from .agent_base import AgentBase
+from .agent_base import AgentBase, AsyncAgentBase
+from .llm_backends import Completion, LLMBackend, OpenAIBackend
+from .llm_cache import LLMResponseCache, request_key
+from .patching import estimate_tokens, iter_lines
 from tools.fs_tools import write_file, ensure_workspace
-from typing import Dict, Any
+from tools.tracing import current_span, in_context, span
+from typing import Dict, Any, Iterable, Iterator, Optional
 from pathlib import Path
-import os
-from openai import OpenAI
+import asyncio
 import json 
 import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from unittest.mock import patch
 from typing import List, Dict
 
+def strip_fences_stream(chunks: Iterable[str]) -> Iterator[str]:
+    """Streaming counterpart of the fence cleanup in _complete.
+
+    Works line by line: if the first non-blank line is a ``` fence, every
+    fence line is dropped; leading blank lines and trailing blank lines are
+    removed like str.strip() would.
+    """
+    fenced = None
+    pending_blank = 0
+    for line in iter_lines(chunks):
+        if not line.strip():
+            if fenced is not None:
+                pending_blank += 1
+            continue
+        if fenced is None:
+            fenced = line.lstrip().startswith("```")
+        if fenced and line.strip().startswith("```"):
+            continue
+        yield "\n" * pending_blank + line + "\n"
+        pending_blank = 0
+
+
+class TruncatedOutput(RuntimeError):
+    """A completion stopped at max_tokens, so the generated code is incomplete."""
+
+
 class CodeAgent(AgentBase):
+    MODEL = "qwen-plus"
+    SYSTEM_PROMPT = "You are a professional Python software engineer. Output ONLY valid pure code. Do NOT include markdown or ```."
+    # 生成文件的输出上限：main.py 规格较长，单独放宽；被截断时翻倍重试，不超过 MAX_OUTPUT_TOKENS
+    GEN_MAX_TOKENS = 2048
+    ARTIFACT_MAX_TOKENS = {"webapp/main.py": 6144, "tools/arxiv_tools.py": 4096}
+    MAX_OUTPUT_TOKENS = 8192
+
     def __init__(self, name: str, shared_state: Dict[str, Any],
                  workspace="workspace",
-                 enable_llm=True):
+                 enable_llm=True,
+                 client=None,
+                 backend: Optional[LLMBackend] = None,
+                 llm_cache: Optional[LLMResponseCache] = None,
+                 enable_cache=True,
+                 gen_concurrency=4,
+                 gen_timeout=120.0,
+                 gen_retries=2,
+                 stream=False,
+                 brief: str = ""):
         super().__init__(name, shared_state)
         self.workspace = Path(workspace)
         ensure_workspace(self.workspace)
 
         self.enable_llm = enable_llm  # 是否启用 QWEN 生成
 
-        self.client = OpenAI(
-            api_key=os.getenv("DASHSCOPE_API_KEY"),
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
-
-    def call_qwen(self, prompt: str) -> str:
-        """调用 QWEN 生成代码，并清洗 Markdown 格式"""
+        # 模型后端：默认 DashScope；client 可替换为 FakeChatClient，
+        # backend 可替换为 ReplayBackend 等离线实现
+        self.backend = backend or OpenAIBackend(client=client)
+
+        # 相同请求（模型、消息、温度、max_tokens）直接复用缓存结果
+        if llm_cache is None and enable_cache:
+            llm_cache = LLMResponseCache()
+        self.llm_cache = llm_cache
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+        self._ainflight: Dict[str, asyncio.Future] = {}
+
+        # 多文件生成：并发上限、单文件超时（秒）与重试次数
+        self.gen_concurrency = gen_concurrency
+        self.gen_timeout = gen_timeout
+        self.gen_retries = gen_retries
+        # 流式生成：边接收边去除代码围栏并写入目标文件
+        self.stream = stream
+        # 项目变体说明（分类、布局等），附加到每个生成提示词末尾
+        self.brief = brief.strip()
+
+    def call_qwen(self, prompt: str, use_cache: bool = True,
+                  temperature: float = 0.2, max_tokens: int = 2048,
+                  timeout: Optional[float] = None, stream: bool = False,
+                  allow_truncated: bool = True):
+        """调用 QWEN 生成代码，并清洗 Markdown 格式
+
+        use_cache=False 跳过响应缓存，强制重新请求；timeout 为单次请求超时（秒）。
+        stream=True 返回文本块迭代器（已去除围栏），可直接交给 write_file。
+        在 max_tokens 处截断的结果不写入缓存；allow_truncated=False 时抛出 TruncatedOutput。
+        """
+        messages = [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        if stream:
+            return self._stream(messages, temperature, max_tokens, timeout, use_cache,
+                                allow_truncated)
         if not self.enable_llm:
             return ""
-
-        resp = self.client.chat.completions.create(
-            model="qwen-plus",
-            messages=[
-                {"role": "system", "content": "You are a professional Python software engineer. Output ONLY valid pure code. Do NOT include markdown or ```."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,
-            max_tokens=2048
-        )
-
-        raw = resp.choices[0].message.content.strip()
+        with span("llm.call_qwen", model=self.MODEL, stream=False, cached=False):
+            return self._call(messages, temperature, max_tokens, timeout, use_cache,
+                              allow_truncated)
+
+    def _call(self, messages, temperature, max_tokens, timeout, use_cache,
+              allow_truncated=True) -> str:
+        if not (use_cache and self.llm_cache):
+            return self._accept(self._complete(messages, temperature, max_tokens, timeout),
+                                max_tokens, allow_truncated)
+
+        key = request_key(self.MODEL, messages, temperature, max_tokens)
+        while True:
+            cached = self.llm_cache.get(key)
+            if cached is not None:
+                current_span().set(cached=True)
+                return cached
+            # 同一请求并发时只发出一次，其余等待结果
+            with self._inflight_lock:
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            # 首个请求失败时缓存仍为空，下一轮由当前线程重新发起
+            waiter.wait()
+
+        try:
+            c = self._complete(messages, temperature, max_tokens, timeout)
+            if c.finish_reason != "length":
+                self.llm_cache.put(key, c.text, {"model": self.MODEL})
+            return self._accept(c, max_tokens, allow_truncated)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key).set()
+
+    @staticmethod
+    def _accept(c, max_tokens, allow_truncated) -> str:
+        if c.finish_reason == "length" and not allow_truncated:
+            raise TruncatedOutput(f"completion stopped at max_tokens={max_tokens}")
+        return c.text
+
+    def _stream(self, messages, temperature, max_tokens, timeout=None,
+                use_cache=True, allow_truncated=True) -> Iterator[str]:
+        if not self.enable_llm:
+            return
+        with span("llm.call_qwen", model=self.MODEL, stream=True, cached=False) as s:
+            key = request_key(self.MODEL, messages, temperature, max_tokens)
+            cache = self.llm_cache if use_cache else None
+            cached = cache.get(key) if cache else None
+            if cached is not None:
+                s.set(cached=True)
+                yield cached
+                return
+
+            finish = []
+
+            def deltas():
+                finish.append((yield from self.backend.stream(
+                    self.MODEL, messages, temperature, max_tokens, timeout)))
+
+            parts = []
+            t0, n_chars = time.perf_counter(), 0
+            for piece in strip_fences_stream(deltas()):
+                if not n_chars:
+                    s.set(first_chunk_s=round(time.perf_counter() - t0, 4))
+                n_chars += len(piece)
+                if cache:
+                    parts.append(piece)
+                yield piece
+            truncated = finish == ["length"]
+            s.set(prompt_tokens=sum(estimate_tokens(m["content"]) for m in messages),
+                  completion_tokens=(n_chars + 3) // 4, finish_reason=finish[0] if finish else None)
+            # 只缓存完整接收且未被截断的结果
+            if cache and not truncated:
+                cache.put(key, "".join(parts).strip(), {"model": self.MODEL})
+            if truncated and not allow_truncated:
+                # 消费方（如 write_file）收到异常后丢弃已写入的部分
+                raise TruncatedOutput(f"completion stopped at max_tokens={max_tokens}")
+
+    def _complete(self, messages, temperature, max_tokens, timeout=None) -> Completion:
+        """Backend completion with its text cleaned of Markdown fences."""
+        c = self.backend.complete(self.MODEL, messages, temperature, max_tokens, timeout)
+        return c._replace(text=self._clean(c))
+
+    async def acall_qwen(self, prompt: str, use_cache: bool = True,
+                         temperature: float = 0.2, max_tokens: int = 2048,
+                         timeout: Optional[float] = None, allow_truncated: bool = True) -> str:
+        """call_qwen for coroutines: the request waits in the event loop, not in a thread."""
+        if not self.enable_llm:
+            return ""
+        messages = [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        with span("llm.call_qwen", model=self.MODEL, stream=False, cached=False, coroutine=True) as s:
+            if not (use_cache and self.llm_cache):
+                c = await self.backend.acomplete(self.MODEL, messages, temperature, max_tokens, timeout)
+                return self._accept(c._replace(text=self._clean(c)), max_tokens, allow_truncated)
+            key = request_key(self.MODEL, messages, temperature, max_tokens)
+            cached = self.llm_cache.get(key)
+            if cached is not None:
+                s.set(cached=True)
+                return cached
+            # 同一事件循环中的相同请求共享一个 Future
+            pending = self._ainflight.get(key)
+            if pending is not None:
+                s.set(cached=True)
+                return self._accept(await asyncio.shield(pending), max_tokens, allow_truncated)
+            pending = self._ainflight[key] = asyncio.get_running_loop().create_future()
+            try:
+                c = await self.backend.acomplete(self.MODEL, messages, temperature, max_tokens, timeout)
+                c = c._replace(text=self._clean(c))
+                if c.finish_reason != "length":
+                    self.llm_cache.put(key, c.text, {"model": self.MODEL})
+                pending.set_result(c)
+                return self._accept(c, max_tokens, allow_truncated)
+            except asyncio.CancelledError:
+                pending.cancel()
+                raise
+            except Exception as e:
+                pending.set_exception(e)
+                pending.exception()     # 无人等待时不报 "exception was never retrieved"
+                raise
+            finally:
+                self._ainflight.pop(key, None)
+
+    def _clean(self, c) -> str:
+        current_span().set(prompt_tokens=c.prompt_tokens, completion_tokens=c.completion_tokens,
+                           finish_reason=c.finish_reason)
+        raw = c.text.strip()
 
         # ===== 清洗 Markdown 代码块 =====
         if raw.startswith("```"):
@@ -88,15 +284,33 @@ class CodeAgent(AgentBase):
     # ---------------------------
     # 2. Generate arxiv tools
     # ---------------------------
+    def _with_brief(self, artifacts: Dict[str, str]) -> Dict[str, str]:
+        if not self.brief:
+            return artifacts
+        note = f"\n\nProject-specific requirements (they override the defaults above):\n{self.brief}\n"
+        return {rel: prompt + note for rel, prompt in artifacts.items()}
+
     def _generate_arxiv_tools(self):
+        artifacts = self._arxiv_tools_artifacts()
+        for rel, prompt in artifacts.items():
+            self._generate_artifact(rel, prompt)
+        return {"status": "ok", "files": list(artifacts)}
+
+    def _arxiv_tools_artifacts(self) -> Dict[str, str]:
+        """Create tools/ and return {relative path: prompt} for the generated tools."""
         tools_dir = self.workspace / "tools"
         ensure_workspace(tools_dir)
         write_file(tools_dir / "__init__.py", "")
 
         # Prompt that will be sent to model to produce a robust arxiv_tools.py
         tools_prompt = '''
+        import hashlib
+        import re
+        import sqlite3
+        import sys
+        import threading
         import feedparser
-        from typing import List, Dict
+        from typing import List, Dict, Optional
         from datetime import datetime
 
         def _normalize_date(date_str: str) -> str:
@@ -112,25 +326,77 @@ class CodeAgent(AgentBase):
             # fallback
             return date_str[:10]
 
-        def fetch_category_rss(category_tag: str, max_items: int = 20) -> List[Dict]:
+        class Paper:
             """
-            Fetch arXiv RSS for category_tag and return a list of normalized dicts.
+            Compact paper record (no per-entry dict).
 
-            Each dict fields:
+            Fields (attribute access, so Jinja can use paper.title etc.):
             - id: str (arXiv id)
             - title: str
-            - authors: List[str]  # list of author names only (no affiliation)
+            - authors: tuple of author names only (no affiliation), each sys.intern'ed
             - published: str      # YYYY-MM-DD
-            - arxiv_tag: str      # e.g. cs.CV or wrapped [cs.CV] depending on template needs
-            - abs_link: str       # https://arxiv.org/abs/{id}
-            - pdf_link: str       # https://arxiv.org/pdf/{id}.pdf
+            - arxiv_tag: str      # e.g. cs.CV, sys.intern'ed (shared by every paper of a category)
             - summary: str
-            - bibtex: str
-            - citation: str
+            - abs_link: property  # https://arxiv.org/abs/{id}
+            - pdf_link: property  # https://arxiv.org/pdf/{id}.pdf
+            - bibtex: property, built on first access and then stored in _bibtex
+            - citation: property, built on first access and then stored in _citation
+            Also provide __getitem__ and get() delegating to getattr so paper['title'] keeps working.
+            """
+            __slots__ = ("id", "title", "authors", "published", "arxiv_tag", "summary",
+                         "_bibtex", "_citation")
+
+            def __init__(self, id, title, authors, published, arxiv_tag, summary):
+                self.id = id
+                self.title = title
+                self.authors = tuple(sys.intern(a) for a in authors)
+                self.published = published
+                self.arxiv_tag = sys.intern(arxiv_tag)
+                self.summary = summary
+                self._bibtex = None
+                self._citation = None
+
+            @property
+            def abs_link(self):
+                return f"https://arxiv.org/abs/{self.id}" if self.id else ""
+
+            @property
+            def pdf_link(self):
+                return f"https://arxiv.org/pdf/{self.id}.pdf" if self.id else ""
+
+            @property
+            def bibtex(self):
+                if self._bibtex is None:
+                    author_names_for_bib = " and ".join(self.authors) if self.authors else "Unknown"
+                    self._bibtex = f"""@article{{{self.id or 'unknown'},
+            title={{ {self.title.replace('{','{{').replace('}','}}')} }},
+            author={{ {author_names_for_bib} }},
+            journal={{arXiv preprint arXiv:{self.id} }},
+            year={{ {self.published[:4] if self.published else ''} }}
+            }}"""
+                return self._bibtex
+
+            @property
+            def citation(self):
+                if self._citation is None:
+                    author_names_for_cite = ", ".join(self.authors) if self.authors else "Unknown"
+                    self._citation = f"{author_names_for_cite}. {self.title}. arXiv:{self.id} ({self.published[:4] if self.published else ''})."
+                return self._citation
+
+            def __getitem__(self, key):
+                return getattr(self, key)
+
+            def get(self, key, default=None):
+                return getattr(self, key, default)
+
+        def fetch_category_rss(category_tag: str, max_items: int = 20) -> List[Paper]:
+            """
+            Fetch arXiv RSS for category_tag and return a list of Paper records.
 
             Notes:
             - Authors: handle entries where a single author field contains "A, B, C" by splitting on commas.
             - Use safe fallbacks if feed data is missing.
+            - Do NOT build bibtex/citation strings here; Paper computes them lazily.
             """
 
             url = f"http://export.arxiv.org/rss/{category_tag}"
@@ -142,9 +408,6 @@ class CodeAgent(AgentBase):
                 link = entry.get("link", "") or entry.get("id", "")
                 arxiv_id = link.rstrip("/").split("/")[-1] if link else (entry.get("id", "") or "")
 
-                abs_link = f"https://arxiv.org/abs/{arxiv_id}" if arxiv_id else link
-                pdf_link = f"https://arxiv.org/pdf/{arxiv_id}.pdf" if arxiv_id else ""
-
                 # parse authors => List[str]
                 authors = []
                 if hasattr(entry, "authors") and entry.authors:
@@ -165,39 +428,67 @@ class CodeAgent(AgentBase):
                 published_raw = entry.get("published", "") or entry.get("updated", "")
                 published = _normalize_date(published_raw)
 
-                # build bibtex and citation (simple reasonable default)
-                author_names_for_bib = " and ".join(authors) if authors else "Unknown"
-                author_names_for_cite = ", ".join(authors) if authors else "Unknown"
+                papers.append(Paper(
+                    id=arxiv_id,
+                    title=entry.get("title", ""),
+                    authors=authors,
+                    published=published,
+                    arxiv_tag=category_tag,
+                    summary=entry.get("summary", ""),
+                ))
 
-                bibtex = f"""@article{{{arxiv_id or 'unknown'},
-            title={{ {entry.get('title','').replace('{','{{').replace('}','}}')} }},
-            author={{ {author_names_for_bib} }},
-            journal={{arXiv preprint arXiv:{arxiv_id} }},
-            year={{ {published[:4] if published else ''} }}
-            }}"""
+            _index_papers(category_tag, papers)
+            return papers
 
-                citation = f"{author_names_for_cite}. {entry.get('title','')}. arXiv:{arxiv_id} ({published[:4] if published else ''})."
-
-                papers.append({
-                    "id": arxiv_id,
-                    "title": entry.get("title", ""),
-                    "authors": authors,
-                    "published": published,
-                    "arxiv_tag": category_tag,
-                    "abs_link": abs_link,
-                    "pdf_link": pdf_link,
-                    "summary": entry.get("summary", ""),
-                    "bibtex": bibtex,
-                    "citation": citation
-                })
+        # Full-text search: one SQLite FTS5 index, updated as feeds are fetched (never per request).
+        _DB = sqlite3.connect(":memory:", check_same_thread=False)
+        _DB_LOCK = threading.Lock()
+        _DB.executescript("""
+        CREATE VIRTUAL TABLE papers_fts USING fts5(id UNINDEXED, title, authors, summary);
+        CREATE TABLE paper_categories (category TEXT, id TEXT, PRIMARY KEY (category, id));
+        """)
+        _PAPERS: Dict[str, Paper] = {}
+        _HASHES: Dict[str, str] = {}
+
+        def _index_papers(category_tag: str, papers: List[Paper]):
+            """Add new or changed papers to the index; unchanged ones are skipped."""
+            with _DB_LOCK, _DB:
+                for p in papers:
+                    if not p.id:
+                        continue
+                    h = hashlib.sha1("\\n".join((p.title, ", ".join(p.authors), p.summary)).encode()).hexdigest()
+                    if _HASHES.get(p.id) != h:
+                        _DB.execute("DELETE FROM papers_fts WHERE id = ?", (p.id,))
+                        _DB.execute("INSERT INTO papers_fts (id, title, authors, summary) VALUES (?,?,?,?)",
+                                    (p.id, p.title, ", ".join(p.authors), p.summary))
+                        _HASHES[p.id] = h
+                    _PAPERS[p.id] = p
+                    _DB.execute("INSERT OR IGNORE INTO paper_categories VALUES (?, ?)", (category_tag, p.id))
+
+        def search_papers(query: str, limit: int = 20, category: Optional[str] = None) -> List[Paper]:
+            """
+            Keyword / author search over every fetched paper, best BM25 match first.
 
-            return papers
+            Every word must match title, authors or summary (the last one as a prefix);
+            category restricts results to papers listed in that category.
+            """
+            words = re.findall(r"\\w+", query.lower())
+            if not words:
+                return []
+            match = " ".join(f'"{w}"' for w in words[:-1]) + f' "{words[-1]}"*'
+            sql = "SELECT id FROM papers_fts WHERE papers_fts MATCH ?"
+            args = [match.strip()]
+            if category:
+                sql += " AND id IN (SELECT id FROM paper_categories WHERE category = ?)"
+                args.append(category)
+            sql += " ORDER BY rank LIMIT ?"
+            args.append(limit)
+            with _DB_LOCK:
+                ids = [row[0] for row in _DB.execute(sql, args)]
+            return [_PAPERS[i] for i in ids if i in _PAPERS]
                 '''
 
-        tools_code = self.call_qwen(tools_prompt)
-        write_file(tools_dir / "arxiv_tools.py", tools_code)
-
-        return {"status": "ok", "files": ["tools/arxiv_tools.py"]}
+        return self._with_brief({"tools/arxiv_tools.py": tools_prompt})
 
         
     # ---------------------------
@@ -209,6 +500,20 @@ class CodeAgent(AgentBase):
         text = text.replace("```", "")
         return text
     def _generate_web_app(self):
+        # 四个文件互不依赖，并发生成
+        artifacts = self._web_app_artifacts()
+        return self._artifacts_result(artifacts, self._generate_artifacts(artifacts))
+
+    @staticmethod
+    def _artifacts_result(artifacts: Dict[str, str], errors: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            "status": "ok" if not errors else "partial",
+            "files": [f for f in artifacts if f not in errors],
+            "errors": errors,
+        }
+
+    def _web_app_artifacts(self) -> Dict[str, str]:
+        """Create webapp/ and return {relative path: prompt} for its four files."""
         app_dir = self.workspace / "webapp"
         templates_dir = app_dir / "templates"
         static_dir = app_dir / "static"
@@ -218,16 +523,33 @@ class CodeAgent(AgentBase):
 
         write_file(app_dir / "__init__.py", "")
 
-        # main.py prompt: import and use fetch_category_rss from tools.arxiv_tools
+        # main.py prompt: import and use fetch_category_rss / search_papers from tools.arxiv_tools
         main_prompt = """
     Build a FastAPI backend named main.py for "arXiv CS Daily" with these strict rules:
 
-    1) Import fetch_category_rss from tools.arxiv_tools and use it to fetch papers, remember to Import StaticFiles
+    1) Import fetch_category_rss and search_papers from tools.arxiv_tools; use fetch_category_rss to fetch papers, remember to Import StaticFiles
     2) CATEGORIES = ["cs.AI","cs.CV","cs.CL","cs.LG","cs.NE"]
     3) Routes:
     - '/' : render templates/index.html with variables:
-        request, categories, selected, papers
-        Where papers is a dict mapping category -> List[paper_dict] (paper_dict as in tools).
+        request, categories, selected, papers, next_cursor
+        Where papers is a dict mapping category -> List[Paper] (the Paper record from tools, read fields by attribute)
+        holding only the first PAGE_SIZE = 20 papers of the selected category, and next_cursor is the id of the
+        last of them when more remain (else None).
+        selected comes from the query parameter 'cat' (default CATEGORIES[0]; unknown values fall back to it).
+    - '/api/papers?cat=&cursor=&limit=' : JSON page of one category.
+        limit defaults to PAGE_SIZE and is clamped to 1..100. cursor is the id of the last paper the client
+        already has; the page starts right after POSITION[cat][cursor] (no cursor = start). An unknown cursor
+        returns 400 with {"error": "unknown cursor"}.
+        Response: {"category", "version", "items": [...], "next_cursor": id of the last item or null}, where each
+        item is a dict of id, title, authors (list), summary, published, arxiv_tag, abs_link, pdf_link, bibtex, citation.
+    - '/search?q=&cat=&limit=' : keyword / author search over every loaded paper, returning
+        {"query", "items": [...]} with the same item dicts as /api/papers, best match first.
+        Call search_papers(q, limit=limit, category=cat or None) from tools.arxiv_tools: it queries the
+        SQLite FTS5 (BM25-ranked) index in tools/arxiv_tools.py, which fetch_category_rss updates as it fetches.
+        Do not build a search index in main.py. limit defaults to 20 and is clamped to 1..100; an empty q
+        returns no items.
+    - '/api/papers/stream?cat=' : StreamingResponse(media_type="application/x-ndjson") over a plain generator
+        yielding one json.dumps(item) + "\n" line per paper of the current snapshot, so clients render as lines arrive.
     - No internal /paper detail route is necessary; titles link directly to arXiv abs pages.
     4) Templates directory must be configured using Jinja2Templates correctly:
         - Use absolute paths to set TEMPLATES_DIR = BASE_DIR / "templates".
@@ -236,12 +558,37 @@ class CodeAgent(AgentBase):
     5) Mount a safe static directory:
     STATIC_DIR = Path(__file__).parent / "static"
     Create STATIC_DIR if missing and mount at '/static'
-    6) Do not transform links; keep paper['abs_link'] and paper['pdf_link'] unchanged so templates can link directly to arXiv.
-    7) Provide minimal, well-formed Python code only (no comments/explanations).
+    6) Do not transform links; keep paper.abs_link and paper.pdf_link unchanged so templates can link directly to arXiv.
+    7) Provide complete, well-formed Python code only (no comments/explanations); implement every rule in this list.
     8) Do not await a synchronization function
+    9) Feed snapshot and versions (stale-while-revalidate):
+        - Keep module-level PAPERS = {} (category -> list), VERSIONS = {} (category -> int),
+          SIGNATURES = {} (category -> str) and LAST_ERROR = {} (category -> str), guarded by a threading.Lock.
+        - load_category(cat) is a plain (sync) function: papers = fetch_category_rss(cat);
+          signature = sha1 over each paper's id and title; only when the signature differs from
+          SIGNATURES[cat], replace PAPERS[cat] and increment VERSIONS[cat]. If fetching raises, record
+          the message in LAST_ERROR[cat] and keep the previous PAPERS[cat] untouched.
+        - Request handlers never call fetch_category_rss or load_category; they only read the latest
+          snapshot (a category not loaded yet shows an empty list).
+        - When PAPERS[cat] is replaced, also rebuild POSITION[cat] = {paper.id: index} for cursor lookups.
+    10) Background refresher:
+        - REFRESH_SECONDS = 300.
+        - async def refresh_loop(): forever, run all categories concurrently with
+          await asyncio.gather(*(asyncio.to_thread(load_category, c) for c in CATEGORIES), return_exceptions=True),
+          then await asyncio.sleep(REFRESH_SECONDS).
+        - @app.on_event("startup") starts it with asyncio.create_task and keeps the task;
+          @app.on_event("shutdown") cancels it.
+        - '/health' returns JSON with VERSIONS and LAST_ERROR.
+    11) Render cache for '/':
+        - RENDER_CACHE = {} mapping (selected, VERSIONS[selected]) -> (etag, html_bytes, gzip_bytes).
+        - On a miss, render with templates.get_template("index.html").render(...) once, using the same
+          variables as above, then store html bytes, gzip.compress(html, 6) and etag = '"' + sha1(html).hexdigest() + '"'.
+        - When load_category increments a category's version, delete that category's old RENDER_CACHE keys.
+        - If the request header If-None-Match equals the etag, return Response(status_code=304) with the ETag header.
+        - Otherwise return Response(media_type="text/html") with headers ETag and Cache-Control "no-cache";
+          send gzip_bytes with Content-Encoding: gzip and Vary: Accept-Encoding when Accept-Encoding contains "gzip",
+          else the plain html bytes.
         """
-        main_code = self.call_qwen(main_prompt)
-        write_file(app_dir / "main.py", main_code)
 
         # index.html prompt: must link title -> paper.abs_link and PDF -> paper.pdf_link; authors join
         index_prompt = """
@@ -250,7 +597,9 @@ class CodeAgent(AgentBase):
     Input:
     - categories: list of category strings
     - selected: currently selected category
-    - papers: dict mapping category -> list of paper dicts (each has title, authors (List[str]), published YYYY-MM-DD, arxiv_tag, abs_link, pdf_link, bibtex, citation)
+    - papers: dict mapping category -> list of Paper records (attribute access; each has title, authors (List[str]), published YYYY-MM-DD, arxiv_tag, abs_link, pdf_link, bibtex, citation)
+      Only the first page of the selected category is included.
+    - next_cursor: id of the last rendered paper if more papers exist, otherwise None
 
     Requirements:
     - For each paper:
@@ -266,6 +615,11 @@ class CodeAgent(AgentBase):
         Buttons should call a simple JS function copyFromData(btn) that reads btn.dataset.bib / btn.dataset.cite and writes to clipboard.
     - DO NOT use any filter like {{ |e('js') }}
     - Use minimal inline JS at bottom to implement copyFromData; no external libraries.
+    - Pagination: if next_cursor is set, show a "Load more" button with data-cursor="{{ next_cursor }}".
+      Clicking it fetches /api/papers?cat={{ selected }}&cursor=<cursor>, appends one card per item with the
+      same markup (build elements with textContent; set data-bib / data-cite to JSON.stringify(item.bibtex) /
+      JSON.stringify(item.citation) so copyFromData works unchanged), then updates data-cursor from
+      next_cursor or removes the button when it is null.
     - Output only valid HTML.
 
     Layout Requirements:
@@ -286,8 +640,6 @@ class CodeAgent(AgentBase):
         - Ensure the page is mobile-friendly, using media queries to stack columns on smaller screens.
 
     """
-        index_code = self.call_qwen(index_prompt)
-        write_file(templates_dir / "index.html", index_code)
 
         # copy.js prompt (static) to implement robust copy behavior
         copyjs_prompt = """
@@ -299,8 +651,6 @@ class CodeAgent(AgentBase):
     - updates button text briefly to "Copied!" and then revert
     Provide only valid JavaScript source.
     """
-        copyjs_code = self.call_qwen(copyjs_prompt)
-        write_file(static_dir / "copy.js", copyjs_code)
 
         # Also create a minimal paper.html used if needed (optional), but ensure it links to arXiv
         paper_prompt = """
@@ -314,15 +664,106 @@ class CodeAgent(AgentBase):
     - use the same copyFromData(btn) JS function (assume /static/copy.js is included)
     Output only valid HTML.
     """
-        paper_code = self.call_qwen(paper_prompt)
-        write_file(templates_dir / "paper.html", paper_code)
 
-        return {
-            "status": "ok",
-            "files": [
-                "webapp/main.py",
-                "webapp/templates/index.html",
-                "webapp/templates/paper.html",
-                "webapp/static/copy.js"
-            ]
-        }
+        return self._with_brief({
+            "webapp/main.py": main_prompt,
+            "webapp/templates/index.html": index_prompt,
+            "webapp/static/copy.js": copyjs_prompt,
+            "webapp/templates/paper.html": paper_prompt,
+        })
+
+    def _generate_artifacts(self, artifacts: Dict[str, str]) -> Dict[str, str]:
+        """Generate {relative path: prompt} concurrently; returns {path: error} for failures."""
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.gen_concurrency),
+                                thread_name_prefix="codegen") as pool:
+            futures = {pool.submit(in_context(self._generate_artifact), rel, prompt): rel
+                       for rel, prompt in artifacts.items()}
+            for fut in as_completed(futures):
+                rel = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    errors[rel] = f"{type(e).__name__}: {e}"
+                    print(f"[WARN] Failed to generate {rel}: {errors[rel]}")
+        return errors
+
+    def _generate_artifact(self, rel: str, prompt: str):
+        # 截断的结果视为失败：不写文件，放宽 max_tokens 后重试
+        last_exc = None
+        max_tokens = self.ARTIFACT_MAX_TOKENS.get(rel, self.GEN_MAX_TOKENS)
+        for attempt in range(self.gen_retries + 1):
+            if attempt:
+                time.sleep(min(2 ** attempt, 10))
+            try:
+                if self.stream:
+                    # 文件随响应到达逐块写入
+                    write_file(self.workspace / rel,
+                               self.call_qwen(prompt, timeout=self.gen_timeout, stream=True,
+                                              max_tokens=max_tokens, allow_truncated=False))
+                    return rel
+                code = self.call_qwen(prompt, timeout=self.gen_timeout, max_tokens=max_tokens,
+                                      allow_truncated=False)
+            except Exception as e:
+                last_exc = e
+                if isinstance(e, TruncatedOutput):
+                    max_tokens = min(max_tokens * 2, self.MAX_OUTPUT_TOKENS)
+                continue
+            write_file(self.workspace / rel, code)
+            return rel
+        raise last_exc
+
+    async def _agenerate_artifact(self, rel: str, prompt: str):
+        last_exc = None
+        max_tokens = self.ARTIFACT_MAX_TOKENS.get(rel, self.GEN_MAX_TOKENS)
+        for attempt in range(self.gen_retries + 1):
+            if attempt:
+                await asyncio.sleep(min(2 ** attempt, 10))
+            try:
+                code = await self.acall_qwen(prompt, timeout=self.gen_timeout, max_tokens=max_tokens,
+                                             allow_truncated=False)
+            except Exception as e:
+                last_exc = e
+                if isinstance(e, TruncatedOutput):
+                    max_tokens = min(max_tokens * 2, self.MAX_OUTPUT_TOKENS)
+                continue
+            write_file(self.workspace / rel, code)
+            return rel
+        raise last_exc
+
+    async def agenerate_artifacts(self, artifacts: Dict[str, str]) -> Dict[str, str]:
+        """_generate_artifacts on the event loop; gen_concurrency bounds requests in flight."""
+        gate = asyncio.Semaphore(max(1, self.gen_concurrency))
+
+        async def one(rel, prompt):
+            async with gate:
+                return await self._agenerate_artifact(rel, prompt)
+
+        results = await asyncio.gather(*(one(rel, p) for rel, p in artifacts.items()),
+                                       return_exceptions=True)
+        errors = {}
+        for rel, res in zip(artifacts, results):
+            if isinstance(res, Exception):
+                errors[rel] = f"{type(res).__name__}: {res}"
+                print(f"[WARN] Failed to generate {rel}: {errors[rel]}")
+        return errors
+
+
+class AsyncCodeAgent(AsyncAgentBase):
+    """CodeAgent behind the async protocol: LLM requests are awaited, not run in threads."""
+
+    def __init__(self, agent: CodeAgent):
+        super().__init__(agent.name, agent.shared_state)
+        self.agent = agent
+
+    async def act(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        tid = task.get("id")
+        agent = self.agent
+        if tid == "generate_web_app":
+            artifacts = await asyncio.to_thread(agent._web_app_artifacts)
+        elif tid == "fetch_arxiv":
+            artifacts = await asyncio.to_thread(agent._arxiv_tools_artifacts)
+        else:
+            # init_repo 只写本地文件
+            return await asyncio.to_thread(agent.act, task)
+        return agent._artifacts_result(artifacts, await agent.agenerate_artifacts(artifacts))
@@ -0,0 +1,38 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# 测试从仓库根目录导入 agents / tools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import arxiv_tools  # noqa: E402
+from tools.fake_feeds import MockFeedServer  # noqa: E402
+from tools.feed_cache import FeedCache  # noqa: E402
+from tools.paper_store import PaperStore  # noqa: E402
+
+
+@pytest.fixture
+def feed_cache(tmp_path):
+    """A FeedCache in a temp dir, installed as the process-wide cache."""
+    cache = FeedCache(tmp_path / "feeds")
+    arxiv_tools.set_feed_cache(cache)
+    yield cache
+    arxiv_tools.set_feed_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def paper_store(tmp_path):
+    """A PaperStore in a temp dir; fetches never write to the user's store."""
+    store = PaperStore(tmp_path / "papers.sqlite3")
+    arxiv_tools.set_paper_store(store)
+    yield store
+    arxiv_tools.set_paper_store(None)
+    store.close()
+
+
+@pytest.fixture
+def feed_server():
+    with MockFeedServer() as srv:
+        yield srv
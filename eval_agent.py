@@ -1,13 +1,80 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import hashlib
+import json
+import threading
+
+from tools.tracing import in_context
+from .agent_base import traced_act
+from .patching import estimate_tokens
+from .prompt_builder import PromptBuilder, has_omissions
+from .static_checks import all_rules, combine_score, run_checks, split_rules
+
+
+# 每个文件单独评分（0-10），合并后保持原有 JSON 结构；
+# 规则只在 static_checks 中维护（机械检查 + 需判断的规则）
+EVAL_FILES = {
+    "main": {"path": "webapp/main.py", "label": "main.py", "rules": all_rules("main")},
+    "index": {"path": "webapp/templates/index.html", "label": "index.html", "rules": all_rules("index")},
+    "js": {"path": "webapp/static/copy.js", "label": "copy.js", "rules": all_rules("js")},
+    "paper": {"path": "webapp/templates/paper.html", "label": "paper.html", "rules": all_rules("paper")},
+}
+
+
+def _parse_json(text):
+    """Parse the model's JSON reply, tolerating text around the object."""
+    try:
+        return json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        pass
+    start, end = (text or "").find("{"), (text or "").rfind("}")
+    if start != -1 and end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def _parse_score(value, low=0, high=10):
+    """(score clamped to [low, high], error or None); unparseable scores count as 0."""
+    if value is None or value == "":
+        return 0, "evaluator returned no score"
+    try:
+        score = float(value)
+    except (TypeError, ValueError) as e:
+        return 0, f"evaluator score {value!r} is not a number ({e})"
+    if score != score:     # NaN
+        return 0, f"evaluator score {value!r} is not a number"
+    score = max(float(low), min(float(high), score))
+    return (int(score) if score.is_integer() else score), None
 
 
 class EvalAgent:
-    def __init__(self, name, shared, workspace, call_qwen):
+    def __init__(self, name, shared, workspace, call_qwen, max_workers=4, static_checks=True,
+                 prompt_budget=None):
         self.name = name
         self.shared = shared
         self.workspace = Path(workspace)
         self.call_qwen = call_qwen
-
+        self.max_workers = max_workers
+        # (file key, content sha256) -> per-file result; unchanged files are not re-sent
+        self._memo = {}
+        self._memo_lock = threading.Lock()
+        # 可机械判定的规则先在本地检查，模型只评需要判断的部分
+        self.static_checks = static_checks
+        self.stats = {"llm_evals": 0, "memo_hits": 0, "static_only": 0, "compacted": 0}
+        # 文件超出提示词预算时裁剪为结构行与首尾；备忘录仍按完整内容计
+        self.prompts = PromptBuilder(prompt_budget) if prompt_budget else PromptBuilder()
+
+    def for_workspace(self, workspace):
+        """Evaluator for another workspace that shares this one's model, memo and stats."""
+        clone = copy.copy(self)
+        clone.workspace = Path(workspace)
+        return clone
+
+    @traced_act
     def act(self, task):
         if task["id"] == "evaluate_webapp":
             return self.evaluate_web_app(task["webapp_result"])
@@ -18,92 +85,122 @@ class EvalAgent:
             return p.read_text()
         return ""
 
-    def evaluate_web_app(self, result_dict):
-        main_code = self._read("webapp/main.py")
-        index_code = self._read("webapp/templates/index.html")
-        paper_code = self._read("webapp/templates/paper.html")
-        copy_js = self._read("webapp/static/copy.js")
-
-        eval_prompt = f"""
+    def _file_prompt(self, spec, code, rules=None):
+        fitted = self.prompts.fit(code, self.prompts.budget - estimate_tokens(rules or spec["rules"]) - 200)
+        if fitted is not code:
+            with self._memo_lock:
+                self.stats["compacted"] += 1
+            if has_omissions(fitted):
+                fitted += "\n(Parts of this file were omitted to fit the prompt; do not penalize them.)"
+            code = fitted
+        scope = ""
+        if rules:
+            scope = ("\nImports, routes, required fields and attributes are checked separately;"
+                     " score ONLY the rules above.\n")
+        return f"""
 You are a strict Code Evaluation Agent.
 
-Your task is to evaluate a generated FastAPI WebApp.
-
-### Evaluation Rules
-
-1. main.py
-- Must import fetch_category_rss from tools.arxiv_tools and StaticFiles
-- Must define TEMPLATES_DIR using absolute Path
-- Must initialize:
-  templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
-- Must mount static directory at '/static'
-- Route '/' must render index.html
-- Variable papers must be dict(category -> list)
-- Must NOT use 'await' on synchronous functions
-
-2. index.html
-- Two-column layout:
-  Left: fixed category list
-  Right: scrollable paper list
-- Each paper must show:
-  - Title link → paper.abs_link
-  - Authors joined by comma
-  - Summary
-  - Published date
-  - Tag in format [arxiv_tag]
-  - PDF link → paper.pdf_link
-- Must contain two buttons:
-  - Copy BibTeX with data-bib
-  - Copy Citation with data-cite
-- Buttons must call copyFromData(btn)
-- Must NOT use filters like |e('js')
-
-3. copy.js
-- Must define global function copyFromData(btn)
-- Must read btn.dataset.bib or btn.dataset.cite
-- Must safely handle JSON-escaped strings
-- Must use navigator.clipboard.writeText
-- Must temporarily change text to "Copied!" then revert
-
-4. paper.html
-- Must link title to paper.abs_link
-- Must show authors and published + tag
-- Must include BibTeX block with copy button
-- Must use copyFromData(btn)
-- Must include /static/copy.js
-
-5. Overall
-- Project should be logically runnable
-- Template system must be correctly configured
+Your task is to evaluate ONE file of a generated FastAPI WebApp ("arXiv CS Daily").
+Other files are evaluated separately; judge only this file.
 
+### Evaluation Rules for {spec["label"]}
+{rules or spec["rules"]}{scope}
 ### Output Format (pure JSON, no comments, no explanation):
 
 {{
-  "score_main": <0-10>,
-  "score_index": <0-10>,
-  "score_js": <0-10>,
-  "score_paper": <0-10>,
+  "score": <0-10>,
   "fatal_errors": [],
   "warnings": [],
-  "suggestions": [],
-  "overall_score": <0-40>
+  "suggestions": []
 }}
 
 ### Code to Evaluate:
 
-=== main.py ===
-{main_code}
-
-=== index.html ===
-{index_code}
-
-=== paper.html ===
-{paper_code}
-
-=== copy.js ===
-{copy_js}
+=== {spec["label"]} ===
+{code}
 
 Return ONLY valid JSON.
 """
 
-        return self.call_qwen(eval_prompt)
+    def _evaluate_file(self, key, code):
+        spec = EVAL_FILES[key]
+        digest = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        with self._memo_lock:
+            hit = self._memo.get((key, digest))
+            if hit is not None:
+                self.stats["memo_hits"] += 1
+                return hit
+
+        if not code.strip():
+            result = {"score": 0, "fatal_errors": [f"{spec['path']} is missing or empty"],
+                      "warnings": [], "suggestions": []}
+        elif self.static_checks:
+            result = self._evaluate_with_checks(key, spec, code)
+        else:
+            result = self._evaluate_llm(spec, code)
+        if result is None:
+            # 解析失败不缓存，下一轮重新评估
+            return {"score": 0, "fatal_errors": [],
+                    "warnings": ["evaluator returned invalid JSON"], "suggestions": []}
+
+        with self._memo_lock:
+            self._memo[(key, digest)] = result
+        return result
+
+    def _evaluate_llm(self, spec, code, rules=None):
+        raw = self.call_qwen(self._file_prompt(spec, code, rules))
+        with self._memo_lock:
+            self.stats["llm_evals"] += 1
+        parsed = _parse_json(raw) if isinstance(raw, str) else raw
+        if not isinstance(parsed, dict):
+            return None
+        # "8.5"、"8/10" 或缺失的分数不应中断评估与 refine 循环
+        score, error = _parse_score(parsed.get("score"))
+        warnings = list(parsed.get("warnings", []))
+        if error:
+            warnings.insert(0, error)
+        return {
+            "score": score,
+            "fatal_errors": list(parsed.get("fatal_errors", [])),
+            "warnings": warnings,
+            "suggestions": list(parsed.get("suggestions", [])),
+        }
+
+    def _evaluate_with_checks(self, key, spec, code):
+        report = run_checks(key, code)
+        _, judgment = split_rules(key)
+        static_warnings = [f"Rule failed: {r}" for r in report.failed if r not in report.hard_failed]
+
+        if report.hard_failed or not judgment.strip():
+            # 硬性检查失败：文件无法工作，不再调用模型
+            with self._memo_lock:
+                self.stats["static_only"] += 1
+            return {"score": 0 if report.hard_failed else combine_score(report, None, key),
+                    "fatal_errors": list(report.hard_failed),
+                    "warnings": static_warnings, "suggestions": []}
+
+        llm = self._evaluate_llm(spec, code, rules=judgment)
+        if llm is None:
+            return None
+        return {"score": combine_score(report, llm["score"], key),
+                "fatal_errors": llm["fatal_errors"],
+                "warnings": static_warnings + llm["warnings"],
+                "suggestions": llm["suggestions"]}
+
+    def evaluate_web_app(self, result_dict):
+        codes = {key: self._read(spec["path"]) for key, spec in EVAL_FILES.items()}
+
+        # 只有内容哈希变化的文件才会重新调用模型
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {key: pool.submit(in_context(self._evaluate_file), key, code)
+                       for key, code in codes.items()}
+            per_file = {key: fut.result() for key, fut in futures.items()}
+
+        merged = {"fatal_errors": [], "warnings": [], "suggestions": []}
+        for key, res in per_file.items():
+            merged[f"score_{key}"] = res["score"]
+            label = EVAL_FILES[key]["label"]
+            for field in ("fatal_errors", "warnings", "suggestions"):
+                merged[field].extend(f"{label}: {msg}" for msg in res[field])
+        merged["overall_score"] = sum(res["score"] for res in per_file.values())
+        return merged
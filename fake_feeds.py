@@ -0,0 +1,120 @@
+# tools/fake_feeds.py
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+from xml.sax.saxutils import escape
+
+
+def canned_rss(category: str, items: int = 30) -> bytes:
+    """An arXiv-style RSS 2.0 document with ``items`` entries for one category."""
+    entries = "".join(
+        f"<item><title>{escape(category)} paper {i}: sparse attention for graphs</title>"
+        f"<link>http://arxiv.org/abs/2410.{i:05d}</link>"
+        f"<description>Abstract {i} of {escape(category)}: we study efficient transformer "
+        f"models and robust learning on sparse data.</description>"
+        f"<guid>oai:arXiv.org:2410.{i:05d}</guid><category>{escape(category)}</category>"
+        f"<dc:creator>Author{i} Surname, Second Author</dc:creator>"
+        f"<pubDate>Thu, 17 Oct 2024 00:00:00 -0400</pubDate></item>"
+        for i in range(items))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+            f"<title>{escape(category)} updates on arXiv.org</title>{entries}</channel></rss>"
+            ).encode("utf-8")
+
+
+class MockFeedServer:
+    """Local stand-in for the arXiv RSS endpoint, for tests and benchmarks.
+
+    Serves GET {base_url}<category> on 127.0.0.1 over keep-alive HTTP/1.1.
+    ``delays`` maps a category to the seconds its response is held back,
+    categories in ``missing`` answer 404, ``statuses`` makes a category
+    answer with that status code (e.g. 503), and ``feeds`` overrides the body
+    of a category (default: canned_rss). Responses carry an ETag, so
+    If-None-Match gets a 304::
+
+        with MockFeedServer(delays={"cs.CV": 5.0}, missing={"cs.XX"}) as srv:
+            fetch_categories(["cs.AI", "cs.CV"], base_url=srv.base_url, deadline=1.0)
+
+    ``requests`` lists the paths asked for, ``connections`` counts TCP
+    connections and ``peak_inflight`` is the largest number of requests
+    served at the same time.
+    """
+
+    def __init__(self, delays: Optional[Dict[str, float]] = None,
+                 missing: Iterable[str] = (), feeds: Optional[Dict[str, bytes]] = None,
+                 items: int = 30, version: str = "v1", statuses: Optional[Dict[str, int]] = None):
+        self.delays = dict(delays or {})
+        self.missing = set(missing)
+        self.statuses = dict(statuses or {})
+        self.feeds = dict(feeds or {})
+        self.items = items
+        self.version = version
+        self.requests: List[str] = []
+        self.not_modified = 0
+        self.connections = 0
+        self.inflight = 0
+        self.peak_inflight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                with server._lock:
+                    server.connections += 1
+                super().setup()
+
+            def do_GET(self):
+                category = self.path.rsplit("/", 1)[-1]
+                with server._lock:
+                    server.requests.append(self.path)
+                    server.inflight += 1
+                    server.peak_inflight = max(server.peak_inflight, server.inflight)
+                try:
+                    if server.delays.get(category):
+                        time.sleep(server.delays[category])
+                    self._respond(category)
+                finally:
+                    with server._lock:
+                        server.inflight -= 1
+
+            def _respond(self, category):
+                status = 404 if category in server.missing else server.statuses.get(category)
+                if status:
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = f'"{server.version}-{category}"'
+                if self.headers.get("If-None-Match") == etag:
+                    with server._lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                body = server.feeds.get(category) or canned_rss(category, server.items)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/rss+xml")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}/rss/"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
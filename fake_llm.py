@@ -0,0 +1,163 @@
+# agents/fake_llm.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+def _pieces(content: str, size: int) -> List[str]:
+    return [content[i:i + size] for i in range(0, len(content), size)] or [""]
+
+
+class FakeChatClient:
+    """Offline stand-in for the OpenAI client used by CodeAgent.
+
+    Only implements ``client.chat.completions.create(...)``. Replies come
+    from ``responder(messages)`` (default: echo a stub) after an optional
+    ``latency`` sleep, and every request is recorded in ``calls`` so tests
+    can assert on what reached the "network". With ``stream=True`` the reply
+    is returned as delta chunks of ``chunk_size`` characters, ``chunk_latency``
+    seconds apart; a non-streamed reply waits for all of them.
+    """
+
+    def __init__(self, responder: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+                 latency: float = 0.0, chunk_size: int = 64, chunk_latency: float = 0.0):
+        self.responder = responder or (lambda messages: "# fake completion")
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_latency = chunk_latency
+        self.calls: List[Dict] = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict[str, str]], temperature: float = 1.0,
+                max_tokens: Optional[int] = None, **kwargs):
+        with self._lock:
+            self.calls.append({"model": model, "messages": messages,
+                               "temperature": temperature, "max_tokens": max_tokens, **kwargs})
+        timeout = kwargs.get("timeout")
+        if timeout and self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"fake completion exceeded {timeout}s")
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.responder(messages)
+        if kwargs.get("stream"):
+            return self._stream(content)
+        if self.chunk_latency:
+            # 非流式请求同样要等完整生成
+            time.sleep(self.chunk_latency * len(_pieces(content, self.chunk_size)))
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content),
+                                     finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens,
+                                  completion_tokens=len(content) // 4,
+                                  total_tokens=prompt_tokens + len(content) // 4),
+        )
+
+
+    def _stream(self, content: str) -> Iterator[SimpleNamespace]:
+        for piece in _pieces(content, self.chunk_size):
+            if self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield SimpleNamespace(choices=[SimpleNamespace(
+                delta=SimpleNamespace(content=piece), finish_reason=None)])
+        yield SimpleNamespace(choices=[SimpleNamespace(
+            delta=SimpleNamespace(content=None), finish_reason="stop")])
+
+
+class MockOpenAIServer:
+    """Local OpenAI-compatible HTTP endpoint for benchmarks.
+
+    Serves POST {base_url}/chat/completions on 127.0.0.1 with a fixed
+    injectable ``latency`` per request, so the real OpenAI client (and its
+    connection handling) can be exercised without the network::
+
+        with MockOpenAIServer(latency=0.5) as srv:
+            client = OpenAI(api_key="x", base_url=srv.base_url)
+
+    Requests with ``"stream": true`` get server-sent events, one delta of
+    ``chunk_size`` characters every ``chunk_latency`` seconds; other requests
+    wait for the same total generation time.
+    """
+
+    def __init__(self, responder: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+                 latency: float = 0.0, chunk_size: int = 64, chunk_latency: float = 0.0):
+        self.responder = responder or (lambda messages: "# fake completion")
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_latency = chunk_latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                content = server.responder(body["messages"])
+                if body.get("stream"):
+                    self._stream(body, content)
+                    return
+                if server.chunk_latency:
+                    time.sleep(server.chunk_latency * len(_pieces(content, server.chunk_size)))
+                payload = json.dumps({
+                    "id": f"mock-{server.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": sum(len(m["content"]) for m in body["messages"]) // 4,
+                              "completion_tokens": len(content) // 4,
+                              "total_tokens": 0},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _event(self, data: str):
+                raw = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(raw), raw))
+                self.wfile.flush()
+
+            def _stream(self, body, content):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                base = {"id": f"mock-{server.requests}", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": body.get("model", "mock")}
+                for piece in _pieces(content, server.chunk_size):
+                    if server.chunk_latency:
+                        time.sleep(server.chunk_latency)
+                    self._event(json.dumps(dict(base, choices=[
+                        {"index": 0, "delta": {"content": piece}, "finish_reason": None}])))
+                self._event(json.dumps(dict(base, choices=[
+                    {"index": 0, "delta": {}, "finish_reason": "stop"}])))
+                self._event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
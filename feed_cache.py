@@ -0,0 +1,158 @@
+# tools/feed_cache.py
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+DEFAULT_CACHE_DIR = Path(os.getenv("ARXIV_FEED_CACHE_DIR",
+                                   Path.home() / ".cache" / "arxiv_daily" / "feeds"))
+DEFAULT_TTL = 15 * 60          # arXiv feeds are rebuilt once a day; 15 min is plenty fresh
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class FeedCache:
+    """On-disk cache of parsed feeds with conditional-GET validators.
+
+    Each URL maps to one JSON file holding the ETag / Last-Modified headers
+    and the parsed items. Within ``ttl`` an entry is served without touching
+    the network; after that it is revalidated with If-None-Match /
+    If-Modified-Since. Entries are evicted least-recently-used (by mtime,
+    refreshed on every lookup) once the total size on disk exceeds
+    ``max_bytes``. There is no separate index: every write goes through a
+    temp file + rename, so several processes can share one cache directory.
+    """
+
+    _ENTRY_GLOB = "?" * 40 + ".json"     # sha1 hex names; skips stray files such as index.json
+
+    def __init__(self, cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR,
+                 ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self.stats = {
+            "hits": 0,              # served from cache inside the TTL
+            "misses": 0,            # no usable entry, full download + parse
+            "revalidated": 0,       # 304 Not Modified, parse skipped
+            "bytes_downloaded": 0,
+            "bytes_saved": 0,       # feed bytes not re-downloaded thanks to the cache
+            "parse_seconds": 0.0,
+            "parse_seconds_saved": 0.0,
+        }
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.dir / f"{key}.json"
+
+    def _write(self, p: Path, data: str):
+        # 先写临时文件再原子替换：其他进程只会读到完整的旧条目或新条目
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, p)
+        except OSError:
+            with contextlib.suppress(OSError):
+                tmp.unlink()
+            raise
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for url (fresh or stale), or None."""
+        p = self._path(self._key(url))
+        try:
+            entry = json.loads(p.read_text(encoding="utf-8"))
+            os.utime(p)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url:
+            return None
+        entry["fresh"] = time.time() - entry["fetched_at"] < self.ttl
+        return entry
+
+    def validators(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Conditional request headers for a stale entry."""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, items: List[Dict], etag: Optional[str] = None,
+              last_modified: Optional[str] = None, body_bytes: int = 0,
+              parse_seconds: float = 0.0, complete: bool = True):
+        """Store parsed items; complete=False marks a feed read only partially."""
+        p = self._path(self._key(url))
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "body_bytes": body_bytes,
+            "parse_seconds": parse_seconds,
+            "complete": complete,
+            "items": items,
+        }
+        self._write(p, json.dumps(entry))
+        with self._lock:
+            self._evict(keep=p)
+
+    def touch(self, url: str):
+        """Mark an entry fresh again after a 304 response."""
+        p = self._path(self._key(url))
+        try:
+            entry = json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        entry["fetched_at"] = time.time()
+        self._write(p, json.dumps(entry))
+
+    def record(self, event: str, body_bytes: int = 0, parse_seconds: float = 0.0):
+        """Update counters for a hit / miss / revalidation."""
+        with self._lock:
+            if event == "hit":
+                self.stats["hits"] += 1
+                self.stats["bytes_saved"] += body_bytes
+                self.stats["parse_seconds_saved"] += parse_seconds
+            elif event == "revalidated":
+                self.stats["revalidated"] += 1
+                self.stats["bytes_saved"] += body_bytes
+                self.stats["parse_seconds_saved"] += parse_seconds
+            elif event == "miss":
+                self.stats["misses"] += 1
+                self.stats["bytes_downloaded"] += body_bytes
+                self.stats["parse_seconds"] += parse_seconds
+
+    def _entries(self):
+        for p in self.dir.glob(self._ENTRY_GLOB):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            yield p, st
+
+    def _evict(self, keep: Optional[Path] = None):
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        total = sum(st.st_size for _, st in entries)
+        for p, st in entries:
+            if total <= self.max_bytes:
+                break
+            if p == keep:
+                continue
+            with contextlib.suppress(OSError):
+                p.unlink()
+            total -= st.st_size
+
+    def clear(self):
+        with self._lock:
+            for p, _ in list(self._entries()):
+                with contextlib.suppress(OSError):
+                    p.unlink()
@@ -0,0 +1,95 @@
+# tools/feed_stream.py
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import IO, Dict, Iterator, List, Optional
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+DC = "{http://purl.org/dc/elements/1.1/}"
+_ITEM_TAGS = ("item", ATOM + "entry", "{http://purl.org/rss/1.0/}item")
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _iso(raw: Optional[str]) -> Optional[str]:
+    if not raw:
+        return None
+    raw = raw.strip()
+    try:
+        dt = parsedate_to_datetime(raw)              # RSS: RFC 822
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))   # Atom: RFC 3339
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def _split_names(raw: str) -> List[str]:
+    # arXiv puts every author into a single comma-separated dc:creator
+    return [p.strip() for p in raw.split(",") if p.strip()]
+
+
+def _normalize(item: ET.Element) -> Dict:
+    out = {"id": None, "title": None, "link": None, "summary": None,
+           "published": None, "authors": [], "tags": []}
+    for child in item:
+        name = _local(child.tag)
+        text = (child.text or "").strip()
+        if name in ("guid", "id"):
+            out["id"] = text
+        elif name == "title":
+            out["title"] = text
+        elif name == "link":
+            # Atom links live in the href attribute
+            if child.get("rel", "alternate") == "alternate":
+                out["link"] = child.get("href") or text
+        elif name in ("description", "summary") or (name == "content" and not out["summary"]):
+            out["summary"] = text
+        elif name in ("pubDate", "published") or (name in ("date", "updated") and not out["published"]):
+            out["published"] = _iso(text)
+        elif name == "creator" or (name == "author" and not child.tag.startswith(ATOM)):
+            out["authors"].extend(_split_names(text))
+        elif name == "author":
+            n = child.find(ATOM + "name")
+            if n is not None and n.text:
+                out["authors"].extend(_split_names(n.text))
+        elif name == "category":
+            term = child.get("term") or text
+            if term:
+                out["tags"].append(term)
+    return out
+
+
+def iter_entries(stream: IO[bytes], max_items: Optional[int] = None) -> Iterator[Dict]:
+    """Yield normalized RSS/Atom entries one at a time.
+
+    Reading stops as soon as max_items entries have been produced, and each
+    entry's element tree is discarded after it is yielded, so memory does not
+    grow with the size of the feed. Raises xml.etree.ElementTree.ParseError
+    on malformed XML.
+    """
+    if max_items is not None and max_items <= 0:
+        return
+    produced = 0
+    stack: List[ET.Element] = []
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag not in _ITEM_TAGS:
+            continue
+        entry = _normalize(elem)
+        # 丢弃已处理的节点，保持常量内存
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+        yield entry
+        produced += 1
+        if max_items is not None and produced >= max_items:
+            return
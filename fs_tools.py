@@ -1,15 +1,50 @@
 # tools/fs_tools.py
+import contextlib
 import os
+import threading
 from pathlib import Path
-from typing import Union
+from typing import Iterable, Union
+
+from .tracing import span
 
 def ensure_workspace(path: Union[str, Path]):
     Path(path).mkdir(parents=True, exist_ok=True)
 
-def write_file(path: Union[str, Path], content: str, mode='w'):
-    ensure_workspace(Path(path).parent)
-    with open(path, mode, encoding='utf-8') as f:
-        f.write(content)
+def write_file(path: Union[str, Path], content: Union[str, Iterable[str]], mode='w'):
+    """Write a string, or an iterable of chunks as they arrive (e.g. a streamed completion).
+
+    With mode 'w' the chunks land in the target itself, so readers see the
+    file grow; the previous file is kept aside and put back if the chunks
+    fail midway.
+    """
+    with span("fs.write_file", path=str(path), streamed=not isinstance(content, str)) as s:
+        ensure_workspace(Path(path).parent)
+        backup = None
+        if mode == 'w' and os.path.exists(path):
+            backup = Path(path).with_name(f".{Path(path).name}.{os.getpid()}.{threading.get_ident()}.bak")
+            os.replace(path, backup)
+        try:
+            with open(path, mode, encoding='utf-8') as f:
+                if isinstance(content, str):
+                    f.write(content)
+                    s.set(chars=len(content))
+                else:
+                    n = 0
+                    for chunk in content:
+                        f.write(chunk)
+                        f.flush()
+                        n += len(chunk)
+                    s.set(chars=n)
+        except BaseException:
+            if backup is not None:
+                os.replace(backup, path)
+            elif mode == 'w':
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+            raise
+        if backup is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(backup)
     return path
 
 def read_file(path: Union[str, Path]) -> str:
@@ -0,0 +1,321 @@
+# tools/http_transport.py
+"""Shared HTTP transport for feed fetches and LLM calls.
+
+One pooled ``requests.Session`` (keep-alive) serves the arXiv feeds; LLM
+clients get a pooled ``httpx.Client`` that speaks HTTP/2 when the ``h2``
+package is installed. Coroutine callers use ``acall`` / ``aget`` and one
+``httpx.AsyncClient`` per event loop, under the same buckets and policy.
+Every attempt first takes a token from the host's bucket, and transient
+failures (connection errors, timeouts, 429/5xx) are retried with
+full-jitter exponential backoff, honouring Retry-After.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # only needed for LLM clients
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = httpx is not None
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+T = TypeVar("T")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# host -> (requests per second, burst). arXiv asks for roughly one request
+# every 3 s; a burst of 5 lets one refresh of all categories go out at once.
+HOST_RATES: Dict[str, Tuple[float, int]] = {
+    "export.arxiv.org": (1 / 3, 5),
+    "rss.arxiv.org": (1 / 3, 5),
+    "dashscope.aliyuncs.com": (float(os.getenv("DASHSCOPE_RPS", "5")), 10),
+}
+
+
+class RetryableStatus(Exception):
+    """Raised internally for a retryable HTTP status; carries the response."""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None, response=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.response = response
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, at most ``burst`` stored."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take one token, sleeping until one is available; False on timeout."""
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if end is not None:
+                if time.monotonic() + wait > end:
+                    return False
+            time.sleep(wait)
+
+    def _take(self) -> float:
+        """Take a token if one is available (0.0), else seconds until the next one."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def aacquire(self):
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the loop."""
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            await asyncio.sleep(wait)
+
+
+class RemoteTokenBucket(TokenBucket):
+    """Client side of a TokenBucket living in another process (a multiprocessing manager).
+
+    Only the token accounting goes through the proxy; waiting happens
+    locally, so a waiting process does not hold a manager thread.
+    """
+
+    def __init__(self, proxy):
+        self._proxy = proxy
+
+    def _take(self) -> float:
+        return self._proxy._take()
+
+
+class RetryPolicy:
+    def __init__(self, retries: int = 3, backoff: float = 0.5, max_backoff: float = 30.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full jitter: uniform(0, backoff * 2**attempt), at least Retry-After."""
+        cap = min(self.max_backoff, self.backoff * (2 ** attempt))
+        d = random.uniform(0, cap)
+        if retry_after is not None:
+            d = max(d, min(retry_after, self.max_backoff))
+        return d
+
+
+def _retry_after(headers) -> Optional[float]:
+    value = (headers or {}).get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Transport:
+    """Pooled sessions + per-host rate limits + retry policy."""
+
+    def __init__(self, retry: Optional[RetryPolicy] = None,
+                 host_rates: Optional[Dict[str, Tuple[float, int]]] = None,
+                 pool_size: int = 16, buckets: Optional[Dict[str, TokenBucket]] = None):
+        self.retry = retry or RetryPolicy()
+        self.host_rates = dict(HOST_RATES if host_rates is None else host_rates)
+        self.pool_size = pool_size
+        # buckets: host -> 预先给定的令牌桶（如多个进程共享的 RemoteTokenBucket）
+        self._buckets: Dict[str, TokenBucket] = dict(buckets or {})
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._llm_client = None
+        self._async_clients = weakref.WeakKeyDictionary()   # event loop -> httpx.AsyncClient
+        self.stats = {"requests": 0, "retries": 0, "throttled_s": 0.0}
+
+    def bucket(self, url_or_host: str) -> Optional[TokenBucket]:
+        host = urlparse(url_or_host).netloc or url_or_host
+        rate = self.host_rates.get(host)
+        with self._lock:
+            b = self._buckets.get(host)
+            if b is None and rate is not None:
+                b = self._buckets[host] = TokenBucket(*rate)
+            return b
+
+    def call(self, host: str, fn: Callable[[], T],
+             retry_on: Tuple[type, ...] = ()) -> T:
+        """Run fn under host's rate limit, retrying transient failures.
+
+        Connection errors, timeouts, RetryableStatus and anything in
+        retry_on are retried; an exception with a status_code outside
+        RETRY_STATUSES is raised at once.
+        """
+        bucket = self.bucket(host)
+        transient = (requests.ConnectionError, requests.Timeout, ConnectionError,
+                     TimeoutError, RetryableStatus) + tuple(retry_on)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                t0 = time.monotonic()
+                bucket.acquire()
+                with self._lock:
+                    self.stats["throttled_s"] += time.monotonic() - t0
+            with self._lock:
+                self.stats["requests"] += 1
+            try:
+                return fn()
+            except transient as e:
+                status = getattr(e, "status_code", None)
+                if status is not None and status not in RETRY_STATUSES:
+                    raise
+                if attempt >= self.retry.retries:
+                    raise
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None:
+                    retry_after = _retry_after(getattr(getattr(e, "response", None), "headers", None))
+                time.sleep(self.retry.delay(attempt, retry_after))
+                attempt += 1
+                with self._lock:
+                    self.stats["retries"] += 1
+
+    async def acall(self, host: str, fn: Callable[[], Awaitable[T]],
+                    retry_on: Tuple[type, ...] = ()) -> T:
+        """call() for coroutine factories: same buckets, retry policy and stats."""
+        bucket = self.bucket(host)
+        transient = (ConnectionError, TimeoutError, asyncio.TimeoutError, RetryableStatus) + tuple(retry_on)
+        if httpx is not None:
+            transient += (httpx.TransportError,)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                t0 = time.monotonic()
+                await bucket.aacquire()
+                with self._lock:
+                    self.stats["throttled_s"] += time.monotonic() - t0
+            with self._lock:
+                self.stats["requests"] += 1
+            try:
+                return await fn()
+            except transient as e:
+                status = getattr(e, "status_code", None)
+                if status is not None and status not in RETRY_STATUSES:
+                    raise
+                if attempt >= self.retry.retries:
+                    raise
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None:
+                    retry_after = _retry_after(getattr(getattr(e, "response", None), "headers", None))
+                await asyncio.sleep(self.retry.delay(attempt, retry_after))
+                attempt += 1
+                with self._lock:
+                    self.stats["retries"] += 1
+
+    def async_http_client(self):
+        """Pooled httpx.AsyncClient for the running event loop (clients are loop-bound)."""
+        if httpx is None:
+            raise RuntimeError("httpx is required for async HTTP")
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    http2=HTTP2_AVAILABLE, follow_redirects=True,
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                    timeout=httpx.Timeout(120.0, connect=10.0))
+            return client
+
+    async def aget(self, url: str, **kwargs):
+        """get() for coroutines; returns an httpx.Response with the body read."""
+        client = self.async_http_client()
+
+        async def attempt():
+            resp = await client.get(url, **kwargs)
+            if resp.status_code in RETRY_STATUSES:
+                raise RetryableStatus(resp.status_code, _retry_after(resp.headers), resp)
+            return resp
+
+        try:
+            return await self.acall(url, attempt)
+        except RetryableStatus as e:
+            return e.response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """session.get with rate limiting and retries on 429/5xx and network errors."""
+        def attempt():
+            resp = self.session.get(url, **kwargs)
+            if resp.status_code in RETRY_STATUSES:
+                resp.close()
+                raise RetryableStatus(resp.status_code, _retry_after(resp.headers), resp)
+            return resp
+
+        try:
+            return self.call(url, attempt)
+        except RetryableStatus as e:
+            # 重试用尽：把最后一次的响应交给调用方 raise_for_status
+            return e.response
+
+    def llm_http_client(self):
+        """Pooled httpx client for OpenAI-compatible SDKs (HTTP/2 when h2 is installed)."""
+        if httpx is None:
+            return None
+        with self._lock:
+            if self._llm_client is None:
+                self._llm_client = httpx.Client(
+                    http2=HTTP2_AVAILABLE,
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                    timeout=httpx.Timeout(120.0, connect=10.0))
+            return self._llm_client
+
+    def close(self):
+        self.session.close()
+        if self._llm_client is not None:
+            self._llm_client.close()
+
+    async def aclose(self):
+        """Close the running loop's async client."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+_transport: Optional[Transport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    """Process-wide transport, created on first use."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
+
+
+def set_transport(transport: Optional[Transport]):
+    global _transport
+    with _transport_lock:
+        _transport = transport
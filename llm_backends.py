@@ -0,0 +1,302 @@
+# agents/llm_backends.py
+"""Backends behind CodeAgent.call_qwen.
+
+A backend turns (model, messages, temperature, max_tokens) into a
+Completion, or into a stream of text deltas, and counts calls and tokens
+in ``stats``. OpenAIBackend talks to DashScope (or any OpenAI-compatible
+client); ReplayBackend answers from recorded responses with a configurable
+latency and token rate, so whole pipeline runs are reproducible offline;
+RecordingBackend wraps a live backend and writes what it sees for replay.
+``acomplete`` is the coroutine form of ``complete``; backends without a
+native async path run the sync call in a worker thread. ``stream`` returns
+the finish reason as the generator's return value.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Union
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+from tools.http_transport import get_transport
+from tools.tracing import current_span
+
+from .llm_cache import request_key
+from .patching import estimate_tokens
+
+DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+Messages = List[Dict[str, str]]
+
+# 可重试的 SDK 异常（429/5xx 由 status_code 判断）
+_LLM_TRANSIENT = (openai.APIConnectionError, openai.APITimeoutError,
+                  openai.RateLimitError, openai.InternalServerError)
+
+
+class Completion(NamedTuple):
+    text: str
+    finish_reason: str = "stop"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMBackend:
+    name = "base"
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0,
+                      "truncated": 0}
+
+    def complete(self, model: str, messages: Messages, temperature: float,
+                 max_tokens: int, timeout: Optional[float] = None) -> Completion:
+        raise NotImplementedError
+
+    def stream(self, model: str, messages: Messages, temperature: float,
+               max_tokens: int, timeout: Optional[float] = None) -> Iterator[str]:
+        """Text deltas, returning the finish reason; the default falls back to one completion."""
+        c = self.complete(model, messages, temperature, max_tokens, timeout)
+        yield c.text
+        return c.finish_reason
+
+    async def acomplete(self, model: str, messages: Messages, temperature: float,
+                        max_tokens: int, timeout: Optional[float] = None) -> Completion:
+        return await asyncio.to_thread(self.complete, model, messages, temperature, max_tokens, timeout)
+
+    def _account(self, c: Completion, seconds: float, max_tokens: Optional[int] = None):
+        with self._stats_lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens"] += c.prompt_tokens
+            self.stats["completion_tokens"] += c.completion_tokens
+            self.stats["seconds"] += seconds
+            if c.finish_reason == "length":
+                self.stats["truncated"] += 1
+        if c.finish_reason == "length":
+            # 输出被 max_tokens 截断：代码或补丁可能不完整
+            print(f"[WARN] {self.name} completion truncated at max_tokens={max_tokens} "
+                  f"({c.completion_tokens} tokens, prompt {c.prompt_tokens})")
+            current_span().set(truncated=True)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+
+def _prompt_tokens(messages: Messages) -> int:
+    return sum(estimate_tokens(m.get("content", "")) for m in messages)
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI-compatible chat completions through the shared HTTP transport."""
+
+    name = "openai"
+
+    def __init__(self, client=None, transport=None, base_url: str = DASHSCOPE_BASE_URL,
+                 api_key: Optional[str] = None):
+        super().__init__()
+        self.transport = transport or get_transport()
+        # client 可替换为 FakeChatClient 等离线实现；
+        # 连接池、限流与重试由共享 transport 负责，SDK 自身不再重试
+        self._api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
+        self._base_url = base_url
+        self._own_client = client is None
+        self.client = client or OpenAI(api_key=self._api_key, base_url=base_url, max_retries=0,
+                                       http_client=self.transport.llm_http_client())
+
+    def _async_client(self) -> AsyncOpenAI:
+        # AsyncOpenAI 绑定在当前事件循环的 httpx.AsyncClient 上
+        return AsyncOpenAI(api_key=self._api_key, base_url=self._base_url, max_retries=0,
+                           http_client=self.transport.async_http_client())
+
+    def _create(self, timeout, **kwargs):
+        if timeout:
+            kwargs["timeout"] = timeout
+        return self.transport.call(str(getattr(self.client, "base_url", "")),
+                                   lambda: self.client.chat.completions.create(**kwargs),
+                                   retry_on=_LLM_TRANSIENT)
+
+    def complete(self, model, messages, temperature, max_tokens, timeout=None) -> Completion:
+        t0 = time.perf_counter()
+        resp = self._create(timeout, model=model, messages=messages,
+                            temperature=temperature, max_tokens=max_tokens)
+        return self._completion(resp, messages, max_tokens, t0)
+
+    async def acomplete(self, model, messages, temperature, max_tokens, timeout=None) -> Completion:
+        if not self._own_client:
+            # 注入的同步 client（如 FakeChatClient）在线程中调用
+            return await super().acomplete(model, messages, temperature, max_tokens, timeout)
+        t0 = time.perf_counter()
+        client = self._async_client()
+        kwargs = {"timeout": timeout} if timeout else {}
+        resp = await self.transport.acall(
+            self._base_url,
+            lambda: client.chat.completions.create(model=model, messages=messages,
+                                                   temperature=temperature,
+                                                   max_tokens=max_tokens, **kwargs),
+            retry_on=_LLM_TRANSIENT)
+        return self._completion(resp, messages, max_tokens, t0)
+
+    def _completion(self, resp, messages, max_tokens, t0) -> Completion:
+        choice = resp.choices[0]
+        text = choice.message.content or ""
+        usage = getattr(resp, "usage", None)
+        c = Completion(text, getattr(choice, "finish_reason", None) or "stop",
+                       getattr(usage, "prompt_tokens", None) or _prompt_tokens(messages),
+                       getattr(usage, "completion_tokens", None) or estimate_tokens(text))
+        self._account(c, time.perf_counter() - t0, max_tokens)
+        return c
+
+    def stream(self, model, messages, temperature, max_tokens, timeout=None) -> Iterator[str]:
+        t0 = time.perf_counter()
+        chunks = self._create(timeout, model=model, messages=messages, temperature=temperature,
+                              max_tokens=max_tokens, stream=True)
+        n_chars, finish = 0, "stop"
+        for chunk in chunks:
+            if not chunk.choices:
+                continue
+            finish = chunk.choices[0].finish_reason or finish
+            delta = chunk.choices[0].delta.content
+            if delta:
+                n_chars += len(delta)
+                yield delta
+        self._account(Completion("", finish, _prompt_tokens(messages), (n_chars + 3) // 4),
+                      time.perf_counter() - t0, max_tokens)
+        return finish
+
+
+class ReplayBackend(LLMBackend):
+    """Deterministic offline backend.
+
+    Answers come from ``recordings`` (request_key -> text, or a JSONL file
+    written by RecordingBackend); requests that were not recorded go to
+    ``fallback(messages)`` or raise KeyError. Each call takes
+    ``latency + completion_tokens / tokens_per_sec`` seconds, streamed
+    calls deliver their deltas at that token rate. Answers longer than
+    max_tokens are cut and reported with finish_reason "length", as a live
+    model would.
+    """
+
+    name = "replay"
+
+    def __init__(self, recordings: Union[None, str, Path, Dict[str, str]] = None,
+                 fallback: Optional[Callable[[Messages], str]] = None,
+                 latency: float = 0.0, tokens_per_sec: Optional[float] = None,
+                 chunk_tokens: int = 16):
+        super().__init__()
+        if isinstance(recordings, (str, Path)):
+            recordings = load_recordings(recordings)
+        self.recordings: Dict[str, str] = dict(recordings or {})
+        self.fallback = fallback
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.chunk_tokens = chunk_tokens
+        self.misses = 0
+
+    def _lookup(self, model, messages, temperature, max_tokens) -> Completion:
+        key = request_key(model, messages, temperature, max_tokens)
+        if key in self.recordings:
+            text = self.recordings[key]
+        elif self.fallback is None:
+            raise KeyError(f"no recorded response for request {key[:12]}")
+        else:
+            with self._stats_lock:
+                self.misses += 1
+            text = self.fallback(messages)
+        finish = "stop"
+        if max_tokens and estimate_tokens(text) > max_tokens:
+            text, finish = text[:max_tokens * 4], "length"
+        return Completion(text, finish, _prompt_tokens(messages), estimate_tokens(text))
+
+    def _delay(self, tokens: int) -> float:
+        return self.latency + (tokens / self.tokens_per_sec if self.tokens_per_sec else 0.0)
+
+    def complete(self, model, messages, temperature, max_tokens, timeout=None) -> Completion:
+        c = self._lookup(model, messages, temperature, max_tokens)
+        delay = self._delay(c.completion_tokens)
+        if timeout and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"replayed completion exceeded {timeout}s")
+        time.sleep(delay)
+        self._account(c, delay, max_tokens)
+        return c
+
+    async def acomplete(self, model, messages, temperature, max_tokens, timeout=None) -> Completion:
+        c = self._lookup(model, messages, temperature, max_tokens)
+        delay = self._delay(c.completion_tokens)
+        if timeout and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"replayed completion exceeded {timeout}s")
+        await asyncio.sleep(delay)
+        self._account(c, delay, max_tokens)
+        return c
+
+    def stream(self, model, messages, temperature, max_tokens, timeout=None) -> Iterator[str]:
+        c = self._lookup(model, messages, temperature, max_tokens)
+        time.sleep(self.latency)
+        step = self.chunk_tokens * 4
+        for i in range(0, len(c.text), step):
+            piece = c.text[i:i + step]
+            if self.tokens_per_sec:
+                time.sleep(estimate_tokens(piece) / self.tokens_per_sec)
+            yield piece
+        self._account(c, self._delay(c.completion_tokens), max_tokens)
+        return c.finish_reason
+
+
+class RecordingBackend(LLMBackend):
+    """Pass calls through to ``inner`` and append every answer to a JSONL file."""
+
+    name = "recording"
+
+    def __init__(self, inner: LLMBackend, path: Union[str, Path]):
+        super().__init__()
+        self.inner = inner
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file_lock = threading.Lock()
+        self.stats = inner.stats    # report the wrapped backend's numbers
+        self._stats_lock = inner._stats_lock
+
+    def _record(self, model, messages, temperature, max_tokens, text):
+        line = json.dumps({"key": request_key(model, messages, temperature, max_tokens),
+                           "model": model, "response": text}, ensure_ascii=False)
+        with self._file_lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def complete(self, model, messages, temperature, max_tokens, timeout=None) -> Completion:
+        c = self.inner.complete(model, messages, temperature, max_tokens, timeout)
+        self._record(model, messages, temperature, max_tokens, c.text)
+        return c
+
+    async def acomplete(self, model, messages, temperature, max_tokens, timeout=None) -> Completion:
+        c = await self.inner.acomplete(model, messages, temperature, max_tokens, timeout)
+        self._record(model, messages, temperature, max_tokens, c.text)
+        return c
+
+    def stream(self, model, messages, temperature, max_tokens, timeout=None) -> Iterator[str]:
+        parts = []
+        deltas = self.inner.stream(model, messages, temperature, max_tokens, timeout)
+        while True:
+            try:
+                piece = next(deltas)
+            except StopIteration as stop:
+                finish = stop.value
+                break
+            parts.append(piece)
+            yield piece
+        self._record(model, messages, temperature, max_tokens, "".join(parts))
+        return finish
+
+
+def load_recordings(path: Union[str, Path]) -> Dict[str, str]:
+    """request_key -> response from a RecordingBackend JSONL file (later lines win)."""
+    out = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                out[rec["key"]] = rec["response"]
+    return out
@@ -0,0 +1,111 @@
+# agents/llm_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+DEFAULT_LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR",
+                                       Path.home() / ".cache" / "arxiv_daily" / "llm"))
+DEFAULT_LLM_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def request_key(model: str, messages: List[Dict[str, str]],
+                temperature: float, max_tokens: int) -> str:
+    """Content address of one chat completion request."""
+    payload = json.dumps(
+        {"model": model, "messages": messages,
+         "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Content-addressed on-disk cache of chat completion texts.
+
+    Entries are files named by request_key() under a two-character fan-out
+    directory. Writes go through a temp file + rename so several processes
+    can share one cache directory. When the directory grows past max_bytes
+    the least recently used entries (by mtime, refreshed on every hit) are
+    removed.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = DEFAULT_LLM_CACHE_DIR,
+                 max_bytes: int = DEFAULT_LLM_CACHE_BYTES):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        p = self._path(key)
+        try:
+            entry = json.loads(p.read_text(encoding="utf-8"))
+            os.utime(p)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        return entry["content"]
+
+    def put(self, key: str, content: str, meta: Optional[Dict[str, Any]] = None):
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"content": content, "meta": meta or {}, "stored_at": time.time()},
+                          ensure_ascii=False)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, p)
+        with self._lock:
+            self.stats["stores"] += 1
+            if self._approx_bytes is None:
+                self._approx_bytes = self._disk_usage()
+            else:
+                self._approx_bytes += len(data.encode("utf-8"))
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for p in self.dir.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            yield p, st
+
+    def _disk_usage(self) -> int:
+        return sum(st.st_size for _, st in self._entries())
+
+    def _evict(self):
+        # 按最近访问时间淘汰，直到降到上限的 90%
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        total = sum(st.st_size for _, st in entries)
+        target = self.max_bytes * 0.9
+        for p, st in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= st.st_size
+            self.stats["evictions"] += 1
+        self._approx_bytes = total
+
+    def clear(self):
+        with self._lock:
+            for p, _ in list(self._entries()):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+            self._approx_bytes = 0
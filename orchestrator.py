@@ -1,42 +1,147 @@
 # orchestrator.py
+from agents.agent_base import SharedState, as_async
 from agents.planner_agent import PlannerAgent
-from agents.code_agent import CodeAgent
+from agents.code_agent import AsyncCodeAgent, CodeAgent
 from agents.eval_agent import EvalAgent
 from agents.refine_agent import AutoRefineAgent
 from tools.fs_tools import ensure_workspace
+from tools.http_transport import get_transport
+from tools.tracing import format_summary, get_tracer, summarize
+from scheduler import AsyncDAGScheduler, DAGScheduler
+from contextlib import contextmanager
+import asyncio
 import os
+import threading
+import time
 
-def run_demo():
-    workspace = os.path.abspath("workspace")
+DEFAULT_GOAL = "build arXiv CS Daily webapp"
+
+# 任务 id -> 阶段；同一阶段的任务可能并行，阶段之间由依赖关系串行
+PHASES = {
+    "init_repo": "generate",
+    "fetch_arxiv": "generate",
+    "generate_web_app": "generate",
+    "evaluate_webapp": "evaluate",
+    "refine_webapp": "refine",
+}
+
+
+class PhaseMeter:
+    """Wall time and LLM usage per pipeline phase.
+
+    A phase is open from its first task starting to its last task finishing;
+    calls and tokens are the difference of the backend's counters over that
+    window, so they are only exact while phases do not overlap (which the
+    plan's dependencies guarantee).
+    """
+
+    COUNTERS = ("calls", "prompt_tokens", "completion_tokens")
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.phases = {}
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def _counters(self):
+        snap = self.backend.snapshot() if self.backend is not None else {}
+        return {k: snap.get(k, 0) for k in self.COUNTERS}
+
+    @contextmanager
+    def phase(self, name):
+        with self._lock:
+            if name in self._open:
+                self._open[name][0] += 1
+            else:
+                self._open[name] = [1, time.perf_counter(), self._counters()]
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry = self._open[name]
+                entry[0] -= 1
+                if entry[0] == 0:
+                    del self._open[name]
+                    after = self._counters()
+                    row = self.phases.setdefault(name, dict.fromkeys(("wall_s",) + self.COUNTERS, 0))
+                    row["wall_s"] += time.perf_counter() - entry[1]
+                    for k in self.COUNTERS:
+                        row[k] += after[k] - entry[2][k]
+
+    def report(self):
+        lines = [f"{'phase':<10}{'wall_s':>10}{'calls':>8}{'prompt_tok':>12}{'compl_tok':>12}"]
+        for name, r in self.phases.items():
+            lines.append(f"{name:<10}{r['wall_s']:>10.3f}{r['calls']:>8}"
+                         f"{r['prompt_tokens']:>12}{r['completion_tokens']:>12}")
+        return "\n".join(lines)
+
+
+def run_demo(max_workers=4, workspace=None, backend=None, enable_cache=True,
+             target_score=36, max_rounds=3, meter=None, goal=DEFAULT_GOAL, brief="",
+             llm_cache=None):
+    # 整个运行一个 trace；AGENT_TRACE=path 时 span 逐条写入 JSONL
+    with get_tracer().span("pipeline.run") as root:
+        records = _run(max_workers, workspace, backend, enable_cache, target_score, max_rounds, meter,
+                       goal, brief, llm_cache)
+    spans = [s for s in get_tracer().finished() if s.trace_id == getattr(root, "trace_id", None)]
+    if spans:
+        print("\n[INFO] Trace summary:")
+        print(format_summary(summarize(spans)))
+    return records
+
+
+def _run(max_workers, workspace, backend, enable_cache, target_score, max_rounds, meter,
+         goal=DEFAULT_GOAL, brief="", llm_cache=None):
+    workspace = os.path.abspath(workspace or "workspace")
     ensure_workspace(workspace)
 
-    shared = {}
+    # 任务可能在多个 worker 上并行执行，共享状态需线程安全
+    shared = SharedState()
 
     pl = PlannerAgent("planner", shared)
-    ca = CodeAgent("coder", shared, workspace=workspace)
+    # backend=None 时使用 DashScope；离线基准传入 ReplayBackend
+    ca = CodeAgent("coder", shared, workspace=workspace, backend=backend,
+                   enable_cache=enable_cache, llm_cache=llm_cache, brief=brief)
     ev = EvalAgent("evaluator", shared, workspace=workspace, call_qwen=ca.call_qwen)
+    meter = meter or PhaseMeter(ca.backend)
+    if meter.backend is None:
+        meter.backend = ca.backend
 
     # Self-Refine Agent
     refiner = AutoRefineAgent(
         workspace=workspace,
         call_qwen=ca.call_qwen,
-        target_score=36,   # 你要的目标分
-        max_rounds=3
+        target_score=target_score,   # 你要的目标分
+        max_rounds=max_rounds
     )
 
     # 1. Planning Phase
-    plan_res = pl.act({"goal": "build arXiv CS Daily webapp"})
+    with meter.phase("plan"):
+        plan_res = pl.act({"goal": goal})
     print("Plan:", plan_res["plan"])
 
     # 2. Dispatch Tasks
-    for task in plan_res["plan"]:
+    def dispatch(task):
+        with meter.phase(PHASES.get(task["id"], "other")):
+            return run_task(task)
+
+    def run_task(task):
 
         # ===== CodeAgent =====
         if task["actor"] == "CodeAgent":
             r = ca.act(task)
             print("CodeAgent did:", task["id"], r)
+            return r
 
-        # ===== EvalAgent or Self-Refine =====
+        # ===== EvalAgent =====
+        elif task["id"] == "evaluate_webapp":
+            r = ev.act({"id": "evaluate_webapp",
+                        "webapp_result": scheduler.records["generate_web_app"].result})
+            print("EvalAgent did:", task["id"], r)
+            shared["last_eval"] = r
+            return r
+
+        # ===== Self-Refine =====
         elif task["actor"] == "EvalAgent":
 
             print("\n[INFO] Entering self-refinement loop...")
@@ -45,6 +150,90 @@ def run_demo():
             refiner.refine(ev)
 
             print("\n[INFO] Self-refinement finished.")
+            return {"status": "ok", "best_score": refiner.best_score, "rounds": refiner.rounds}
+
+    # 无依赖关系的任务（如 fetch_arxiv 与 generate_web_app）并行执行
+    scheduler = DAGScheduler(
+        plan_res["plan"], dispatch, max_workers=max_workers,
+        on_change=lambda rec: print(f"[SCHED] {rec.id} -> {rec.state}"))
+    records = scheduler.run()
+    shared["results"] = {tid: rec.result for tid, rec in records.items()}
+
+    print("\n[INFO] Task timing:")
+    print(scheduler.report())
+    print("\n[INFO] Phase usage:")
+    print(meter.report())
+    return records
+
+
+async def arun_demo(max_workers=4, workspace=None, backend=None, enable_cache=True,
+                    target_score=36, max_rounds=3, meter=None, goal=DEFAULT_GOAL, brief="",
+                    llm_cache=None, close_transport=True):
+    """run_demo on the event loop.
+
+    Code generation awaits the model directly (AsyncCodeAgent); the
+    evaluator and the refine loop are synchronous and run in threads via
+    SyncAgentAdapter / to_thread. Several pipelines can share one loop,
+    see arun_many. With close_transport the loop's pooled httpx client is
+    closed when the run ends.
+    """
+    try:
+        with get_tracer().span("pipeline.run", coroutine=True) as root:
+            workspace = os.path.abspath(workspace or "workspace")
+            ensure_workspace(workspace)
+            shared = SharedState()
+
+            pl = as_async(PlannerAgent("planner", shared))
+            ca = CodeAgent("coder", shared, workspace=workspace, backend=backend,
+                           enable_cache=enable_cache, llm_cache=llm_cache, brief=brief)
+            coder = AsyncCodeAgent(ca)
+            ev_sync = EvalAgent("evaluator", shared, workspace=workspace, call_qwen=ca.call_qwen)
+            ev = as_async(ev_sync)
+            meter = meter or PhaseMeter(ca.backend)
+            if meter.backend is None:
+                meter.backend = ca.backend
+            refiner = AutoRefineAgent(workspace=workspace, call_qwen=ca.call_qwen,
+                                      target_score=target_score, max_rounds=max_rounds)
+
+            with meter.phase("plan"):
+                plan_res = await pl.act({"goal": goal})
+
+            async def dispatch(task):
+                with meter.phase(PHASES.get(task["id"], "other")):
+                    if task["actor"] == "CodeAgent":
+                        return await coder.act(task)
+                    if task["id"] == "evaluate_webapp":
+                        webapp_result = scheduler.records["generate_web_app"].result
+                        r = await ev.act({"id": "evaluate_webapp", "webapp_result": webapp_result})
+                        shared["last_eval"] = r
+                        return r
+                    await asyncio.to_thread(refiner.refine, ev_sync)
+                    return {"status": "ok", "best_score": refiner.best_score, "rounds": refiner.rounds}
+
+            scheduler = AsyncDAGScheduler(plan_res["plan"], dispatch, max_workers=max_workers)
+            records = await scheduler.arun()
+            shared["results"] = {tid: rec.result for tid, rec in records.items()}
+            root.set(workspace=workspace)
+        print(f"\n[INFO] Pipeline {workspace}:")
+        print(scheduler.report())
+        print(meter.report())
+        return records
+    finally:
+        if close_transport:
+            await get_transport().aclose()
+
+
+async def arun_many(workspaces, **kwargs):
+    """Drive one pipeline per workspace concurrently in the current event loop."""
+    # 各流水线共用本事件循环的 httpx 客户端，全部结束后再关闭
+    try:
+        runs = await asyncio.gather(*(arun_demo(workspace=ws, close_transport=False, **kwargs)
+                                      for ws in workspaces),
+                                    return_exceptions=True)
+    finally:
+        await get_transport().aclose()
+    return dict(zip(workspaces, runs))
+
 
 if __name__ == "__main__":
     run_demo()
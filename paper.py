@@ -0,0 +1,124 @@
+# tools/paper.py
+import sys
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+_intern = sys.intern
+
+
+def _interned(values: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    return tuple(_intern(v) for v in values or () if v)
+
+
+def arxiv_id_from(link: str, fallback: str = "") -> str:
+    """'http://arxiv.org/abs/2410.01234v2' / 'oai:arXiv.org:2410.01234' -> '2410.01234v2'."""
+    raw = (link or fallback or "").rstrip("/")
+    return raw.split("/")[-1].split(":")[-1]
+
+
+class RelatedPaper(NamedTuple):
+    """One precomputed neighbour of a paper."""
+    id: str
+    title: str
+    score: float
+
+    @property
+    def abs_link(self) -> str:
+        return f"https://arxiv.org/abs/{self.id}"
+
+
+class Paper:
+    """Compact record for one feed entry.
+
+    Uses __slots__ instead of a per-entry dict, interns strings that repeat
+    across papers (category tags, author names) and builds bibtex/citation
+    only when first accessed. Attribute access works in Jinja templates
+    (``paper.title``) and item access keeps old ``paper['title']`` callers
+    working.
+    """
+
+    __slots__ = ("id", "title", "authors", "summary", "published", "arxiv_tag",
+                 "tags", "link", "related", "_bibtex", "_citation")
+
+    FIELDS = ("id", "title", "authors", "summary", "published", "arxiv_tag",
+              "tags", "link")
+
+    def __init__(self, id: str, title: str = "", authors: Iterable[str] = (),
+                 summary: str = "", published: Optional[str] = None,
+                 arxiv_tag: str = "", tags: Iterable[str] = (), link: str = ""):
+        self.id = id or ""
+        self.title = title or ""
+        self.authors = _interned(authors)
+        self.summary = summary or ""
+        self.published = published
+        self.arxiv_tag = _intern(arxiv_tag) if arxiv_tag else ""
+        self.tags = _interned(tags)
+        self.link = link or ""
+        # filled in from the related-papers index; not part of the feed content
+        self.related: Tuple[RelatedPaper, ...] = ()
+        self._bibtex = None
+        self._citation = None
+
+    @property
+    def abs_link(self) -> str:
+        return f"https://arxiv.org/abs/{self.id}" if self.id else self.link
+
+    @property
+    def pdf_link(self) -> str:
+        return f"https://arxiv.org/pdf/{self.id}.pdf" if self.id else ""
+
+    @property
+    def year(self) -> str:
+        return (self.published or "")[:4]
+
+    @property
+    def bibtex(self) -> str:
+        if self._bibtex is None:
+            authors = " and ".join(self.authors) or "Unknown"
+            title = self.title.replace("{", "\\{").replace("}", "\\}")
+            self._bibtex = (
+                f"@article{{{self.id or 'unknown'},\n"
+                f"  title={{{title}}},\n"
+                f"  author={{{authors}}},\n"
+                f"  journal={{arXiv preprint arXiv:{self.id}}},\n"
+                f"  year={{{self.year}}}\n"
+                f"}}"
+            )
+        return self._bibtex
+
+    @property
+    def citation(self) -> str:
+        if self._citation is None:
+            authors = ", ".join(self.authors) or "Unknown"
+            self._citation = f"{authors}. {self.title}. arXiv:{self.id} ({self.year})."
+        return self._citation
+
+    # dict-style access for code written against the old per-entry dicts
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Paper):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self.FIELDS)
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"Paper(id={self.id!r}, title={self.title[:40]!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {f: getattr(self, f) for f in self.FIELDS}
+        d["authors"] = list(self.authors)
+        d["tags"] = list(self.tags)
+        return d
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Paper":
+        return cls(**{f: d.get(f) for f in cls.FIELDS if d.get(f) is not None})
@@ -0,0 +1,303 @@
+# tools/paper_store.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from .paper import Paper
+
+DEFAULT_DB_PATH = Path(os.getenv("ARXIV_PAPER_DB",
+                                 Path.home() / ".cache" / "arxiv_daily" / "papers.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id           TEXT PRIMARY KEY,
+    title        TEXT NOT NULL,
+    authors      TEXT NOT NULL,      -- JSON list
+    summary      TEXT NOT NULL,
+    published    TEXT,
+    primary_tag  TEXT NOT NULL,
+    tags         TEXT NOT NULL,      -- JSON list
+    link         TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    first_seen   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paper_categories (
+    category  TEXT NOT NULL,
+    paper_id  TEXT NOT NULL REFERENCES papers(id),
+    position  INTEGER NOT NULL,
+    PRIMARY KEY (category, paper_id)
+);
+CREATE INDEX IF NOT EXISTS idx_paper_categories_paper ON paper_categories(paper_id);
+CREATE INDEX IF NOT EXISTS idx_paper_categories_pos ON paper_categories(category, position);
+CREATE TABLE IF NOT EXISTS feeds (
+    category     TEXT PRIMARY KEY,
+    signature    TEXT NOT NULL,
+    version      INTEGER NOT NULL,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+# Full-text index over papers, kept in sync by triggers (external content table).
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, authors, summary, content='papers', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS papers_fts_ai AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts (rowid, title, authors, summary)
+    VALUES (new.rowid, new.title, new.authors, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_fts_ad AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, title, authors, summary)
+    VALUES ('delete', old.rowid, old.title, old.authors, old.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_fts_au AFTER UPDATE ON papers BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, title, authors, summary)
+    VALUES ('delete', old.rowid, old.title, old.authors, old.summary);
+    INSERT INTO papers_fts (rowid, title, authors, summary)
+    VALUES (new.rowid, new.title, new.authors, new.summary);
+END;
+"""
+
+# bm25 column weights: title, authors, summary
+_BM25_WEIGHTS = (5.0, 3.0, 1.0)
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def content_hash(p: Paper) -> str:
+    h = hashlib.sha1()
+    for part in (p.title, "\x1f".join(p.authors), p.summary, p.published or "",
+                 "\x1f".join(p.tags), p.link):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+class PaperStore:
+    """SQLite store of papers keyed by arXiv id.
+
+    A cross-listed paper is stored once; the categories listing it live in
+    the paper_categories relation. Upserts compare content hashes so a
+    refresh only writes rows that actually changed, and a category whose
+    feed is identical to the last refresh is skipped entirely. An FTS5
+    index over title / authors / summary follows every write via triggers.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_DB_PATH):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        self.fts = self._init_fts()
+
+    def _init_fts(self) -> bool:
+        """Create the FTS5 index (backfilled once for older databases); False if FTS5 is unavailable."""
+        existed = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'papers_fts'").fetchone() is not None
+        try:
+            with self._conn:
+                self._conn.executescript(_FTS_SCHEMA)
+                if not existed:
+                    # 固定 rank 函数，ORDER BY rank 比 ORDER BY bm25(...) 表达式快
+                    self._conn.execute("INSERT INTO papers_fts (papers_fts, rank) VALUES ('rank', ?)",
+                                       ("bm25(%s, %s, %s)" % _BM25_WEIGHTS,))
+                    self._conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            # sqlite 编译时未启用 FTS5，search 退回到 LIKE 扫描
+            return False
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------------------------
+    # writes
+    # ---------------------------
+    def upsert_category(self, category: str, papers: List[Paper]) -> Dict[str, int]:
+        """Record the current listing of one category.
+
+        Returns counts of inserted / updated / unchanged papers; a listing
+        identical to the previous refresh returns {"skipped": 1}.
+        """
+        by_id = {p.id: p for p in papers if p.id}
+        hashes = [(pid, content_hash(p)) for pid, p in by_id.items()]
+        signature = hashlib.sha1(json.dumps(hashes).encode("utf-8")).hexdigest()
+        now = time.time()
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT signature, version FROM feeds WHERE category = ?", (category,)).fetchone()
+            if row and row["signature"] == signature:
+                return {"skipped": 1}
+
+            known = {}
+            ids = [pid for pid, _ in hashes]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                q = "SELECT id, content_hash FROM papers WHERE id IN (%s)" % ",".join("?" * len(chunk))
+                known.update((r["id"], r["content_hash"]) for r in self._conn.execute(q, chunk))
+
+            inserts, updates = [], []
+            for pid, h in hashes:
+                p = by_id[pid]
+                fields = (p.title, json.dumps(list(p.authors)), p.summary, p.published,
+                          json.dumps(list(p.tags)), p.link, h, now)
+                if pid not in known:
+                    inserts.append((pid,) + fields[:4] + (p.arxiv_tag or category,) + fields[4:] + (now,))
+                elif known[pid] != h:
+                    updates.append(fields + (pid,))
+                else:
+                    counts["unchanged"] += 1
+
+            self._conn.executemany(
+                "INSERT INTO papers (id, title, authors, summary, published, primary_tag, tags,"
+                " link, content_hash, updated_at, first_seen) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                inserts)
+            self._conn.executemany(
+                "UPDATE papers SET title=?, authors=?, summary=?, published=?, tags=?, link=?,"
+                " content_hash=?, updated_at=? WHERE id=?",
+                updates)
+            counts["inserted"], counts["updated"] = len(inserts), len(updates)
+
+            self._conn.execute("DELETE FROM paper_categories WHERE category = ?", (category,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO paper_categories (category, paper_id, position) VALUES (?,?,?)",
+                [(category, pid, pos) for pos, (pid, _) in enumerate(hashes)])
+            self._conn.execute(
+                "INSERT INTO feeds (category, signature, version, refreshed_at) VALUES (?,?,1,?)"
+                " ON CONFLICT(category) DO UPDATE SET signature=excluded.signature,"
+                " version=feeds.version+1, refreshed_at=excluded.refreshed_at",
+                (category, signature, now))
+        return counts
+
+    # ---------------------------
+    # reads
+    # ---------------------------
+    @staticmethod
+    def _to_paper(row: sqlite3.Row) -> Paper:
+        return Paper(id=row["id"], title=row["title"], authors=json.loads(row["authors"]),
+                     summary=row["summary"], published=row["published"],
+                     arxiv_tag=row["primary_tag"], tags=json.loads(row["tags"]),
+                     link=row["link"])
+
+    def get(self, paper_id: str) -> Optional[Paper]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM papers WHERE id = ?", (paper_id,)).fetchone()
+        return self._to_paper(row) if row else None
+
+    def papers_for_category(self, category: str, limit: int = 50, offset: int = 0) -> List[Paper]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.* FROM paper_categories c JOIN papers p ON p.id = c.paper_id"
+                " WHERE c.category = ? ORDER BY c.position LIMIT ? OFFSET ?",
+                (category, limit, offset)).fetchall()
+        return [self._to_paper(r) for r in rows]
+
+    def papers_for_categories(self, categories: Iterable[str], limit: int = 50) -> Dict[str, List[Paper]]:
+        """category -> papers; a cross-listed paper is the same object in every list."""
+        shared: Dict[str, Paper] = {}
+        result = {}
+        for cat in categories:
+            papers = []
+            for p in self.papers_for_category(cat, limit=limit):
+                papers.append(shared.setdefault(p.id, p))
+            result[cat] = papers
+        return result
+
+    def categories_of(self, paper_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT category FROM paper_categories WHERE paper_id = ? ORDER BY category",
+                (paper_id,)).fetchall()
+        return [r["category"] for r in rows]
+
+    def feed_version(self, category: str) -> int:
+        """Bumped every time the category's listing changes; 0 if never refreshed."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM feeds WHERE category = ?", (category,)).fetchone()
+        return row["version"] if row else 0
+
+    @staticmethod
+    def _match_query(text: str) -> str:
+        """User text -> FTS5 query: all words must match, the last one as a prefix.
+
+        ``author:name`` (or ``author: name``) restricts that one word to the
+        authors column; the words after it match any column again.
+        """
+        terms, column = [], None
+        for part in text.split():
+            if part.lower().startswith("author:"):
+                column, part = "authors", part[7:]
+            words = _TOKEN.findall(part)
+            for w in words:
+                term = '"%s"' % w.replace('"', "")
+                terms.append(f"{column} : {term}" if column else term)
+            if words:
+                column = None
+        if terms:
+            terms[-1] += "*"
+        return " AND ".join(terms)
+
+    def search(self, text: str, limit: int = 20, category: Optional[str] = None) -> List[Paper]:
+        """Papers matching every word of text in title / authors / summary, best BM25 first.
+
+        ``author:name`` limits that one word to the authors (see _match_query).
+        """
+        query = self._match_query(text)
+        if not query:
+            return []
+        if not self.fts:
+            return self._search_scan(text, limit, category)
+        sql = ("SELECT p.* FROM papers_fts f JOIN papers p ON p.rowid = f.rowid"
+               " WHERE papers_fts MATCH ?")
+        args: list = [query]
+        if category:
+            sql += (" AND p.id IN (SELECT paper_id FROM paper_categories WHERE category = ?)")
+            args.append(category)
+        sql += " ORDER BY rank LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [self._to_paper(r) for r in rows]
+
+    def _search_scan(self, text: str, limit: int, category: Optional[str]) -> List[Paper]:
+        words, authors, column = [], [], None
+        for part in text.split():
+            if part.lower().startswith("author:"):
+                column, part = "authors", part[7:]
+            found = [w.lower() for w in _TOKEN.findall(part)]
+            (authors if column else words).extend(found)
+            if found:
+                column = None
+        sql = "SELECT * FROM papers"
+        args: list = []
+        if category:
+            sql += " WHERE id IN (SELECT paper_id FROM paper_categories WHERE category = ?)"
+            args.append(category)
+        out = []
+        with self._lock:
+            for r in self._conn.execute(sql, args):
+                hay = " ".join((r["title"], r["authors"], r["summary"])).lower()
+                if all(w in hay for w in words) and all(w in r["authors"].lower() for w in authors):
+                    out.append(self._to_paper(r))
+                    if len(out) >= limit:
+                        break
+        return out
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
@@ -0,0 +1,159 @@
+# agents/patching.py
+"""Search/replace edit protocol used by AutoRefineAgent.
+
+The model answers with one section per file it wants to change::
+
+    ---main.py---
+    <<<<<<< SEARCH
+    lines copied from the current file
+    =======
+    replacement lines
+    >>>>>>> REPLACE
+
+A section without SEARCH/REPLACE blocks is taken as the full new file.
+"""
+import difflib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+SEARCH = "<<<<<<< SEARCH"
+DIVIDER = "======="
+REPLACE = ">>>>>>> REPLACE"
+
+# 模糊匹配的最低相似度
+FUZZY_THRESHOLD = 0.85
+
+
+class PatchError(ValueError):
+    pass
+
+
+class FileEdit:
+    __slots__ = ("full", "blocks", "error")
+
+    def __init__(self):
+        self.full: Optional[str] = None
+        self.blocks: List[Tuple[str, str]] = []
+        self.error: Optional[str] = None    # malformed section
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for code)."""
+    return (len(text) + 3) // 4
+
+
+def _header(line: str, labels) -> Optional[str]:
+    s = line.strip()
+    if s.startswith("---") and s.endswith("---") and s.strip("-").strip() in labels:
+        return s.strip("-").strip()
+    return None
+
+
+def split_sections(text: str, labels: Iterable[str]) -> Dict[str, str]:
+    """Split a ``---name---`` delimited reply into {name: body} for known names."""
+    return dict(iter_sections([text], labels))
+
+
+def iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Re-split streamed text chunks into complete lines (without the newline)."""
+    buf = ""
+    for chunk in chunks:
+        buf += chunk
+        *complete, buf = buf.split("\n")
+        for line in complete:
+            yield line.rstrip("\r")
+    if buf:
+        yield buf.rstrip("\r")
+
+
+def iter_sections(chunks: Iterable[str], labels: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Incremental split_sections over streamed chunks.
+
+    Each (name, body) is yielded as soon as the next header (or the end of
+    the stream) arrives, so callers can act on a file before the reply is
+    complete.
+    """
+    labels = set(labels)
+    current, body = None, []
+    for line in iter_lines(chunks):
+        name = _header(line, labels)
+        if name is not None:
+            if current is not None:
+                yield current, "\n".join(body).strip("\n")
+            current, body = name, []
+        elif current is not None:
+            body.append(line)
+    if current is not None:
+        yield current, "\n".join(body).strip("\n")
+
+
+def parse_edits(text: str, labels: Iterable[str]) -> Dict[str, FileEdit]:
+    return {label: parse_edit(body) for label, body in split_sections(text, labels).items()}
+
+
+def parse_edit(body: str) -> FileEdit:
+    """One file section -> FileEdit (full replacement or SEARCH/REPLACE blocks)."""
+    edit = FileEdit()
+    if SEARCH not in body:
+        edit.full = body.strip()
+        return edit
+    state, search, replace = None, [], []
+    for line in body.splitlines():
+        s = line.strip()
+        if s == SEARCH:
+            state, search, replace = "search", [], []
+        elif s == DIVIDER and state == "search":
+            state = "replace"
+        elif s == REPLACE and state == "replace":
+            edit.blocks.append(("\n".join(search), "\n".join(replace)))
+            state = None
+        elif state == "search":
+            search.append(line)
+        elif state == "replace":
+            replace.append(line)
+    if state is not None:
+        edit.error = "unterminated SEARCH/REPLACE block"
+    return edit
+
+
+def _find_lines(lines: List[str], needle: List[str]) -> Optional[Tuple[int, int]]:
+    n = len(needle)
+    if n == 0:
+        return None
+    # 1) exact line match, 2) ignoring surrounding whitespace
+    for key in (lambda l: l.rstrip(), lambda l: l.strip()):
+        target = [key(l) for l in needle]
+        hits = [i for i in range(len(lines) - n + 1)
+                if [key(l) for l in lines[i:i + n]] == target]
+        if len(hits) == 1:
+            return hits[0], hits[0] + n
+        if len(hits) > 1:
+            raise PatchError("SEARCH text matches more than one location")
+    # 3) best fuzzy window of the same length
+    target = "\n".join(l.strip() for l in needle)
+    best, best_i = 0.0, None
+    for i in range(len(lines) - n + 1):
+        ratio = difflib.SequenceMatcher(
+            None, "\n".join(l.strip() for l in lines[i:i + n]), target).ratio()
+        if ratio > best:
+            best, best_i = ratio, i
+    if best_i is not None and best >= FUZZY_THRESHOLD:
+        return best_i, best_i + n
+    return None
+
+
+def apply_blocks(original: str, blocks: List[Tuple[str, str]]) -> str:
+    """Apply search/replace blocks in order; raises PatchError if one does not match."""
+    text = original
+    for search, replace in blocks:
+        if search and text.count(search) == 1:
+            text = text.replace(search, replace, 1)
+            continue
+        lines = text.splitlines()
+        span = _find_lines(lines, search.splitlines())
+        if span is None:
+            raise PatchError(f"SEARCH text not found: {search.splitlines()[:1]}")
+        start, end = span
+        text = "\n".join(lines[:start] + replace.splitlines() + lines[end:])
+        if original.endswith("\n"):
+            text += "\n"
+    return text
@@ -10,27 +10,32 @@ class PlannerAgent(AgentBase):
             {
                 'id': 'init_repo',
                 'desc': 'create project structure and requirements.txt',
-                'actor': 'CodeAgent'
+                'actor': 'CodeAgent',
+                'deps': []
             },
             {
                 'id': 'fetch_arxiv',
                 'desc': 'implement arxiv fetch utility',
-                'actor': 'CodeAgent'
+                'actor': 'CodeAgent',
+                'deps': ['init_repo']
             },
             {
                 'id': 'generate_web_app',  # ✅ 必须和 CodeAgent.act 对齐
                 'desc': 'implement FastAPI webapp for arXiv CS Daily',
-                'actor': 'CodeAgent'
+                'actor': 'CodeAgent',
+                'deps': ['init_repo']   # 与 fetch_arxiv 无数据依赖，可并行
             },
             {
                 'id': 'evaluate_webapp',   # ✅ 必须和 EvalAgent.act 对齐
                 'desc': 'run eval agent on generated webapp',
-                'actor': 'EvalAgent'
+                'actor': 'EvalAgent',
+                'deps': ['fetch_arxiv', 'generate_web_app']
             },
             {
                 'id': 'refine_webapp',
                 'desc': 'self-refine webapp based on evaluation result',
-                'actor': 'EvalAgent'
+                'actor': 'EvalAgent',
+                'deps': ['evaluate_webapp']
             }
         ]
 
@@ -0,0 +1,166 @@
+# agents/prompt_builder.py
+"""Token-budgeted context for eval and refine prompts.
+
+The refine prompt only carries the files the evaluation report complains
+about. When they do not fit the budget, each file is cut down to the lines
+around the identifiers the report mentions (plus its structural lines),
+and the rest is replaced by an omission marker. The report itself is sent
+as compact JSON without empty fields.
+"""
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .patching import estimate_tokens
+
+# prompt-side budget per call; the reply budget (max_tokens) comes on top
+DEFAULT_PROMPT_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+
+OMITTED = "... [{n} lines omitted] ..."
+_OMITTED_RE = re.compile(r"\.\.\. \[\d+ lines omitted\] \.\.\.")
+
+# code-like fragments in a report message: quoted text, paths, dotted / called names
+_QUOTED = re.compile(r"""['"`]([^'"`]{2,80})['"`]""")
+_CODE_TOKEN = re.compile(r"[A-Za-z_][\w.\-]*(?:/[\w.\-{}]*)*|/[\w.\-/{}]+")
+_STRUCTURE = re.compile(r"^\s*(?:@|def |async def |class |import |from |\{%-? *(?:block|for|if|macro)|"
+                        r"<(?:head|body|main|nav|script|style|form)\b|function |const |let )")
+_COMMON = frozenset("""
+must should file route template uses using with that this from have missing found
+rule failed error warning score code line lines page return returns value values the
+and for not are does when each only into item items data html json call calls page
+""".split())
+
+
+def has_omissions(text: str) -> bool:
+    return bool(_OMITTED_RE.search(text or ""))
+
+
+def compact_report(eval_json) -> str:
+    """Evaluation result as compact JSON: no indentation, no empty lists or blank fields."""
+    if isinstance(eval_json, str):
+        try:
+            eval_json = json.loads(eval_json)
+        except json.JSONDecodeError:
+            return eval_json.strip()
+    if not isinstance(eval_json, dict):
+        return json.dumps(eval_json, ensure_ascii=False, separators=(",", ":"))
+    slim = {k: v for k, v in eval_json.items() if v not in ([], {}, "", None)}
+    return json.dumps(slim, ensure_ascii=False, separators=(",", ":"))
+
+
+def messages_by_file(eval_json, labels: Iterable[str]) -> Dict[str, List[str]]:
+    """{label: [messages]} from the merged "label: message" lists of EvalAgent."""
+    out: Dict[str, List[str]] = {label: [] for label in labels}
+    if not isinstance(eval_json, dict):
+        return out
+    for field in ("fatal_errors", "warnings", "suggestions"):
+        for msg in eval_json.get(field, []) or []:
+            label, sep, rest = str(msg).partition(": ")
+            if sep and label in out:
+                out[label].append(rest)
+    return out
+
+
+def _keywords(messages: Iterable[str]) -> List[str]:
+    words = set()
+    for msg in messages:
+        words.update(m.strip() for m in _QUOTED.findall(msg))
+        for tok in _CODE_TOKEN.findall(msg):
+            tok = tok.strip(".-")
+            if len(tok) > 3 and tok.lower() not in _COMMON:
+                words.add(tok)
+    return sorted(words, key=len, reverse=True)
+
+
+class PromptBuilder:
+    """Fits file contents into a per-call prompt token budget."""
+
+    def __init__(self, budget: int = DEFAULT_PROMPT_BUDGET, context: int = 6):
+        self.budget = budget
+        self.context = context
+
+    # ---------------------------
+    # single file
+    # ---------------------------
+    def excerpt(self, code: str, messages: Iterable[str], context: Optional[int] = None) -> str:
+        """Lines near the report's identifiers plus structural lines; the rest elided."""
+        context = self.context if context is None else context
+        lines = code.splitlines()
+        keep = set()
+        for word in _keywords(messages):
+            hits = [i for i, line in enumerate(lines) if word in line]
+            # 出现太多次的词不具区分度
+            if 0 < len(hits) <= 4:
+                for i in hits:
+                    keep.update(range(max(0, i - context), min(len(lines), i + context + 1)))
+        keep.update(i for i, line in enumerate(lines) if _STRUCTURE.match(line))
+        return self._render(lines, keep)
+
+    @staticmethod
+    def _render(lines: List[str], keep) -> str:
+        out, gap = [], 0
+        for i, line in enumerate(lines):
+            if i in keep:
+                if gap:
+                    out.append(OMITTED.format(n=gap))
+                    gap = 0
+                out.append(line)
+            else:
+                gap += 1
+        if gap:
+            out.append(OMITTED.format(n=gap))
+        return "\n".join(out)
+
+    def fit(self, code: str, budget: Optional[int] = None, messages: Iterable[str] = ()) -> str:
+        """code unchanged if it fits, else an excerpt, else its head and tail."""
+        budget = self.budget if budget is None else budget
+        if estimate_tokens(code) <= budget:
+            return code
+        squeezed = re.sub(r"\n\s*\n(\s*\n)+", "\n\n", code)     # 连续空行
+        if estimate_tokens(squeezed) <= budget:
+            return squeezed
+        messages = list(messages)
+        for context in (self.context, 2, 0):
+            text = self.excerpt(squeezed, messages, context)
+            # 一行都没保留的摘录只剩省略标记，改用首尾
+            if estimate_tokens(text) <= budget and not _OMITTED_RE.fullmatch(text):
+                return text
+        lines = squeezed.splitlines()
+        # 省略标记和两个换行也计入预算
+        per_side = max(1, (budget * 4 - len(OMITTED.format(n=len(lines))) - 2) // 2)
+        head = squeezed[:per_side].rsplit("\n", 1)[0]
+        tail = squeezed[-per_side:].split("\n", 1)[-1]
+        n_head, n_tail = head.count("\n") + 1, tail.count("\n") + 1
+        return "\n".join([head, OMITTED.format(n=max(0, len(lines) - n_head - n_tail)), tail])
+
+    # ---------------------------
+    # refine prompt
+    # ---------------------------
+    def refine_context(self, eval_json, codes: Dict[str, str]) -> Tuple[str, str, List[str]]:
+        """(compact report, "=== label ===" file blocks, labels shown) within the budget.
+
+        Files without any message are left out; when the rest does not fit,
+        files with more fatal errors and messages are fitted first and keep
+        more of their content.
+        """
+        report = compact_report(eval_json)
+        msgs = messages_by_file(eval_json if isinstance(eval_json, dict) else {}, codes)
+        shown = [label for label in codes if msgs[label]] or list(codes)
+        fatal = {label: sum(1 for m in eval_json.get("fatal_errors", [])
+                            if str(m).startswith(label + ": "))
+                 if isinstance(eval_json, dict) else 0 for label in shown}
+        shown.sort(key=lambda label: (-fatal[label], -len(msgs[label])))
+
+        left = max(0, self.budget - estimate_tokens(report))
+        full = {label: codes[label] for label in shown}
+        if sum(estimate_tokens(c) for c in full.values()) > left:
+            # 按优先级分配预算，未用完的份额留给后面的文件
+            blocks = {}
+            for i, label in enumerate(shown):
+                share = left // (len(shown) - i)
+                blocks[label] = self.fit(codes[label], share, msgs[label])
+                left -= estimate_tokens(blocks[label])
+            full = blocks
+        files = "\n".join(f"=== {label} ===\n{full[label]}\n" for label in shown)
+        return report, files, shown
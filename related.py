@@ -0,0 +1,245 @@
+# tools/related.py
+"""TF-IDF "related papers" over title + summary.
+
+Term counts and TF-IDF rows are kept as SciPy CSR matrices that grow as
+papers are ingested; each new row is weighted once, with the IDF of the
+moment, and similarities are computed block by block (all papers x a dense
+block of query vectors) with a per-row top-k via argpartition. The index
+holds at most ``max_papers`` papers: the oldest are dropped first, and the
+rows (and vocabulary) of dropped or replaced papers are compacted away
+once they outnumber the live ones.
+"""
+import hashlib
+import math
+import re
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from .paper import Paper, RelatedPaper
+
+DEFAULT_TOP_K = 5
+# about 40 days of the five default categories
+DEFAULT_MAX_PAPERS = 20_000
+# query blocks are sized so each dense block stays around 16M floats
+_BLOCK_CELLS = 1 << 24
+
+_TOKEN = re.compile(r"[a-z][a-z0-9\-]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this
+to we with our these which using based via can also than such into their both
+""".split())
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _fingerprint(p: Paper) -> str:
+    return hashlib.sha1(f"{p.title}\x1e{p.summary}".encode("utf-8")).hexdigest()
+
+
+class RelatedIndex:
+    """Incremental TF-IDF index that keeps the top-k neighbours of every paper.
+
+    ``ingest(papers)`` adds new (or changed) papers, computes their
+    neighbours against everything indexed and merges them into the lists of
+    the existing papers, so the cost of an update is proportional to the
+    number of new papers, not to the square of the corpus. Rows are weighted
+    with the IDF at the time they were added and older pairs are not
+    re-scored on every update; ``rebuild()`` does both.
+    """
+
+    def __init__(self, k: int = DEFAULT_TOP_K, max_papers: int = DEFAULT_MAX_PAPERS):
+        self.k = k
+        self.max_papers = max_papers
+        self._lock = threading.RLock()
+        self._vocab: Dict[str, int] = {}
+        self._counts = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._x = sp.csr_matrix((0, 0), dtype=np.float32)       # weighted, L2-normalised rows
+        self._df = np.zeros(0, dtype=np.int64)
+        self._ids: List[str] = []
+        self._titles: List[str] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._row: Dict[str, int] = {}        # paper id -> live row
+        self._fp: Dict[str, str] = {}         # paper id -> content fingerprint
+        self._nbr = np.zeros((0, k), dtype=np.int64)
+        self._score = np.zeros((0, k), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+    # ---------------------------
+    # matrix helpers
+    # ---------------------------
+    def _count_rows(self, papers: List[Paper]) -> sp.csr_matrix:
+        indptr, indices, data = [0], [], []
+        for p in papers:
+            tf: Dict[int, int] = {}
+            for tok in _tokens(f"{p.title} {p.summary}"):
+                col = self._vocab.setdefault(tok, len(self._vocab))
+                tf[col] = tf.get(col, 0) + 1
+            indices.extend(tf)
+            data.extend(1.0 + math.log(c) for c in tf.values())    # sublinear tf
+            indptr.append(len(indices))
+        return sp.csr_matrix((np.asarray(data, dtype=np.float32),
+                              np.asarray(indices, dtype=np.int64),
+                              np.asarray(indptr, dtype=np.int64)),
+                             shape=(len(papers), len(self._vocab)))
+
+    def _weigh(self, counts: sp.csr_matrix) -> sp.csr_matrix:
+        """L2-normalised TF-IDF rows for counts, with the current IDF."""
+        n = max(1, len(self._row))
+        idf = (np.log((1.0 + n) / (1.0 + self._df)) + 1.0).astype(np.float32)
+        x = counts.multiply(idf[np.newaxis, :]).tocsr()
+        norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return (sp.diags(1.0 / norms) @ x).astype(np.float32).tocsr()
+
+    def _kill(self, pid: str):
+        row = self._row.pop(pid)
+        self._fp.pop(pid, None)
+        self._alive[row] = False
+        self._df -= np.bincount(self._counts[row].indices, minlength=len(self._df))
+
+    def _compact(self):
+        """Drop dead rows and unused terms, renumbering rows in the neighbour lists."""
+        keep = np.flatnonzero(self._alive)
+        remap = np.full(len(self._alive) + 1, -1, dtype=np.int64)    # last slot maps -1
+        remap[keep] = np.arange(len(keep))
+        terms = np.flatnonzero(self._df > 0)
+        self._counts = self._counts[keep][:, terms].tocsr()
+        self._x = self._x[keep][:, terms].tocsr()
+        self._df = self._df[terms]
+        old_vocab = {col: tok for tok, col in self._vocab.items()}
+        self._vocab = {old_vocab[int(col)]: i for i, col in enumerate(terms)}
+        self._ids = [self._ids[i] for i in keep]
+        self._titles = [self._titles[i] for i in keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        nbr = remap[self._nbr[keep]]
+        score = self._score[keep]
+        score[nbr < 0] = -np.inf
+        order = np.argsort(-score, axis=1, kind="stable")
+        self._nbr = np.take_along_axis(nbr, order, axis=1)
+        self._score = np.take_along_axis(score, order, axis=1)
+        self._row = {pid: int(remap[row]) for pid, row in self._row.items()}
+
+    def _top_k(self, x: sp.csr_matrix, rows: np.ndarray, cols: np.ndarray
+               ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k of cosine(rows, cols) per row, excluding self matches and zeros."""
+        k = self.k
+        nbr = np.full((len(rows), k), -1, dtype=np.int64)
+        score = np.full((len(rows), k), -np.inf, dtype=np.float32)
+        if len(rows) == 0 or len(cols) == 0:
+            return nbr, score
+        target = x[cols]
+        # sparse @ dense is much faster than sparse @ sparse once the product is dense-ish
+        block = max(1, _BLOCK_CELLS // max(len(cols), x.shape[1]))
+        for start in range(0, len(rows), block):
+            q = rows[start:start + block]
+            sims = (target @ x[q].T.toarray()).T
+            sims[q[:, None] == cols[None, :]] = -np.inf
+            sims[sims <= 0] = -np.inf
+            take = min(k, sims.shape[1])
+            part = np.argpartition(-sims, take - 1, axis=1)[:, :take]
+            part_scores = np.take_along_axis(sims, part, axis=1)
+            order = np.argsort(-part_scores, axis=1)
+            part = np.take_along_axis(part, order, axis=1)
+            part_scores = np.take_along_axis(part_scores, order, axis=1)
+            found = np.isfinite(part_scores)
+            nbr[start:start + len(q), :take] = np.where(found, cols[part], -1)
+            score[start:start + len(q), :take] = part_scores
+        return nbr, score
+
+    def _merge(self, rows: np.ndarray, nbr: np.ndarray, score: np.ndarray):
+        """Merge candidate neighbours into the stored lists of rows."""
+        old_nbr, old_score = self._nbr[rows], self._score[rows].copy()
+        old_score[(old_nbr >= 0) & ~self._alive[np.maximum(old_nbr, 0)]] = -np.inf
+        all_nbr = np.concatenate([old_nbr, nbr], axis=1)
+        all_score = np.concatenate([old_score, score], axis=1)
+        order = np.argsort(-all_score, axis=1, kind="stable")[:, :self.k]
+        self._nbr[rows] = np.take_along_axis(all_nbr, order, axis=1)
+        self._score[rows] = np.take_along_axis(all_score, order, axis=1)
+
+    # ---------------------------
+    # public API
+    # ---------------------------
+    def ingest(self, papers: Iterable[Paper]) -> int:
+        """Index new or changed papers and update neighbour lists; returns how many were added."""
+        with self._lock:
+            fresh: Dict[str, Paper] = {}
+            for p in papers:
+                if p.id and self._fp.get(p.id) != _fingerprint(p):
+                    fresh[p.id] = p
+            if not fresh:
+                return 0
+            for pid in fresh:
+                if pid in self._row:
+                    self._kill(pid)
+            # 超出容量时先淘汰最早加入的论文（行号即加入顺序）
+            batch = list(fresh.values())[-self.max_papers:]
+            overflow = len(self._row) + len(batch) - self.max_papers
+            if overflow > 0:
+                for row in np.flatnonzero(self._alive)[:overflow]:
+                    self._kill(self._ids[row])
+            if len(self._alive) - len(self._row) > max(len(self._row), 1024):
+                self._compact()
+
+            chunk = self._count_rows(batch)
+            vocab = len(self._vocab)
+            self._counts.resize((self._counts.shape[0], vocab))
+            self._x.resize((self._x.shape[0], vocab))
+            first = self._counts.shape[0]
+            self._counts = sp.vstack([self._counts, chunk], format="csr")
+            self._df = np.concatenate([self._df, np.zeros(vocab - len(self._df), dtype=np.int64)])
+            self._df += np.bincount(chunk.indices, minlength=vocab)
+
+            m = len(batch)
+            self._alive = np.concatenate([self._alive, np.ones(m, dtype=bool)])
+            self._nbr = np.concatenate([self._nbr, np.full((m, self.k), -1, dtype=np.int64)])
+            self._score = np.concatenate([self._score, np.full((m, self.k), -np.inf, dtype=np.float32)])
+            for i, p in enumerate(batch):
+                self._row[p.id] = first + i
+                self._fp[p.id] = _fingerprint(p)
+                self._ids.append(p.id)
+                self._titles.append(p.title)
+
+            # 只为新行计算权重；旧行保留加入时的 IDF，rebuild() 统一重算
+            self._x = sp.vstack([self._x, self._weigh(chunk)], format="csr")
+            x = self._x
+            new_rows = np.arange(first, first + m)
+            live = np.flatnonzero(self._alive)
+            # new papers against everything, then old papers against the new ones only
+            self._merge(new_rows, *self._top_k(x, new_rows, live))
+            old_rows = live[live < first]
+            self._merge(old_rows, *self._top_k(x, old_rows, new_rows))
+            return m
+
+    def rebuild(self):
+        """Recompute every neighbour list with the current IDF weights."""
+        with self._lock:
+            self._compact()
+            self._x = self._weigh(self._counts)
+            live = np.flatnonzero(self._alive)
+            self._nbr[:] = -1
+            self._score[:] = -np.inf
+            self._merge(live, *self._top_k(self._x, live, live))
+
+    def related(self, paper_id: str) -> Tuple[RelatedPaper, ...]:
+        with self._lock:
+            row = self._row.get(paper_id)
+            if row is None:
+                return ()
+            return tuple(RelatedPaper(self._ids[j], self._titles[j], round(float(s), 4))
+                         for j, s in zip(self._nbr[row], self._score[row])
+                         if j >= 0 and np.isfinite(s))
+
+    def attach(self, papers: Iterable[Paper]) -> List[Paper]:
+        """Set paper.related from the precomputed lists (no similarity work)."""
+        papers = list(papers)
+        for p in papers:
+            p.related = self.related(p.id)
+        return papers
+
@@ -0,0 +1,219 @@
+# scheduler.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from tools.tracing import in_context
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"     # an upstream dependency failed
+CANCELLED = "cancelled"
+
+
+class TaskRecord:
+    __slots__ = ("task", "state", "result", "error", "started", "finished")
+
+    def __init__(self, task: Dict[str, Any]):
+        self.task = task
+        self.state = PENDING
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def id(self) -> str:
+        return self.task["id"]
+
+    @property
+    def deps(self) -> List[str]:
+        return list(self.task.get("deps", []))
+
+    @property
+    def duration(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class DAGScheduler:
+    """Run plan tasks as soon as their ``deps`` are done, on a worker pool.
+
+    ``runner(task)`` is called for every task and its return value stored
+    on the task's record. A failing task marks everything downstream of it
+    as skipped; independent branches keep running.
+    """
+
+    def __init__(self, tasks: List[Dict[str, Any]], runner: Callable[[Dict[str, Any]], Any],
+                 max_workers: int = 4, on_change: Optional[Callable[[TaskRecord], None]] = None):
+        self.records: Dict[str, TaskRecord] = {}
+        for t in tasks:
+            if t["id"] in self.records:
+                raise ValueError(f"duplicate task id: {t['id']}")
+            self.records[t["id"]] = TaskRecord(t)
+        self.runner = runner
+        self.max_workers = max_workers
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._check_graph()
+
+    def _check_graph(self):
+        for rec in self.records.values():
+            for d in rec.deps:
+                if d not in self.records:
+                    raise ValueError(f"task {rec.id!r} depends on unknown task {d!r}")
+        # Kahn: every task must be reachable from the roots, otherwise there is a cycle
+        indeg = {tid: len(r.deps) for tid, r in self.records.items()}
+        ready = [tid for tid, n in indeg.items() if n == 0]
+        seen = 0
+        while ready:
+            tid = ready.pop()
+            seen += 1
+            for other in self.records.values():
+                if tid in other.deps:
+                    indeg[other.id] -= 1
+                    if indeg[other.id] == 0:
+                        ready.append(other.id)
+        if seen != len(self.records):
+            raise ValueError("task dependencies contain a cycle")
+
+    def _set_state(self, rec: TaskRecord, state: str):
+        with self._lock:
+            rec.state = state
+        if self.on_change:
+            self.on_change(rec)
+
+    def _ready(self) -> List[TaskRecord]:
+        # 按计划中的原始顺序返回可运行的任务
+        return [r for r in self.records.values()
+                if r.state == PENDING and all(self.records[d].state == DONE for d in r.deps)]
+
+    def _skip_blocked(self):
+        changed = True
+        while changed:
+            changed = False
+            for r in self.records.values():
+                if r.state == PENDING and any(self.records[d].state in (FAILED, SKIPPED, CANCELLED)
+                                              for d in r.deps):
+                    r.error = "upstream failed"
+                    self._set_state(r, SKIPPED)
+                    changed = True
+
+    def _run_one(self, rec: TaskRecord):
+        rec.started = time.perf_counter()
+        try:
+            return self.runner(rec.task)
+        finally:
+            rec.finished = time.perf_counter()
+
+    def run(self) -> Dict[str, TaskRecord]:
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="plan") as pool:
+            while True:
+                for rec in self._ready():
+                    self._set_state(rec, RUNNING)
+                    running[pool.submit(in_context(self._run_one), rec)] = rec
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    rec = running.pop(fut)
+                    try:
+                        rec.result = fut.result()
+                        self._set_state(rec, DONE)
+                    except Exception as e:
+                        rec.error = f"{type(e).__name__}: {e}"
+                        self._set_state(rec, FAILED)
+                self._skip_blocked()
+        return self.records
+
+    def critical_path(self) -> Tuple[List[str], float]:
+        """Longest chain of dependent tasks by measured duration."""
+        best: Dict[str, Tuple[float, List[str]]] = {}
+
+        def visit(tid: str) -> Tuple[float, List[str]]:
+            if tid not in best:
+                rec = self.records[tid]
+                upstream = max((visit(d) for d in rec.deps), default=(0.0, []), key=lambda x: x[0])
+                best[tid] = (upstream[0] + rec.duration, upstream[1] + [tid])
+            return best[tid]
+
+        total, path = max((visit(t) for t in self.records), default=(0.0, []), key=lambda x: x[0])
+        return path, total
+
+    def report(self) -> str:
+        lines = []
+        for rec in self.records.values():
+            extra = f"  ({rec.error})" if rec.error else ""
+            lines.append(f"  {rec.id:<20} {rec.state:<8} {rec.duration:8.2f}s{extra}")
+        path, total = self.critical_path()
+        wall = 0.0
+        started = [r.started for r in self.records.values() if r.started is not None]
+        finished = [r.finished for r in self.records.values() if r.finished is not None]
+        if started and finished:
+            wall = max(finished) - min(started)
+        lines.append(f"  critical path: {' -> '.join(path)} = {total:.2f}s (wall {wall:.2f}s)")
+        return "\n".join(lines)
+
+
+class AsyncDAGScheduler(DAGScheduler):
+    """DAGScheduler for coroutine runners: each ready task becomes an asyncio task.
+
+    ``runner(task)`` must return an awaitable; max_workers bounds how many
+    tasks run at once. A task that ends with CancelledError is recorded as
+    cancelled and its dependents are skipped; cancelling arun() itself
+    cancels the running tasks, records them and re-raises.
+    """
+
+    def __init__(self, tasks: List[Dict[str, Any]], runner: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 max_workers: int = 4, on_change: Optional[Callable[[TaskRecord], None]] = None):
+        super().__init__(tasks, runner, max_workers=max_workers, on_change=on_change)
+
+    async def _arun_one(self, rec: TaskRecord, gate: asyncio.Semaphore):
+        async with gate:
+            rec.started = time.perf_counter()
+            try:
+                return await self.runner(rec.task)
+            finally:
+                rec.finished = time.perf_counter()
+
+    async def arun(self) -> Dict[str, TaskRecord]:
+        gate = asyncio.Semaphore(max(1, self.max_workers))
+        running: Dict[asyncio.Future, TaskRecord] = {}
+        while True:
+            for rec in self._ready():
+                self._set_state(rec, RUNNING)
+                running[asyncio.ensure_future(self._arun_one(rec, gate))] = rec
+            if not running:
+                break
+            try:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                # 外部取消：先取消并等待正在运行的任务，记录状态后再向上抛出
+                for fut in running:
+                    fut.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+                for fut, rec in running.items():
+                    self._finish(rec, fut)
+                self._skip_blocked()
+                raise
+            for fut in done:
+                self._finish(running.pop(fut), fut)
+            self._skip_blocked()
+        return self.records
+
+    def _finish(self, rec: TaskRecord, fut: asyncio.Future):
+        try:
+            rec.result = fut.result()
+            self._set_state(rec, DONE)
+        except asyncio.CancelledError:
+            rec.error = "cancelled"
+            self._set_state(rec, CANCELLED)
+        except Exception as e:
+            rec.error = f"{type(e).__name__}: {e}"
+            self._set_state(rec, FAILED)
@@ -0,0 +1,135 @@
+# agents/snapshots.py
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+
+class SnapshotStore:
+    """Content-addressed snapshots of workspace files.
+
+    File contents are stored once under ``blobs/<sha256>``; each snapshot is
+    a small JSON manifest ``manifests/<name>.json`` mapping relative paths
+    to blob hashes together with the evaluation score. Restoring writes only
+    the files whose content differs from the target manifest (detected from
+    the size/mtime recorded when the file was last snapshotted or restored),
+    and picking the best snapshot only reads manifests.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.manifests = self.root / "manifests"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.manifests.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # absolute file path -> (size, mtime_ns, sha) as last seen by this store
+        self._known: Dict[str, Tuple[int, int, str]] = {}
+
+    def _blob(self, sha: str) -> Path:
+        return self.blobs / sha[:2] / sha
+
+    def _stat_key(self, p: Path) -> Optional[Tuple[int, int]]:
+        try:
+            st = p.stat()
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _current_sha(self, p: Path) -> Optional[str]:
+        """Hash of p, reusing the recorded hash when size and mtime are unchanged."""
+        st = self._stat_key(p)
+        if st is None:
+            return None
+        known = self._known.get(str(p))
+        if known and known[:2] == st:
+            return known[2]
+        data = p.read_bytes()
+        sha = hashlib.sha256(data).hexdigest()
+        self._store_blob(sha, data)
+        self._known[str(p)] = st + (sha,)
+        return sha
+
+    def _store_blob(self, sha: str, data: bytes):
+        blob = self._blob(sha)
+        if blob.exists():
+            return
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp = blob.with_name(f"{sha}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, blob)
+
+    def snapshot(self, workspace: Union[str, Path], files: Iterable[str], name: str,
+                 score: Optional[float] = None, **meta) -> Dict:
+        """Record the current content of files (relative to workspace) as snapshot name."""
+        workspace = Path(workspace)
+        entries = {}
+        with self._lock:
+            for rel in files:
+                sha = self._current_sha(workspace / rel)
+                if sha is not None:
+                    entries[rel] = sha
+            manifest = {"name": name, "score": score, "created": time.time(),
+                        "files": entries, **meta}
+            tmp = self.manifests / f"{name}.json.tmp"
+            tmp.write_text(json.dumps(manifest), encoding="utf-8")
+            os.replace(tmp, self.manifests / f"{name}.json")
+        return manifest
+
+    def reset(self):
+        """Forget all snapshots of a previous session (blobs are kept for reuse)."""
+        with self._lock:
+            for p in self.manifests.glob("*.json"):
+                p.unlink()
+
+    def set_score(self, name: str, score: float):
+        p = self.manifests / f"{name}.json"
+        with self._lock:
+            manifest = json.loads(p.read_text(encoding="utf-8"))
+            manifest["score"] = score
+            p.write_text(json.dumps(manifest), encoding="utf-8")
+
+    def load(self, name: str) -> Dict:
+        return json.loads((self.manifests / f"{name}.json").read_text(encoding="utf-8"))
+
+    def list(self) -> List[Dict]:
+        out = []
+        for p in sorted(self.manifests.glob("*.json")):
+            try:
+                out.append(json.loads(p.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return sorted(out, key=lambda m: m["created"])
+
+    def best(self) -> Optional[Dict]:
+        """Highest-scoring snapshot (earliest on ties), from the manifests alone."""
+        scored = [m for m in self.list() if m.get("score") is not None]
+        if not scored:
+            return None
+        return max(scored, key=lambda m: (m["score"], -m["created"]))
+
+    def latest(self) -> Optional[Dict]:
+        manifests = self.list()
+        return manifests[-1] if manifests else None
+
+    def restore(self, workspace: Union[str, Path], manifest: Union[str, Dict]) -> List[str]:
+        """Make workspace match a snapshot; returns the relative paths rewritten."""
+        if isinstance(manifest, str):
+            manifest = self.load(manifest)
+        workspace = Path(workspace)
+        written = []
+        with self._lock:
+            for rel, sha in manifest["files"].items():
+                dest = workspace / rel
+                if self._current_sha(dest) == sha:
+                    continue
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                tmp = dest.with_name(dest.name + ".tmp")
+                tmp.write_bytes(self._blob(sha).read_bytes())
+                os.replace(tmp, dest)
+                self._known[str(dest)] = self._stat_key(dest) + (sha,)
+                written.append(rel)
+        return written
@@ -0,0 +1,314 @@
+# agents/static_checks.py
+"""Deterministic checks for the EvalAgent rules that need no judgment.
+
+Python rules are checked on the AST, template rules on the Jinja2 parse
+(when jinja2 is installed) plus pattern matching, copy.js rules by pattern
+matching. Each file gets a StaticReport; a failed *hard* check means the
+file cannot work at all and the LLM evaluation is skipped for it.
+"""
+import ast
+import functools
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import jinja2
+except ImportError:  # templates are then only pattern-checked
+    jinja2 = None
+
+
+class Check:
+    __slots__ = ("rule", "fn", "hard")
+
+    def __init__(self, rule: str, fn: Callable[[str], bool], hard: bool = False):
+        self.rule = rule
+        self.fn = fn
+        self.hard = hard
+
+
+class StaticReport:
+    def __init__(self):
+        self.passed: List[str] = []
+        self.failed: List[str] = []
+        self.hard_failed: List[str] = []
+
+    @property
+    def total(self) -> int:
+        return len(self.passed) + len(self.failed)
+
+
+# ---------------------------
+# main.py (AST)
+# ---------------------------
+@functools.lru_cache(maxsize=16)
+def _tree(code: str) -> Optional[ast.AST]:
+    try:
+        return ast.parse(code)
+    except SyntaxError:
+        return None
+
+
+def _name(node) -> str:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return ""
+
+
+def _calls(tree):
+    return (n for n in ast.walk(tree) if isinstance(n, ast.Call))
+
+
+def _imports_name(module: str, name: str) -> Callable[[str], bool]:
+    def check(code):
+        tree = _tree(code)
+        return tree is not None and any(
+            isinstance(n, ast.ImportFrom) and (n.module or "").endswith(module)
+            and any(a.name == name for a in n.names)
+            for n in ast.walk(tree))
+    return check
+
+
+def _defines_templates_dir(code):
+    tree = _tree(code)
+    return tree is not None and any(
+        isinstance(n, ast.Assign) and any(_name(t) == "TEMPLATES_DIR" for t in n.targets)
+        for n in ast.walk(tree))
+
+
+def _templates_init(code):
+    # templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+    tree = _tree(code)
+    if tree is None:
+        return False
+    for n in ast.walk(tree):
+        if (isinstance(n, ast.Assign) and any(_name(t) == "templates" for t in n.targets)
+                and isinstance(n.value, ast.Call) and _name(n.value.func) == "Jinja2Templates"):
+            for kw in n.value.keywords:
+                v = kw.value
+                if (kw.arg == "directory" and isinstance(v, ast.Call) and _name(v.func) == "str"
+                        and v.args and _name(v.args[0]) == "TEMPLATES_DIR"):
+                    return True
+    return False
+
+
+def _first_arg_is(call: ast.Call, value: str) -> bool:
+    return bool(call.args) and isinstance(call.args[0], ast.Constant) and call.args[0].value == value
+
+
+def _mounts_static(code):
+    tree = _tree(code)
+    return tree is not None and any(
+        _name(c.func) == "mount" and _first_arg_is(c, "/static") for c in _calls(tree))
+
+
+def _route(path: str) -> Callable[[str], bool]:
+    def check(code):
+        tree = _tree(code)
+        return tree is not None and any(
+            isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))
+            and any(isinstance(d, ast.Call) and _name(d.func) == "get" and _first_arg_is(d, path)
+                    for d in n.decorator_list)
+            for n in ast.walk(tree))
+    return check
+
+
+_root_route = _route("/")
+
+
+def _root_handler_does_not_fetch(code):
+    # feeds are refreshed in the background; '/' only reads the snapshot
+    tree = _tree(code)
+    if tree is None:
+        return False
+    for n in ast.walk(tree):
+        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and any(
+                isinstance(d, ast.Call) and _name(d.func) == "get" and _first_arg_is(d, "/")
+                for d in n.decorator_list):
+            if any(_name(c.func) == "fetch_category_rss" for c in _calls(n)):
+                return False
+    return True
+
+
+def _renders_index(code):
+    tree = _tree(code)
+    return tree is not None and any(
+        isinstance(n, ast.Constant) and n.value == "index.html" for n in ast.walk(tree))
+
+
+def _answers_not_modified(code):
+    # reads the If-None-Match header and returns a 304 (status 304 / HTTP_304_NOT_MODIFIED)
+    tree = _tree(code)
+    if tree is None:
+        return False
+    reads_header = any(isinstance(n, ast.Constant) and isinstance(n.value, str)
+                       and n.value.lower() == "if-none-match" for n in ast.walk(tree))
+    returns_304 = any((isinstance(n, ast.Constant) and n.value == 304 and not isinstance(n.value, bool))
+                      or _name(n) in ("HTTP_304_NOT_MODIFIED", "NOT_MODIFIED")
+                      for n in ast.walk(tree))
+    return reads_header and returns_304
+
+
+def _no_await_on_sync(code):
+    tree = _tree(code)
+    if tree is None:
+        return False
+    sync_defs = {n.name for n in ast.walk(tree) if isinstance(n, ast.FunctionDef)}
+    sync_defs.add("fetch_category_rss")
+    return not any(
+        isinstance(n, ast.Await) and isinstance(n.value, ast.Call) and _name(n.value.func) in sync_defs
+        for n in ast.walk(tree))
+
+
+# ---------------------------
+# templates / js (patterns)
+# ---------------------------
+def _jinja_parses(code):
+    if jinja2 is None:
+        return True
+    try:
+        jinja2.Environment().parse(code)
+        return True
+    except jinja2.TemplateSyntaxError:
+        return False
+
+
+def _has(pattern: str, flags=0) -> Callable[[str], bool]:
+    rx = re.compile(pattern, flags)
+    return lambda code: rx.search(code) is not None
+
+
+def _lacks(pattern: str, flags=0) -> Callable[[str], bool]:
+    rx = re.compile(pattern, flags)
+    return lambda code: rx.search(code) is None
+
+
+def _field(name: str) -> str:
+    # paper.x / paper['x'] / paper["x"]
+    return rf"paper\s*(\.\s*{name}\b|\[\s*['\"]{name}['\"]\s*\])"
+
+
+CHECKS: Dict[str, List[Check]] = {
+    "main": [
+        Check("main.py must be valid Python", lambda c: _tree(c) is not None, hard=True),
+        Check("Must import fetch_category_rss from tools.arxiv_tools",
+              _imports_name("tools.arxiv_tools", "fetch_category_rss")),
+        Check("Must import StaticFiles", _imports_name("staticfiles", "StaticFiles")),
+        Check("Must define TEMPLATES_DIR", _defines_templates_dir),
+        Check("Must initialize templates = Jinja2Templates(directory=str(TEMPLATES_DIR))", _templates_init),
+        Check("Must mount static directory at '/static'", _mounts_static),
+        Check("Must define route '/'", _root_route),
+        Check("Route '/' must render index.html", _renders_index),
+        Check("Route '/' must not fetch feeds itself", _root_handler_does_not_fetch),
+        Check("Must define paginated route '/api/papers'", _route("/api/papers")),
+        Check("Must define NDJSON route '/api/papers/stream'", _route("/api/papers/stream")),
+        Check("Must define search route '/search'", _route("/search")),
+        Check("'/search' must use search_papers from tools.arxiv_tools", _has(r"\bsearch_papers\s*\(")),
+        Check("Must NOT use 'await' on synchronous functions", _no_await_on_sync),
+        Check("Route '/' must answer If-None-Match with 304", _answers_not_modified),
+    ],
+    "index": [
+        Check("index.html must be a valid Jinja2 template", _jinja_parses, hard=True),
+        Check("Must NOT use filters like |e('js')", _lacks(r"\|\s*e\s*\(\s*['\"]js['\"]"), hard=True),
+        Check("Title must link to paper.abs_link", _has(_field("abs_link"))),
+        Check("Authors must be joined by comma", _has(r"authors\s*(\]\s*)?\|\s*join\s*\(\s*['\"],")),
+        Check("Must show summary", _has(_field("summary"))),
+        Check("Must show published date", _has(_field("published"))),
+        Check("Tag must be shown as [arxiv_tag]", _has(r"\[\s*\{\{\s*" + _field("arxiv_tag") + r"\s*\}\}\s*\]")),
+        Check("Must link PDF to paper.pdf_link", _has(_field("pdf_link"))),
+        Check("Copy BibTeX button must use data-bib", _has(r"data-bib\s*=")),
+        Check("Copy Citation button must use data-cite", _has(r"data-cite\s*=")),
+        Check("Buttons must call copyFromData(btn)", _has(r"copyFromData\s*\(")),
+        Check("Load more must call /api/papers with the cursor", _has(r"/api/papers\?[^\"']*cursor")),
+    ],
+    "js": [
+        Check("Must define global function copyFromData(btn)",
+              _has(r"function\s+copyFromData\s*\(|(window\.)?copyFromData\s*=")),
+        Check("Must read btn.dataset.bib or btn.dataset.cite", _has(r"dataset\.(bib|cite)")),
+        Check("Must use navigator.clipboard.writeText", _has(r"navigator\.clipboard\.writeText")),
+        Check("Must change text to \"Copied!\"", _has(r"Copied!")),
+        Check("Must revert the button text", _has(r"setTimeout\s*\(")),
+    ],
+    "paper": [
+        Check("paper.html must be a valid Jinja2 template", _jinja_parses, hard=True),
+        Check("Must NOT use filters like |e('js')", _lacks(r"\|\s*e\s*\(\s*['\"]js['\"]"), hard=True),
+        Check("Must link title to paper.abs_link", _has(_field("abs_link"))),
+        Check("Must show authors", _has(_field("authors"))),
+        Check("Must show published", _has(_field("published"))),
+        Check("Must show tag", _has(_field("arxiv_tag"))),
+        Check("Must include BibTeX block", _has(_field("bibtex"))),
+        Check("Copy button must use data-bib", _has(r"data-bib\s*=")),
+        Check("Must use copyFromData(btn)", _has(r"copyFromData\s*\(")),
+        Check("Must include /static/copy.js", _has(r"/static/copy\.js")),
+    ],
+}
+
+# Rules that still need a model's judgment, per file. Together with CHECKS these
+# are the whole rule set; EvalAgent builds its prompts from all_rules().
+JUDGMENT_RULES: Dict[str, str] = {
+    "main": """
+- Variable papers passed to index.html must be dict(category -> list)
+- Feeds are refreshed by a background task started on startup; refresh failures keep the old data
+- '/' renders only the first page; '/api/papers?cat=&cursor=&limit=' pages by cursor and
+  '/api/papers/stream' streams NDJSON
+- '/search' returns search_papers results as item dicts and keeps no search index of its own
+- Rendered pages are cached per (category, feed version) and the cache is dropped when a feed changes
+- Project should be logically runnable
+- Template system must be correctly configured
+""",
+    "index": """
+- Two-column layout:
+  Left: fixed category list
+  Right: scrollable paper list
+- Reasonable, readable styling; papers of the selected category are shown
+""",
+    "js": """
+- Must safely handle JSON-escaped strings (parse JSON when possible, fall back to the raw value)
+- Clipboard failures should be handled without breaking the page
+""",
+    "paper": """
+- Page is well-formed and readable; the copy button works with copy.js
+""",
+}
+
+
+def run_checks(key: str, code: str) -> StaticReport:
+    report = StaticReport()
+    for check in CHECKS.get(key, []):
+        try:
+            ok = bool(check.fn(code))
+        except Exception:
+            ok = False
+        if ok:
+            report.passed.append(check.rule)
+        else:
+            report.failed.append(check.rule)
+            if check.hard:
+                report.hard_failed.append(check.rule)
+    return report
+
+
+def combine_score(report: StaticReport, judgment_score: Optional[float], key: str) -> int:
+    """0-10 file score: one share per mechanical rule plus one per judgment rule.
+
+    judgment_score is the model's 0-10 for the judgment rules, or None when
+    the model was not consulted (those shares then score zero).
+    """
+    n_judgment = len([l for l in JUDGMENT_RULES.get(key, "").splitlines() if l.startswith("- ")])
+    total = report.total + n_judgment
+    if total == 0:
+        return 0
+    judged = (judgment_score or 0) / 10.0 * n_judgment
+    return int(round(10 * (len(report.passed) + judged) / total))
+
+
+def split_rules(key: str) -> Tuple[List[str], str]:
+    """(mechanical rule texts, judgment rule text) for one file."""
+    return [c.rule for c in CHECKS.get(key, [])], JUDGMENT_RULES.get(key, "")
+
+
+def all_rules(key: str) -> str:
+    """Every rule for one file as a "- rule" list: the mechanical ones, then the judgment ones."""
+    mechanical, judgment = split_rules(key)
+    return "\n" + "".join(f"- {rule}\n" for rule in mechanical) + judgment.lstrip("\n")
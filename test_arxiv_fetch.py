@@ -0,0 +1,126 @@
+# tests/test_arxiv_fetch.py
+import io
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+import requests
+
+from tools.arxiv_tools import fetch_categories, fetch_category_rss
+from tools.fake_feeds import MockFeedServer, canned_rss
+from tools.feed_stream import iter_entries
+
+CATS = [f"cs.X{i}" for i in range(8)]
+
+
+def test_per_host_limit_bounds_concurrent_requests(feed_cache):
+    with MockFeedServer(delays={c: 0.2 for c in CATS}) as srv:
+        results, errors = fetch_categories(CATS, max_items=5, base_url=srv.base_url,
+                                           max_workers=8, per_host=2)
+    assert errors == {}
+    assert sorted(results) == CATS
+    assert srv.peak_inflight == 2
+
+
+def test_worker_pool_bounds_concurrency(feed_cache):
+    with MockFeedServer(delays={c: 0.2 for c in CATS}) as srv:
+        results, _ = fetch_categories(CATS, max_items=5, base_url=srv.base_url,
+                                      max_workers=3, per_host=8)
+    assert len(results) == len(CATS)
+    assert srv.peak_inflight <= 3
+
+
+def test_deadline_returns_partial_results(feed_cache):
+    with MockFeedServer(delays={"cs.X0": 3.0}, missing={"cs.X1"}) as srv:
+        t0 = time.monotonic()
+        results, errors = fetch_categories(CATS, max_items=5, base_url=srv.base_url, deadline=0.5)
+        elapsed = time.monotonic() - t0
+    assert elapsed < 2.0
+    assert errors["cs.X0"] == "deadline exceeded"
+    assert "404" in errors["cs.X1"]
+    assert sorted(results) == CATS[2:]
+    assert all(len(papers) == 5 for papers in results.values())
+
+
+def test_stale_entry_is_revalidated_with_conditional_get(feed_cache, feed_server):
+    first = fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+    feed_cache.ttl = 0          # everything is stale from now on
+    again = fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+    assert [p.id for p in again] == [p.id for p in first]
+    assert feed_server.not_modified == 1
+    assert feed_cache.stats["revalidated"] == 1
+    assert feed_cache.stats["misses"] == 1
+
+
+def test_fresh_entry_is_served_without_request(feed_cache, feed_server):
+    fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+    fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+    assert len(feed_server.requests) == 1
+    assert feed_cache.stats["hits"] == 1
+
+
+def test_early_stop_keeps_the_connection_alive(feed_cache):
+    with MockFeedServer(items=200) as srv:
+        for cat in CATS[:4]:
+            fetch_category_rss(cat, max_items=5, base_url=srv.base_url, use_cache=False, related=False)
+    assert len(srv.requests) == 4
+    assert srv.connections == 1
+
+
+def test_fetched_and_cached_papers_are_searchable(feed_cache, feed_server, paper_store):
+    from tools.arxiv_tools import search_papers
+    fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+    assert [p.id for p in search_papers("cs.AI paper 3")] == ["2410.00003"]
+    # a cache hit upserts too: an emptied listing comes back without a request
+    paper_store.upsert_category("cs.AI", [])
+    assert search_papers("sparse", category="cs.AI") == []
+    fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+    assert len(feed_server.requests) == 1
+    assert len(search_papers("sparse", category="cs.AI")) == 5
+
+
+def test_refresh_upserts_once_into_the_given_store(feed_cache, feed_server, paper_store, tmp_path):
+    from tools.arxiv_tools import refresh_categories
+    from tools.paper_store import PaperStore
+    other = PaperStore(tmp_path / "other.sqlite3")
+    report = refresh_categories(["cs.AI"], max_items=5, base_url=feed_server.base_url, store=other)
+    assert report["cs.AI"] == {"inserted": 5, "updated": 0, "unchanged": 0}
+    assert other.feed_version("cs.AI") == 1
+    assert paper_store.count() == 0
+    other.close()
+
+
+def test_server_error_after_retries_serves_the_stale_copy(feed_cache, feed_server):
+    from tools.http_transport import RetryPolicy, Transport, get_transport, set_transport
+    first = fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+    feed_cache.ttl = 0
+    feed_server.statuses.update({"cs.AI": 503, "cs.CV": 503})
+    previous = get_transport()
+    set_transport(Transport(retry=RetryPolicy(retries=1, backoff=0.01)))
+    try:
+        again = fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+        # 没有缓存时 5xx 仍然报错
+        with pytest.raises(requests.HTTPError):
+            fetch_category_rss("cs.CV", max_items=5, base_url=feed_server.base_url, related=False)
+    finally:
+        set_transport(previous)
+    assert [p.id for p in again] == [p.id for p in first]
+    assert len(feed_server.requests) == 5     # 1 + 2 attempts per 503 category
+
+
+def test_truncated_feed_yields_complete_entries_then_raises():
+    body = canned_rss("cs.AI", items=3)
+    # 截断在第三条的 <link> 中间
+    entries = iter_entries(io.BytesIO(body[:body.index(b"2410.00002")]))
+    assert [e["id"] for e in (next(entries), next(entries))] == [
+        "oai:arXiv.org:2410.00000", "oai:arXiv.org:2410.00001"]
+    with pytest.raises(ET.ParseError):
+        next(entries)
+
+
+def test_malformed_feed_falls_back_to_the_lenient_parser(feed_cache, feed_server):
+    # &nbsp; 不是 XML 实体，流式解析会失败
+    feed_server.feeds["cs.AI"] = canned_rss("cs.AI", items=3).replace(b"paper 1:", b"paper&nbsp;1:")
+    papers = fetch_category_rss("cs.AI", max_items=5, base_url=feed_server.base_url, related=False)
+    assert [p.id for p in papers] == ["2410.00000", "2410.00001", "2410.00002"]
+    assert len(feed_server.requests) == 1
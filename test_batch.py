@@ -0,0 +1,55 @@
+# tests/test_batch.py
+import os
+
+from batch import run_batch
+
+
+def _crash_or_echo(job):
+    # "crash" 任务直接杀死工作进程，其余任务正常返回
+    if job["name"].startswith("crash"):
+        os._exit(1)
+    return {"name": job["name"], "workspace": job["workspace"], "status": "ok"}
+
+
+def _crash_once(job):
+    marker = job["workspace"] + ".crashed"
+    if job["name"] == "flaky" and not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return {"name": job["name"], "workspace": job["workspace"], "status": "ok"}
+
+
+def _jobs(tmp_path, names):
+    return [{"name": n, "workspace": str(tmp_path / n)} for n in names]
+
+
+def test_dead_worker_fails_only_its_job(tmp_path):
+    names = ["crash"] + [f"job{i}" for i in range(5)]
+    rows = run_batch(_jobs(tmp_path, names), workers=2, cache_dir=str(tmp_path / "cache"),
+                     runner=_crash_or_echo, crash_retries=1)
+    assert [r["name"] for r in rows] == names
+    assert rows[0]["status"] == "failed"
+    assert "worker process died (2 times)" in rows[0]["error"]
+    assert all(r["status"] == "ok" for r in rows[1:])
+
+
+def test_job_that_crashed_once_is_retried(tmp_path):
+    rows = run_batch(_jobs(tmp_path, ["flaky", "a", "b"]), workers=3, cache_dir=str(tmp_path / "cache"),
+                     runner=_crash_once, crash_retries=1)
+    assert [r["status"] for r in rows] == ["ok"] * 3
+
+
+def test_no_crash_runs_every_job_once(tmp_path):
+    seen = []
+    rows = run_batch(_jobs(tmp_path, ["a", "b", "c"]), workers=2, cache_dir=str(tmp_path / "cache"),
+                     runner=_crash_or_echo, on_result=seen.append)
+    assert [r["status"] for r in rows] == ["ok"] * 3
+    assert sorted(r["name"] for r in seen) == ["a", "b", "c"]
+
+
+def test_job_reaching_target_in_first_round_reports_its_score(tmp_path):
+    jobs = [{"name": "ok", "workspace": str(tmp_path / "ok"), "target_score": 1, "max_rounds": 3}]
+    row = run_batch(jobs, workers=1, cache_dir=str(tmp_path / "cache"), dry_run=True)[0]
+    assert row["status"] == "ok"
+    assert row["rounds"] == 1
+    assert row["score"] is not None and row["score"] >= 1
@@ -0,0 +1,105 @@
+# tests/test_code_agent.py
+import asyncio
+
+import pytest
+
+from agents.code_agent import CodeAgent
+from agents.llm_backends import ReplayBackend
+from agents.patching import estimate_tokens
+
+MAIN = "webapp/main.py"
+# about 3500 tokens: more than the default budget, less than main.py's
+LONG_CODE = "\n".join(f"VALUE_{i} = {i} * 2  # padding line" for i in range(400)) + "\n"
+
+
+def _agent(tmp_path, stream=False, answer=LONG_CODE):
+    backend = ReplayBackend(fallback=lambda messages: answer)
+    agent = CodeAgent("code", {}, workspace=tmp_path, backend=backend,
+                      enable_cache=False, gen_retries=1, stream=stream)
+    # 第一次必然截断，翻倍后足够
+    agent.GEN_MAX_TOKENS = estimate_tokens(answer) // 2 + 1
+    return agent, backend
+
+
+def test_main_py_gets_its_own_budget(tmp_path):
+    agent, backend = _agent(tmp_path)
+    agent._generate_artifact(MAIN, "prompt")
+    assert backend.snapshot()["truncated"] == 0
+    assert (tmp_path / MAIN).read_text() == LONG_CODE.strip()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_truncated_artifact_is_retried_with_a_larger_budget(tmp_path, stream, monkeypatch):
+    monkeypatch.setattr("agents.code_agent.time.sleep", lambda s: None)
+    agent, backend = _agent(tmp_path, stream=stream)
+    agent._generate_artifact("webapp/static/copy.js", "prompt")
+    assert backend.snapshot()["truncated"] == 1
+    assert backend.snapshot()["calls"] == 2
+    assert (tmp_path / "webapp/static/copy.js").read_text().strip() == LONG_CODE.strip()
+
+
+def test_truncated_artifact_fails_when_retries_run_out(tmp_path, monkeypatch):
+    monkeypatch.setattr("agents.code_agent.time.sleep", lambda s: None)
+    agent, _ = _agent(tmp_path, answer=LONG_CODE * 8)
+    agent.gen_retries = 0
+    errors = agent._generate_artifacts({"webapp/static/copy.js": "prompt"})
+    assert errors["webapp/static/copy.js"].startswith("TruncatedOutput")
+    assert not (tmp_path / "webapp/static/copy.js").exists()
+
+
+def test_async_truncated_artifact_is_retried(tmp_path, monkeypatch):
+    async def no_sleep(s):
+        pass
+    monkeypatch.setattr("agents.code_agent.asyncio.sleep", no_sleep)
+    agent, backend = _agent(tmp_path)
+    assert asyncio.run(agent.agenerate_artifacts({"webapp/static/copy.js": "prompt"})) == {}
+    assert backend.snapshot()["truncated"] == 1
+    assert (tmp_path / "webapp/static/copy.js").read_text() == LONG_CODE.strip()
+
+
+def test_generated_tools_template_defines_search(tmp_path):
+    # main.py 从生成的 tools/arxiv_tools.py 导入 search_papers，模板本身必须可运行
+    import textwrap
+    agent, _ = _agent(tmp_path)
+    ns = {}
+    exec(textwrap.dedent(agent._arxiv_tools_artifacts()["tools/arxiv_tools.py"]), ns)
+    paper = ns["Paper"]
+    papers = [paper("1", "Neural nets", ["John Smith"], "2024-10-17", "cs.AI", "Deep learning."),
+              paper("2", "Graph kernels", ["Ada Lovelace"], "2024-10-17", "cs.AI", "Neural features.")]
+    ns["_index_papers"]("cs.AI", papers)
+    ns["_index_papers"]("cs.LG", papers[:1])
+    assert sorted(p.id for p in ns["search_papers"]("neur")) == ["1", "2"]
+    assert [p.id for p in ns["search_papers"]("smith neural", category="cs.LG")] == ["1"]
+    assert ns["search_papers"]("graph", category="cs.LG") == []
+    assert ns["search_papers"]("  ") == []
+
+
+def test_streamed_write_is_visible_while_it_grows(tmp_path):
+    from tools.fs_tools import write_file
+    target = tmp_path / "webapp" / "main.py"
+    seen = []
+
+    def chunks():
+        for part in ("a = 1\n", "b = 2\n"):
+            yield part
+            seen.append(target.read_text())
+
+    write_file(target, chunks())
+    assert seen == ["a = 1\n", "a = 1\nb = 2\n"]
+    assert [p.name for p in target.parent.iterdir()] == ["main.py"]
+
+
+def test_failed_stream_restores_the_previous_file(tmp_path):
+    from tools.fs_tools import write_file
+    target = tmp_path / "webapp" / "main.py"
+    target.parent.mkdir()
+    target.write_text("old = True\n")
+
+    def chunks():
+        yield "new = "
+        raise ConnectionError("stream dropped")
+
+    with pytest.raises(ConnectionError):
+        write_file(target, chunks())
+    assert target.read_text() == "old = True\n"
+    assert [p.name for p in target.parent.iterdir()] == ["main.py"]
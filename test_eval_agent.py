@@ -0,0 +1,69 @@
+# tests/test_eval_agent.py
+import json
+import re
+
+import pytest
+
+from agents.eval_agent import EvalAgent
+from benchmarks import SAMPLE_WEBAPP
+
+REPLY = json.dumps({"score": 8, "fatal_errors": [], "warnings": [], "suggestions": []})
+
+
+@pytest.fixture
+def webapp(tmp_path):
+    for rel, code in SAMPLE_WEBAPP.items():
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text(code, encoding="utf-8")
+    return tmp_path
+
+
+def _evaluator(ws, replies=None, **kwargs):
+    """EvalAgent whose model records which file each prompt was about."""
+    sent = []
+
+    def call_qwen(prompt, **kw):
+        label = re.search(r"^=== (\S+) ===$", prompt, re.M).group(1)
+        sent.append(label)
+        return (replies or {}).get(label, REPLY)
+    return EvalAgent("eval", {}, ws, call_qwen, max_workers=1, **kwargs), sent
+
+
+def test_edited_file_misses_the_memo(webapp):
+    agent, sent = _evaluator(webapp, static_checks=False)
+    agent.evaluate_web_app({})
+    sent.clear()
+    main = webapp / "webapp/main.py"
+    main.write_text(main.read_text() + "\n# edited by refine\n")
+    result = agent.evaluate_web_app({})
+    assert sent == ["main.py"]
+    assert agent.stats["memo_hits"] == 3
+    assert result["score_main"] == 8
+
+
+def test_invalid_reply_is_not_memoized(webapp):
+    replies = {"copy.js": "sorry, I cannot score this"}
+    agent, sent = _evaluator(webapp, replies=replies, static_checks=False)
+    first = agent.evaluate_web_app({})
+    assert first["score_js"] == 0
+    assert "copy.js: evaluator returned invalid JSON" in first["warnings"]
+    sent.clear()
+    replies.clear()
+    second = agent.evaluate_web_app({})
+    assert sent == ["copy.js"]
+    assert second["score_js"] == 8
+
+
+@pytest.mark.parametrize("key, rel, label, broken", [
+    ("index", "webapp/templates/index.html", "index.html", lambda c: c.replace("{% endfor %}</main>", "</main>")),
+    ("main", "webapp/main.py", "main.py", lambda c: c + "\ndef broken(:\n"),
+])
+def test_hard_static_failure_skips_the_model(webapp, key, rel, label, broken):
+    path = webapp / rel
+    path.write_text(broken(path.read_text()))
+    agent, sent = _evaluator(webapp)
+    result = agent.evaluate_web_app({})
+    assert label not in sent
+    assert agent.stats["static_only"] == 1
+    assert result[f"score_{key}"] == 0
+    assert any(msg.startswith(f"{label}: ") and "valid" in msg for msg in result["fatal_errors"])
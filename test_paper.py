@@ -0,0 +1,23 @@
+# tests/test_paper.py
+import pytest
+
+from tools.paper import Paper
+
+
+def test_from_dict_tolerates_missing_and_null_fields():
+    p = Paper.from_dict({"id": "2410.00001", "title": None, "authors": None,
+                         "published": None, "tags": ["cs.AI", ""]})
+    assert (p.title, p.authors, p.tags, p.year) == ("", (), ("cs.AI",), "")
+    assert p.bibtex.startswith("@article{2410.00001,")
+    assert "author={Unknown}" in p.bibtex
+    assert Paper.from_dict(p.to_dict()) == p
+
+
+def test_unknown_keys_behave_like_a_dict():
+    p = Paper("2410.00001", title="Sparse attention")
+    with pytest.raises(KeyError):
+        p["abstract"]
+    assert p.get("abstract", "n/a") == "n/a"
+    with pytest.raises(AttributeError):
+        p.abstract = "no slot for this"
+    assert p != {"id": "2410.00001", "title": "Sparse attention"}
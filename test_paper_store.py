@@ -0,0 +1,41 @@
+# tests/test_paper_store.py
+from tools.paper import Paper
+
+
+def _papers(n, suffix=""):
+    return [Paper(f"2410.{i:05d}", title=f"Sparse attention {i}{suffix}", authors=["Ada Lovelace"],
+                  summary="Efficient transformers.", published="2024-10-17", arxiv_tag="cs.LG")
+            for i in range(n)]
+
+
+def test_identical_listing_is_skipped_by_signature(paper_store):
+    assert paper_store.upsert_category("cs.LG", _papers(3)) == {"inserted": 3, "updated": 0, "unchanged": 0}
+    assert paper_store.feed_version("cs.LG") == 1
+    assert paper_store.upsert_category("cs.LG", _papers(3)) == {"skipped": 1}
+    assert paper_store.feed_version("cs.LG") == 1
+
+
+def test_changed_listing_updates_and_bumps_version(paper_store):
+    paper_store.upsert_category("cs.LG", _papers(3))
+    counts = paper_store.upsert_category("cs.LG", _papers(2) + _papers(4, " v2")[2:])
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 2}
+    assert paper_store.feed_version("cs.LG") == 2
+    assert sorted(p.id for p in paper_store.search("v2")) == ["2410.00002", "2410.00003"]
+
+
+def test_same_papers_in_another_category_are_not_reinserted(paper_store):
+    paper_store.upsert_category("cs.LG", _papers(3))
+    assert paper_store.upsert_category("cs.AI", _papers(3)) == {"inserted": 0, "updated": 0, "unchanged": 3}
+    assert paper_store.count() == 3
+    assert [p.id for p in paper_store.papers_for_category("cs.AI")] == [p.id for p in _papers(3)]
+
+
+def test_author_prefix_applies_to_one_word(paper_store):
+    paper_store.upsert_category("cs.LG", [
+        Paper("2410.00001", title="Neural nets", authors=["John Smith"], summary="Deep learning."),
+        Paper("2410.00002", title="Neural fields", authors=["Ada Lovelace"], summary="Smith normal form."),
+    ])
+    assert [p.id for p in paper_store.search("author:smith neural")] == ["2410.00001"]
+    assert [p.id for p in paper_store.search("neural author: smith")] == ["2410.00001"]
+    assert sorted(p.id for p in paper_store.search("smith neural")) == ["2410.00001", "2410.00002"]
+    assert paper_store.search("author:lovelace nets") == []
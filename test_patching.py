@@ -0,0 +1,33 @@
+# tests/test_patching.py
+import pytest
+
+from agents.patching import PatchError, _find_lines, apply_blocks
+
+CODE = """def index(request):
+    selected = request.query_params.get("cat", "cs.AI")
+    papers = PAPERS.get(selected, [])
+    return render(request, selected, papers)
+""".splitlines()
+
+
+def test_exact_and_whitespace_insensitive_match():
+    assert _find_lines(CODE, CODE[1:3]) == (1, 3)
+    assert _find_lines(CODE, ["  " + l.strip() + "  " for l in CODE[1:3]]) == (1, 3)
+
+
+def test_fuzzy_fallback_finds_a_slightly_different_block():
+    needle = ['    selected = request.query_params.get("cat", "cs.CV")',
+              "    papers = PAPERS.get(selected, [])"]
+    assert _find_lines(CODE, needle) == (1, 3)
+
+
+def test_no_match_returns_none():
+    assert _find_lines(CODE, ["completely unrelated line", "and another one"]) is None
+    assert _find_lines(CODE, []) is None
+    with pytest.raises(PatchError, match="not found"):
+        apply_blocks("\n".join(CODE), [("completely unrelated line", "x = 1")])
+
+
+def test_ambiguous_match_raises():
+    with pytest.raises(PatchError, match="more than one"):
+        _find_lines(["x = 1", "y = 2", "x = 1"], ["x = 1"])
@@ -0,0 +1,41 @@
+# tests/test_prompt_builder.py
+from agents.patching import estimate_tokens
+from agents.prompt_builder import PromptBuilder, has_omissions
+
+# 300 filler lines with one line the report points at
+CODE = "\n".join(f"x_{i} = {i}  # filler" if i != 150 else "templates = Jinja2Templates('templates')"
+                 for i in range(300))
+
+
+def test_fit_keeps_the_lines_the_report_mentions():
+    builder = PromptBuilder(budget=200)
+    fitted = builder.fit(CODE, messages=["'Jinja2Templates' must use directory=str(TEMPLATES_DIR)"])
+    assert estimate_tokens(fitted) <= 200
+    assert has_omissions(fitted)
+    assert "templates = Jinja2Templates('templates')" in fitted
+    assert "x_0 = 0" not in fitted
+
+
+def test_fit_without_anchors_falls_back_to_head_and_tail():
+    fitted = PromptBuilder(budget=100).fit(CODE)
+    assert estimate_tokens(fitted) <= 100
+    lines = fitted.splitlines()
+    assert lines[0] == "x_0 = 0  # filler"
+    assert lines[-1] == "x_299 = 299  # filler"
+    assert sum(has_omissions(line) for line in lines) == 1
+
+
+def test_refine_context_drops_clean_files_and_fits_the_rest():
+    report = {"overall_score": 20,
+              "fatal_errors": ["main.py: 'Jinja2Templates' must use directory=str(TEMPLATES_DIR)"],
+              "warnings": ["copy.js: missing 'Copied!'"], "suggestions": []}
+    codes = {"copy.js": CODE, "main.py": CODE, "index.html": CODE}
+    compact, files, shown = PromptBuilder(budget=400).refine_context(report, codes)
+    assert shown == ["main.py", "copy.js"]
+    assert '"suggestions"' not in compact
+    # 预算只计文件内容，不含 "=== label ===" 标题行
+    assert estimate_tokens(compact) + estimate_tokens(files) <= 400 + 20
+    assert "=== index.html ===" not in files
+    main_block = files.split("=== copy.js ===")[0]
+    assert "Jinja2Templates('templates')" in main_block
+    assert has_omissions(main_block)
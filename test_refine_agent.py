@@ -0,0 +1,54 @@
+# tests/test_refine_agent.py
+from agents.refine_agent import REFINE_FILES, AutoRefineAgent
+
+MAIN = "\n".join(f"def handler_{i}():\n    return {i}\n" for i in range(200))
+PATCH = "---copy.js---\n<<<<<<< SEARCH\nfunction copyFromData(btn) {}\n=======\n" \
+        "function copyFromData(btn) { return 1; }\n>>>>>>> REPLACE\n"
+
+
+class FakeEval:
+    """Scores by whether copy.js was patched; one instance per workspace."""
+
+    def __init__(self, workspace, seen=None):
+        self.workspace = workspace
+        self.seen = seen if seen is not None else []
+
+    def for_workspace(self, workspace):
+        return FakeEval(workspace, self.seen)
+
+    def act(self, task):
+        self.seen.append(self.workspace)
+        patched = "return 1" in (self.workspace / REFINE_FILES["copy.js"]).read_text()
+        return {"overall_score": 40 if patched else 10,
+                "warnings": ["copy.js: copyFromData does nothing", "main.py: handler_7 is slow"]}
+
+
+def _workspace(tmp_path):
+    files = {"main.py": MAIN, "index.html": "<html></html>\n", "paper.html": "<html></html>\n",
+             "copy.js": "function copyFromData(btn) {}\n"}
+    for label, rel in REFINE_FILES.items():
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text(files[label])
+    return tmp_path
+
+
+def test_beam_children_inherit_stream_and_prompt_budget(tmp_path):
+    ws = _workspace(tmp_path)
+    calls = []
+
+    def call_qwen(prompt, temperature=0.2, stream=False):
+        calls.append((prompt, stream))
+        return iter([PATCH[:40], PATCH[40:]]) if stream else PATCH
+
+    agent = AutoRefineAgent(ws, call_qwen, target_score=36, max_rounds=1, beam_width=2,
+                            stream=True, prompt_budget=300)
+    evaluator = FakeEval(ws)
+    agent.refine(evaluator)
+    assert agent.best_score == 40
+    assert calls and all(stream for _, stream in calls)
+    assert all("lines omitted" in prompt for prompt, _ in calls)
+    assert agent.tokens_used > 0
+    # 候选目录不再各自建快照库
+    candidates = [w for w in evaluator.seen if w != ws]
+    assert len(candidates) == 2
+    assert not any((w / ".backup_refine").exists() for w in candidates)
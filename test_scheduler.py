@@ -0,0 +1,70 @@
+# tests/test_scheduler.py
+import asyncio
+
+import pytest
+
+from scheduler import CANCELLED, DONE, FAILED, SKIPPED, AsyncDAGScheduler, DAGScheduler
+
+PLAN = [
+    {"id": "a"},
+    {"id": "b", "deps": ["a"]},
+    {"id": "c", "deps": ["b"]},
+    {"id": "d"},
+]
+
+
+def test_failure_skips_downstream_but_not_independent_tasks():
+    def runner(task):
+        if task["id"] == "b":
+            raise RuntimeError("boom")
+        return task["id"]
+
+    records = DAGScheduler(PLAN, runner, max_workers=2).run()
+    assert [records[t].state for t in "abcd"] == [DONE, FAILED, SKIPPED, DONE]
+    assert records["b"].error == "RuntimeError: boom"
+    assert records["c"].error == "upstream failed"
+
+
+def test_cycle_and_unknown_dependency_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        DAGScheduler([{"id": "a", "deps": ["b"]}, {"id": "b", "deps": ["a"]}], lambda t: None)
+    with pytest.raises(ValueError, match="unknown task"):
+        DAGScheduler([{"id": "a", "deps": ["z"]}], lambda t: None)
+    with pytest.raises(ValueError, match="duplicate"):
+        DAGScheduler([{"id": "a"}, {"id": "a"}], lambda t: None)
+
+
+def test_async_cancelled_task_skips_its_dependents():
+    async def runner(task):
+        if task["id"] == "a":
+            raise asyncio.CancelledError()
+        return task["id"]
+
+    records = asyncio.run(AsyncDAGScheduler(PLAN, runner).arun())
+    assert records["a"].state == CANCELLED
+    assert records["a"].error == "cancelled"
+    assert [records[t].state for t in "bcd"] == [SKIPPED, SKIPPED, DONE]
+
+
+def test_cancelling_arun_records_running_tasks():
+    started = asyncio.Event()
+
+    async def runner(task):
+        if task["id"] == "a":
+            started.set()
+            await asyncio.sleep(10)
+        return task["id"]
+
+    async def main():
+        scheduler = AsyncDAGScheduler(PLAN, runner)
+        run = asyncio.ensure_future(scheduler.arun())
+        await started.wait()
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        return scheduler.records
+
+    records = asyncio.run(main())
+    assert records["a"].state == CANCELLED
+    assert records["b"].state == records["c"].state == SKIPPED
+    assert records["d"].state == DONE
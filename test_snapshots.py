@@ -0,0 +1,38 @@
+# tests/test_snapshots.py
+from agents.snapshots import SnapshotStore
+
+FILES = ["webapp/main.py", "webapp/static/copy.js"]
+
+
+def _write(ws, content):
+    for rel in FILES:
+        p = ws / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(f"{content} {rel}\n")
+
+
+def test_restore_rewrites_only_changed_files(tmp_path):
+    ws = tmp_path / "ws"
+    _write(ws, "v1")
+    store = SnapshotStore(tmp_path / "snaps")
+    store.snapshot(ws, FILES, "r0", score=30)
+
+    (ws / FILES[0]).write_text("broken\n")
+    assert store.restore(ws, "r0") == [FILES[0]]
+    assert (ws / FILES[0]).read_text() == f"v1 {FILES[0]}\n"
+    assert store.restore(ws, "r0") == []
+
+
+def test_restore_recreates_deleted_files_and_picks_best(tmp_path):
+    ws = tmp_path / "ws"
+    store = SnapshotStore(tmp_path / "snaps")
+    _write(ws, "v1")
+    store.snapshot(ws, FILES, "r0", score=30)
+    _write(ws, "v2")
+    store.snapshot(ws, FILES, "r1", score=25)
+
+    (ws / FILES[1]).unlink()
+    best = store.best()
+    assert best["name"] == "r0"
+    assert sorted(store.restore(ws, best)) == sorted(FILES)
+    assert all((ws / rel).read_text() == f"v1 {rel}\n" for rel in FILES)
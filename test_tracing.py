@@ -0,0 +1,32 @@
+# tests/test_tracing.py
+import pytest
+
+from tools.tracing import JsonlExporter, Tracer, load_jsonl, summarize, to_otlp
+
+
+def test_raising_span_is_exported_as_an_error(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracer = Tracer(exporters=[JsonlExporter(str(path))])
+    with tracer.span("refine.round"):
+        with pytest.raises(ValueError):
+            with tracer.span("llm.call", model="mock"):
+                raise ValueError("bad reply")
+
+    child, parent = load_jsonl(str(path))
+    assert child["status"] == "error"
+    assert child["attributes"] == {"model": "mock", "error": "ValueError: bad reply"}
+    assert child["parent_id"] == parent["span_id"]
+    assert parent["status"] == "ok"
+    otlp = to_otlp(tracer.finished())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["status"]["code"] for s in otlp] == [2, 1]
+    rows = {g["name"]: g for g in summarize(load_jsonl(str(path)))["by_time"]}
+    assert rows["llm.call"]["errors"] == 1
+
+
+def test_failing_exporter_does_not_mask_the_error(tmp_path):
+    # 导出目标是目录：写入失败只丢弃该条记录
+    tracer = Tracer(exporters=[JsonlExporter(str(tmp_path))])
+    with pytest.raises(KeyError):
+        with tracer.span("fs.write_file"):
+            raise KeyError("main.py")
+    assert [s.status for s in tracer.finished()] == ["error"]
@@ -0,0 +1,300 @@
+# tools/tracing.py
+"""Span-based tracing for the agent pipeline.
+
+``span(name, **attrs)`` times a block and records it on the process-wide
+tracer; spans opened inside it (in the same thread, or in a pool task
+submitted through ``in_context``) become its children. Finished spans are
+kept in memory and, when ``AGENT_TRACE`` names a file, appended to it as
+JSON lines. ``to_otlp`` converts spans to the OTLP/JSON layout, and
+``summarize`` ranks span names by self time and by tokens.
+
+AGENT_TRACE=off turns tracing into a no-op.
+"""
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+TOKEN_ATTRS = ("prompt_tokens", "completion_tokens")
+
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "status", "thread")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.thread = threading.current_thread().name
+
+    def set(self, **attrs):
+        self.attributes.update(attrs)
+        return self
+
+    def add(self, key: str, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent_id, "start_ns": self.start_ns, "end_ns": self.end_ns,
+                "duration_s": round(self.duration, 6), "status": self.status,
+                "thread": self.thread, "attributes": self.attributes}
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled; accepts and drops everything."""
+
+    def set(self, **attrs):
+        return self
+
+    def add(self, key, amount=1):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class JsonlExporter:
+    """Append every finished span to a file as one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True, exporters: Iterable = (), max_spans: int = 10_000):
+        self.enabled = enabled
+        self.exporters = list(exporters)
+        self.spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Span]:
+        if not self.enabled:
+            yield _NOOP
+            return
+        s = Span(name, _current.get(), attrs)
+        token = _current.set(s)
+        try:
+            yield s
+        except BaseException as e:
+            if not isinstance(e, GeneratorExit):
+                s.status = "error"
+                s.attributes["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            s.end_ns = time.time_ns()
+            try:
+                _current.reset(token)
+            except ValueError:
+                # 生成器在别的上下文中被关闭（如未读完的流式响应）
+                _current.set(None)
+            self._finish(s)
+
+    def _finish(self, s: Span):
+        with self._lock:
+            self.spans.append(s)
+        for exporter in self.exporters:
+            try:
+                exporter.export(s)
+            except OSError:
+                pass
+
+    def finished(self) -> List[Span]:
+        with self._lock:
+            return list(self.spans)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+def _from_env() -> Tracer:
+    target = os.getenv("AGENT_TRACE", "")
+    if target.lower() in ("off", "0", "false"):
+        return Tracer(enabled=False)
+    return Tracer(exporters=[JsonlExporter(target)] if target else [])
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer, configured from AGENT_TRACE on first use."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = _from_env()
+        return _tracer
+
+
+def set_tracer(tracer: Optional[Tracer]):
+    global _tracer
+    with _tracer_lock:
+        _tracer = tracer
+
+
+def span(name: str, **attrs):
+    return get_tracer().span(name, **attrs)
+
+
+def current_span():
+    """The innermost open span, or a no-op span outside any."""
+    return _current.get() or _NOOP
+
+
+def traced(name: Optional[str] = None, **attrs):
+    """Decorator form of span()."""
+    def deco(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label, **attrs):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def in_context(fn: Callable[..., T]) -> Callable[..., T]:
+    """Bind fn to a copy of the caller's context so pool workers keep the parent span."""
+    ctx = contextvars.copy_context()
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
+
+
+# ---------------------------
+# export formats
+# ---------------------------
+def _otlp_value(v) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def to_otlp(spans: Iterable[Span], service: str = "arxiv-daily-agents") -> Dict[str, Any]:
+    """Spans as an OTLP/JSON ExportTraceServiceRequest (accepted by OTel collectors)."""
+    out = []
+    for s in spans:
+        item = {"traceId": s.trace_id, "spanId": s.span_id, "name": s.name, "kind": 1,
+                "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                "status": {"code": 2 if s.status == "error" else 1}}
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        out.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+        "scopeSpans": [{"scope": {"name": "tools.tracing"}, "spans": out}],
+    }]}
+
+
+def write_otlp(path: str, spans: Iterable[Span], service: str = "arxiv-daily-agents"):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_otlp(spans, service), f)
+
+
+def load_jsonl(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ---------------------------
+# summary
+# ---------------------------
+def summarize(spans: Iterable, top: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """Per span name: count, total / self / p95 time and tokens, ranked two ways.
+
+    Self time excludes children, so nested spans are not counted twice;
+    ``by_time`` is sorted on it and ``by_tokens`` on prompt + completion tokens.
+    Accepts Span objects or dicts loaded from a JSONL export.
+    """
+    rows = [s.to_dict() if isinstance(s, Span) else s for s in spans]
+    child_time: Dict[str, float] = {}
+    for r in rows:
+        if r.get("parent_id"):
+            child_time[r["parent_id"]] = child_time.get(r["parent_id"], 0.0) + r["duration_s"]
+
+    groups: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        g = groups.setdefault(r["name"], {"name": r["name"], "count": 0, "errors": 0,
+                                          "total_s": 0.0, "self_s": 0.0, "durations": [],
+                                          "prompt_tokens": 0, "completion_tokens": 0})
+        g["count"] += 1
+        g["errors"] += r.get("status") == "error"
+        g["total_s"] += r["duration_s"]
+        g["self_s"] += max(0.0, r["duration_s"] - child_time.get(r["span_id"], 0.0))
+        g["durations"].append(r["duration_s"])
+        attrs = r.get("attributes") or {}
+        for k in TOKEN_ATTRS:
+            g[k] += int(attrs.get(k) or 0)
+
+    for g in groups.values():
+        d = sorted(g.pop("durations"))
+        g["p95_s"] = round(d[min(len(d) - 1, int(0.95 * len(d)))], 4)
+        g["total_s"] = round(g["total_s"], 4)
+        g["self_s"] = round(g["self_s"], 4)
+        g["tokens"] = g["prompt_tokens"] + g["completion_tokens"]
+
+    by_time = sorted(groups.values(), key=lambda g: g["self_s"], reverse=True)[:top]
+    by_tokens = sorted((g for g in groups.values() if g["tokens"]),
+                       key=lambda g: g["tokens"], reverse=True)[:top]
+    return {"by_time": by_time, "by_tokens": by_tokens}
+
+
+def format_summary(summary: Dict[str, List[Dict[str, Any]]]) -> str:
+    lines = ["Top latency (self time):",
+             f"  {'span':<32}{'count':>7}{'self_s':>10}{'total_s':>10}{'p95_s':>9}{'errors':>8}"]
+    for g in summary["by_time"]:
+        lines.append(f"  {g['name']:<32}{g['count']:>7}{g['self_s']:>10.3f}"
+                     f"{g['total_s']:>10.3f}{g['p95_s']:>9.3f}{g['errors']:>8}")
+    if summary["by_tokens"]:
+        lines += ["Top cost (tokens):",
+                  f"  {'span':<32}{'count':>7}{'prompt':>10}{'completion':>12}{'total':>10}"]
+        for g in summary["by_tokens"]:
+            lines.append(f"  {g['name']:<32}{g['count']:>7}{g['prompt_tokens']:>10}"
+                         f"{g['completion_tokens']:>12}{g['tokens']:>10}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    # python tracing.py trace.jsonl  ->  summary of an exported run
+    print(format_summary(summarize(load_jsonl(sys.argv[1]))))